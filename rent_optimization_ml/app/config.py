@@ -82,6 +82,10 @@ class Settings(BaseSettings):
     model_path: Path = Path("./models/rent_predictor.joblib")
     confidence_threshold: float = 0.7
     min_training_samples: int = 100
+    # Seconds between artifact change checks for hot reload (0 disables the watcher)
+    model_watch_interval_seconds: float = 0.0
+    # Memory-map the exported array forest read-only so worker processes share its pages
+    model_mmap: bool = False
 
     # Features
     use_market_data: bool = True
@@ -91,6 +95,30 @@ class Settings(BaseSettings):
     # Cache
     cache_ttl_seconds: int = 3600
     enable_prediction_cache: bool = True
+    prediction_cache_max_entries: int = 50000
+
+    # Inference executor: "inline" (on the event loop), "thread", or "process" for GIL-heavy models
+    inference_executor: str = "thread"
+    inference_workers: int = 2
+    # Calls allowed to wait beyond the busy workers before /predict returns 503
+    inference_max_queue: int = 256
+    # BLAS/OpenMP threads per worker (0 leaves library defaults)
+    inference_blas_threads: int = 1
+    inference_mp_start_method: str = "spawn"
+    # Tree engine: "sklearn" (estimator.predict) or "array" (flattened forest exported next to the artifact)
+    inference_engine: str = "sklearn"
+
+    # Micro-batching: coalesce concurrent single /predict calls into one model call
+    enable_micro_batching: bool = False
+    micro_batch_max_size: int = 64
+    micro_batch_max_wait_ms: float = 3.0
+
+    # Metrics: per-stage latency histograms and counters served at /metrics
+    enable_metrics: bool = True
+
+    # Streaming: /predict/stream scores NDJSON lines in chunks of this size
+    stream_chunk_size: int = 500
+    stream_max_line_bytes: int = 65536
 
     # Logging
     log_level: str = "INFO"
@@ -105,6 +133,57 @@ class Settings(BaseSettings):
     rentometer_api_key: str | None = "r-kUFkJ8iznPSeZBKPnX2g"
     realtor_api_key: str | None = "6f78ee32071c4da88773647bbe9e10de"
 
+    # Market data providers, comma-separated (rentometer, comps_api); empty keeps the built-in stub comps
+    market_data_providers: str = ""
+    # Shared keep-alive client: total open connections across all providers
+    market_data_max_connections: int = 20
+    market_data_timeout_seconds: float = 3.0
+    market_data_max_retries: int = 2
+    market_data_retry_backoff_seconds: float = 0.2
+    market_data_max_comps: int = 10
+    # Latency budget for one unit's provider fan-out; stragglers are cancelled (0 waits for every provider)
+    market_data_deadline_ms: float = 1500.0
+    # Stop waiting for slower providers once this many comps have arrived (0 waits for all within the budget)
+    market_data_min_comps: int = 5
+    # Race a call slower than its provider's recent p95 against a duplicate, once enough samples exist
+    market_data_hedge: bool = True
+    market_data_hedge_min_samples: int = 50
+    rentometer_base_url: str = "https://www.rentometer.com/api/v1"
+    rentometer_max_concurrency: int = 4
+    rentometer_rate_per_second: float = 5.0
+    comps_api_url: str | None = None
+    comps_api_key: str | None = None
+    comps_api_max_concurrency: int = 8
+    comps_api_rate_per_second: float = 20.0
+    # Comps cache (provider comps only): memory LRU over SQLite, keyed by zip/beds/baths/size band
+    enable_comps_cache: bool = True
+    comps_cache_path: Path = Path("./data/comps_cache.sqlite3")
+    comps_cache_max_entries: int = 20000
+    comps_cache_ttl_seconds: int = 86400
+    # Past the TTL, entries are served for this long while a background refresh runs
+    comps_cache_stale_seconds: int = 604800
+    comps_cache_size_band_sqft: int = 250
+    # Nightly comps snapshot written by scripts/prefetch_comps.py; memory-mapped at start-up and consulted first
+    comps_snapshot_path: Path | None = Path("./data/comps_snapshot")
+    # Seconds between checks for a rewritten snapshot (0 disables reloading)
+    comps_snapshot_watch_interval_seconds: float = 60.0
+    # Older snapshots answer nothing, so lookups go live (0 disables the limit)
+    comps_snapshot_max_age_hours: float = 48.0
+
+    # Local comps: grid index over our own units and active-lease rents in Postgres
+    # (used instead of the stub comps, and when every provider fails)
+    enable_local_comps_index: bool = False
+    database_url: str | None = None
+    comps_index_refresh_seconds: float = 300.0
+    # Incremental refreshes miss hard-deleted units; a periodic full reload drops them
+    comps_index_full_reload_seconds: float = 86400.0
+    comps_index_cell_degrees: float = 0.05
+    comps_index_radius_miles: float = 5.0
+    comps_index_max_bedroom_diff: float = 0
+    comps_index_max_bathroom_diff: float = 0.5
+    # Nearest matches per unit handed to the comps ranker, which keeps market_data_max_comps of them
+    comps_index_max_candidates: int = 200
+
     # MLflow - Model tracking and experiment management
     # Set mlflow_tracking_uri to enable model versioning and experiment tracking
     # Example: "http://localhost:5000" or "https://your-mlflow-server.com"
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel, Field, RootModel
 
@@ -79,8 +79,24 @@ class HealthResponse(BaseModel):
     loaded_model: bool
 
 
+class ReadinessResponse(BaseModel):
+    ready: bool
+    pid: int
+    model_version: str
+    loaded_model: bool
+    model_load_ms: Optional[float] = None
+    warmup_ms: Optional[float] = None
+    startup_ms: Optional[float] = None
+    memory_mb: Dict[str, float] = Field(default_factory=dict)
+
+
 class ModelInfo(BaseModel):
     model_version: str
     trained_on: Optional[str] = None
     features: List[str] = []
     ready: bool = False
+    active_version: Optional[str] = None
+    artifact_sha256: Optional[str] = None
+    backend: Optional[str] = None
+    loaded_at: Optional[datetime] = None
+    previous_version: Optional[str] = None
@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from app.models.schemas import ComparableProperty, PredictionRequest
+from app.services.market_providers import MarketComps
+
+CompsFetcher = Callable[[], Awaitable[MarketComps]]
+
+
+class CompsCache:
+    """
+    Two-tier cache of market comparables: in-memory LRU over a SQLite file.
+
+    Units that share a zip code, bedroom count, half-bath band and square-foot
+    band share one entry, so a batch of similar units in one building costs one
+    upstream call. Entries are fresh for ``ttl_seconds``; for a further
+    ``stale_seconds`` they are still served immediately while one background
+    refresh replaces them (stale-while-revalidate). Concurrent misses for the
+    same key wait on a single fetch. The SQLite tier survives restarts; each
+    worker process opens its own connection on first use and reads or writes
+    it off the event loop. A SQLite error makes a lookup a miss and skips the
+    write, so a locked or damaged file never fails a request.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path],
+        max_entries: int,
+        ttl_seconds: float,
+        stale_seconds: float,
+        size_band_sqft: int = 250,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = max(0.0, stale_seconds)
+        self.size_band_sqft = max(1, size_band_sqft)
+        self._clock = clock
+        self._memory: OrderedDict[str, Tuple[float, MarketComps]] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refreshing: Set[asyncio.Task] = set()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+        self._db_lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale_served = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.disk_errors = 0
+
+    def key_for(self, request: PredictionRequest) -> str:
+        baths = round(request.bathrooms * 2) / 2
+        size_band = request.square_feet // self.size_band_sqft
+        return f"{request.zip_code}|{request.bedrooms}|{baths:g}|{size_band}"
+
+    async def get_or_fetch(self, request: PredictionRequest, fetch: CompsFetcher) -> MarketComps:
+        key = self.key_for(request)
+        entry = await self._lookup(key)
+        if entry is not None:
+            fetched_at, result = entry
+            age = self._clock() - fetched_at
+            if age < self.ttl_seconds:
+                return result
+            if age < self.ttl_seconds + self.stale_seconds:
+                self.stale_served += 1
+                self._refresh_in_background(key, fetch)
+                return result
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            result = await asyncio.shield(inflight)
+            if result is not None:
+                return result
+            # The fetch we waited on was cancelled with its request; look again and fetch if need be.
+            self.coalesced -= 1
+            return await self.get_or_fetch(request, fetch)
+
+        self.misses += 1
+        return await self._fetch(key, fetch, self._begin(key))
+
+    async def peek(self, request: PredictionRequest) -> Optional[MarketComps]:
+        """Whatever is stored for ``request``, however old; the last resort when providers cannot answer."""
+        entry = await self._lookup(self.key_for(request), any_age=True)
+        return entry[1] if entry is not None else None
+
+    async def close(self) -> None:
+        for task in list(self._refreshing):
+            task.cancel()
+        if self._refreshing:
+            await asyncio.gather(*self._refreshing, return_exceptions=True)
+        if self._db is not None:
+            await asyncio.to_thread(self._close_db)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.memory_hits + self.disk_hits + self.misses + self.coalesced
+        return {
+            "memory_entries": len(self._memory),
+            "inflight": len(self._inflight),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "stale_served": self.stale_served,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "disk_errors": self.disk_errors,
+            "hit_ratio": (self.memory_hits + self.disk_hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+    def _begin(self, key: str) -> asyncio.Future:
+        """Mark ``key`` as being fetched so concurrent misses wait on it."""
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        return future
+
+    async def _fetch(self, key: str, fetch: CompsFetcher, future: asyncio.Future) -> MarketComps:
+        try:
+            result = await fetch()
+        except BaseException as exc:
+            self._inflight.pop(key, None)
+            if isinstance(exc, asyncio.CancelledError):
+                # Only the owner was cancelled; waiters see None and fetch for themselves.
+                future.set_result(None)
+            else:
+                future.set_exception(exc)
+                # Mark retrieved so an unobserved failure does not log a warning.
+                future.exception()
+            raise
+        fetched_at = self._clock()
+        self._remember(key, (fetched_at, result))
+        self._inflight.pop(key, None)
+        future.set_result(result)
+        if self.path is not None:
+            await asyncio.to_thread(self._write, key, fetched_at, self._payload(result))
+        return result
+
+    def _refresh_in_background(self, key: str, fetch: CompsFetcher) -> None:
+        if key in self._inflight:
+            return
+
+        # Registered before the task runs so concurrent stale hits don't start more refreshes.
+        future = self._begin(key)
+
+        async def refresh() -> None:
+            self.refreshes += 1
+            try:
+                await self._fetch(key, fetch, future)
+            except Exception as exc:  # noqa: BLE001
+                # Keep serving the stale entry; the next stale hit retries.
+                self.refresh_failures += 1
+                print(f"[CompsCache] Background refresh of {key} failed: {exc}")
+
+        task = asyncio.get_running_loop().create_task(refresh())
+        self._refreshing.add(task)
+        task.add_done_callback(self._refreshing.discard)
+
+    async def _lookup(self, key: str, any_age: bool = False) -> Optional[Tuple[float, MarketComps]]:
+        """Memory, then disk; disk rows past the stale window are skipped unless ``any_age``."""
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return entry
+        if self.path is None:
+            return None
+        row = await asyncio.to_thread(self._read, key)
+        if row is None:
+            return None
+        fetched_at, payload = row
+        if not any_age and self._clock() - fetched_at >= self.ttl_seconds + self.stale_seconds:
+            return None
+        try:
+            data = json.loads(payload)
+            comps = [ComparableProperty.model_validate(item) for item in data["comps"]]
+            entry = (fetched_at, MarketComps(comps, answered=data["answered"], queried=data["queried"]))
+        except (KeyError, TypeError, ValueError) as exc:
+            # A row this version cannot parse is refetched and overwritten.
+            self._disk_error("parse", exc)
+            return None
+        self._remember(key, entry)
+        self.disk_hits += 1
+        return entry
+
+    @staticmethod
+    def _payload(result: MarketComps) -> str:
+        data = {
+            "answered": result.answered,
+            "queried": result.queried,
+            "comps": [comp.model_dump(mode="json") for comp in result.comps],
+        }
+        return json.dumps(data, separators=(",", ":"))
+
+    def _read(self, key: str) -> Optional[Tuple[float, str]]:
+        """The stored row for ``key``; runs in a worker thread."""
+        with self._db_lock:
+            try:
+                return self._connection().execute(
+                    "SELECT fetched_at, payload FROM comps_cache_v2 WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as exc:
+                self._disk_error("read", exc)
+                return None
+
+    def _write(self, key: str, fetched_at: float, payload: str) -> None:
+        """Persist one entry; runs in a worker thread."""
+        with self._db_lock:
+            try:
+                self._connection().execute(
+                    "INSERT OR REPLACE INTO comps_cache_v2 (key, fetched_at, payload) VALUES (?, ?, ?)",
+                    (key, fetched_at, payload),
+                )
+            except sqlite3.Error as exc:
+                self._disk_error("write", exc)
+
+    def _disk_error(self, action: str, exc: Exception) -> None:
+        self.disk_errors += 1
+        print(f"[CompsCache] SQLite {action} failed, treating it as a miss: {exc}")
+
+    def _connection(self) -> sqlite3.Connection:
+        """This process's connection, opened on first use; call with ``_db_lock`` held."""
+        pid = os.getpid()
+        if self._db is None or self._db_pid != pid:
+            # A connection inherited through fork belongs to the parent: never use or close it here.
+            assert self.path is not None
+            self._db = self._open(self.path)
+            self._db_pid = pid
+        return self._db
+
+    def _close_db(self) -> None:
+        with self._db_lock:
+            if self._db is not None and self._db_pid == os.getpid():
+                self._db.close()
+            self._db = None
+            self._db_pid = None
+
+    def _remember(self, key: str, entry: Tuple[float, MarketComps]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def _open(path: Path) -> sqlite3.Connection:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Shared by the worker threads that run lookups; ``_db_lock`` serialises them.
+        db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL: a commit is an append without fsync; a crash loses at most the last few entries.
+            db.execute("PRAGMA synchronous=NORMAL")
+            # v2 rows hold {"answered", "queried", "comps"}; v1 rows (a bare list) are left unread.
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS comps_cache_v2 (key TEXT PRIMARY KEY, fetched_at REAL NOT NULL, payload TEXT NOT NULL)"
+            )
+        except sqlite3.Error:
+            db.close()
+            raise
+        return db
@@ -0,0 +1,427 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.config import Settings
+from app.models.schemas import ComparableProperty, PredictionRequest
+from app.services.comps_ranking import CandidateSet
+
+EARTH_RADIUS_MILES = 3958.7613
+MILES_PER_DEGREE_LAT = 69.05
+
+# Columns of a unit frame, as returned by ``load_units``.
+UNIT_COLUMNS = (
+    "unit_id",
+    "property_id",
+    "address",
+    "zip_code",
+    "latitude",
+    "longitude",
+    "bedrooms",
+    "bathrooms",
+    "square_feet",
+    "rent",
+    "year_built",
+)
+
+# Every unit with coordinates and its lease (any status; a unit has at most one).
+# Units without an active lease, rent or coordinates come back too so an
+# incremental refresh can drop them from the index.
+_UNITS_QUERY = """
+SELECT
+    u.id AS unit_id,
+    u."propertyId" AS property_id,
+    p.address || COALESCE(' #' || u."unitNumber", '') AS address,
+    p."zipCode" AS zip_code,
+    p.latitude,
+    p.longitude,
+    u.bedrooms,
+    u.bathrooms,
+    u."squareFeet" AS square_feet,
+    CASE WHEN l.status = 'ACTIVE' THEN l."rentAmount" END AS rent,
+    p."yearBuilt" AS year_built,
+    GREATEST(p."updatedAt", l."updatedAt") AS updated_at
+FROM "Unit" u
+JOIN "Property" p ON p.id = u."propertyId"
+LEFT JOIN "Lease" l ON l."unitId" = u.id
+"""
+
+# Unit has no updatedAt; new units are found by id (autoincrement), changed ones
+# through their property or lease.
+_CHANGED_SINCE = """
+WHERE p."updatedAt" > %(since)s OR l."updatedAt" > %(since)s OR u.id > %(after_id)s
+"""
+
+
+def haversine_miles(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Great-circle distance in miles from one point to arrays of points (all in degrees)."""
+    lat1 = math.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlon = np.radians(lons) - math.radians(lon)
+    a = np.sin(dlat * 0.5) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon * 0.5) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class CompsIndex:
+    """
+    Immutable grid index over known units and their current rents.
+
+    Units are bucketed into ``cell_degrees`` lat/lon cells and stored sorted by
+    cell, so each latitude row of cells is one contiguous slice found with
+    ``np.searchsorted``. A query gathers the rows around the subject, computes
+    haversine distances for those candidates in one vectorized pass, and grows
+    the searched square until the k nearest matches are provably inside it.
+    Refreshes build a new index with ``apply`` and swap it in, so readers never
+    see a half-updated one.
+    """
+
+    def __init__(self, frame: pd.DataFrame, cell_degrees: float = 0.05):
+        self.cell_degrees = cell_degrees
+        frame = frame.loc[:, list(UNIT_COLUMNS)]
+        lat_cells = np.floor(frame["latitude"].to_numpy(np.float64) / cell_degrees).astype(np.int64)
+        lon_cells = np.floor(frame["longitude"].to_numpy(np.float64) / cell_degrees).astype(np.int64)
+        keys = self._cell_key(lat_cells, lon_cells)
+        order = np.argsort(keys, kind="stable")
+        self.frame = frame.iloc[order].reset_index(drop=True)
+        self._keys = keys[order]
+        self.unit_ids = self.frame["unit_id"].to_numpy(np.int64)
+        self.latitudes = self.frame["latitude"].to_numpy(np.float64)
+        self.longitudes = self.frame["longitude"].to_numpy(np.float64)
+        self.bedrooms = self.frame["bedrooms"].to_numpy(np.float64)
+        self.bathrooms = self.frame["bathrooms"].to_numpy(np.float64)
+        self.square_feet = self.frame["square_feet"].to_numpy(np.float64)
+        self.rents = self.frame["rent"].to_numpy(np.float64)
+        self.year_built = self.frame["year_built"].to_numpy(np.float64)
+        self.addresses = self.frame["address"].to_numpy(object)
+        # Subjects without coordinates are searched from their zip code's centroid.
+        self.zip_centroids: Dict[str, Tuple[float, float]] = {
+            str(zip_code): (float(lat), float(lon))
+            for zip_code, lat, lon in self.frame.groupby("zip_code", sort=False)[["latitude", "longitude"]]
+            .mean()
+            .itertuples()
+        }
+
+    @classmethod
+    def empty(cls, cell_degrees: float = 0.05) -> "CompsIndex":
+        return cls(pd.DataFrame({column: [] for column in UNIT_COLUMNS}), cell_degrees)
+
+    def __len__(self) -> int:
+        return len(self.unit_ids)
+
+    def apply(self, changes: pd.DataFrame, full: bool = False) -> "CompsIndex":
+        """
+        New index with ``changes`` (a unit frame) applied.
+
+        Rows with coordinates, bedrooms and a positive rent are upserted; any
+        other row removes its unit. ``full`` replaces the contents outright.
+        """
+        valid = (
+            changes["latitude"].notna()
+            & changes["longitude"].notna()
+            & changes["bedrooms"].notna()
+            & (changes["rent"].fillna(0) > 0)
+        )
+        upserts = changes.loc[valid, list(UNIT_COLUMNS)].copy()
+        upserts["bathrooms"] = upserts["bathrooms"].fillna(1.0)
+        upserts["square_feet"] = upserts["square_feet"].fillna(0)
+        if full:
+            return CompsIndex(upserts, self.cell_degrees)
+        keep = self.frame.loc[~self.frame["unit_id"].isin(changes["unit_id"])]
+        merged = pd.concat([keep, upserts], ignore_index=True) if len(keep) else upserts
+        return CompsIndex(merged, self.cell_degrees)
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int,
+        radius_miles: float,
+        bedrooms: Optional[float] = None,
+        bathrooms: Optional[float] = None,
+        max_bedroom_diff: float = 0,
+        max_bathroom_diff: float = 0.5,
+        exclude_unit_id: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Up to ``k`` matching units within ``radius_miles``, nearest first.
+
+        Returns ``(positions, distances_miles)``; positions index this index's
+        arrays. ``bedrooms``/``bathrooms`` keep only units within the given
+        differences. ``k=0`` returns every match in the radius.
+        """
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+        if not len(self) or radius_miles <= 0:
+            return empty
+        # Smallest cell side around the subject (longitude cells narrow toward the poles).
+        cos_lat = max(math.cos(math.radians(min(abs(latitude) + self.cell_degrees, 89.0))), 1e-3)
+        cell_miles = self.cell_degrees * MILES_PER_DEGREE_LAT * cos_lat
+        max_rings = max(1, math.ceil(radius_miles / cell_miles))
+        rings = 1 if k else max_rings
+        while True:
+            positions = self._candidates(latitude, longitude, rings)
+            distances = haversine_miles(latitude, longitude, self.latitudes[positions], self.longitudes[positions])
+            mask = distances <= radius_miles
+            if bedrooms is not None:
+                mask &= np.abs(self.bedrooms[positions] - bedrooms) <= max_bedroom_diff
+            if bathrooms is not None:
+                mask &= np.abs(self.bathrooms[positions] - bathrooms) <= max_bathroom_diff
+            if exclude_unit_id is not None:
+                mask &= self.unit_ids[positions] != exclude_unit_id
+            if rings < max_rings:
+                # Anything outside the searched square is at least this far away.
+                mask &= distances <= rings * cell_miles * 0.999
+                if np.count_nonzero(mask) < k:
+                    rings = min(rings * 2, max_rings)
+                    continue
+            positions, distances = positions[mask], distances[mask]
+            if k and len(positions) > k:
+                top = np.argpartition(distances, k - 1)[:k]
+                positions, distances = positions[top], distances[top]
+            order = np.argsort(distances, kind="stable")
+            return positions[order], distances[order]
+
+    def comparables(self, positions: np.ndarray, distances: np.ndarray) -> List[ComparableProperty]:
+        return [
+            ComparableProperty(
+                id=f"unit-{self.unit_ids[pos]}",
+                address=str(self.addresses[pos] or ""),
+                price=float(self.rents[pos]),
+                distance_miles=round(float(distance), 2),
+                bedrooms=int(self.bedrooms[pos]),
+                bathrooms=float(self.bathrooms[pos]),
+                square_feet=int(self.square_feet[pos]),
+            )
+            for pos, distance in zip(positions.tolist(), distances.tolist())
+        ]
+
+    def _candidates(self, latitude: float, longitude: float, rings: int) -> np.ndarray:
+        lat_cell = math.floor(latitude / self.cell_degrees)
+        lon_cell = math.floor(longitude / self.cell_degrees)
+        lat_rows = np.arange(lat_cell - rings, lat_cell + rings + 1, dtype=np.int64)
+        starts = np.searchsorted(self._keys, self._cell_key(lat_rows, lon_cell - rings), "left")
+        ends = np.searchsorted(self._keys, self._cell_key(lat_rows, lon_cell + rings), "right")
+        lengths = ends - starts
+        total = int(lengths.sum())
+        if not total:
+            return np.empty(0, dtype=np.int64)
+        # Concatenate the row slices without a Python loop.
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return offsets + np.arange(total, dtype=np.int64)
+
+    @staticmethod
+    def _cell_key(lat_cells, lon_cells):
+        # Cells in one latitude row are adjacent in key order.
+        return (np.asarray(lat_cells, dtype=np.int64) + (1 << 20)) * (1 << 32) + (
+            np.asarray(lon_cells, dtype=np.int64) + (1 << 20)
+        )
+
+
+def load_units(
+    database_url: str, since: Optional[datetime] = None, after_unit_id: int = 0
+) -> Tuple[pd.DataFrame, Optional[datetime]]:
+    """
+    Unit frame from Postgres: all units, or those changed after ``since``.
+
+    Returns the frame and the newest ``updatedAt`` it saw (the next watermark).
+    """
+    import psycopg2
+
+    query = _UNITS_QUERY + (_CHANGED_SINCE if since is not None else "")
+    with psycopg2.connect(psycopg2_dsn(database_url)) as conn, conn.cursor() as cur:
+        cur.execute(query, {"since": since, "after_id": after_unit_id})
+        rows = cur.fetchall()
+    conn.close()
+    frame = pd.DataFrame(rows, columns=[*UNIT_COLUMNS, "updated_at"])
+    watermark = frame["updated_at"].max() if len(frame) else None
+    frame = frame.drop(columns="updated_at")
+    for column in ("latitude", "longitude", "bedrooms", "bathrooms", "square_feet", "rent", "year_built"):
+        frame[column] = pd.to_numeric(frame[column], errors="coerce").astype(np.float64)
+    frame["unit_id"] = frame["unit_id"].astype(np.int64)
+    frame["zip_code"] = frame["zip_code"].fillna("").astype(str)
+    return frame, (None if pd.isna(watermark) else watermark.to_pydatetime())
+
+
+def psycopg2_dsn(database_url: str) -> str:
+    """``DATABASE_URL`` without Prisma's ``?schema=...``, which libpq rejects."""
+    from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
+
+    parsed = urlparse(database_url)
+    params = parse_qs(parsed.query, keep_blank_values=True)
+    params.pop("schema", None)
+    return urlunparse(parsed._replace(query=urlencode(params, doseq=True)))
+
+
+UnitLoader = Callable[[Optional[datetime], int], Tuple[pd.DataFrame, Optional[datetime]]]
+
+
+class LocalCompsIndex:
+    """
+    Keeps a ``CompsIndex`` of our own units current and answers comps from it.
+
+    The first load runs at start-up; afterwards only units whose property or
+    lease changed since the last watermark (or that are newer than the last
+    unit id) are fetched every ``refresh_seconds``, with a full reload every
+    ``full_reload_seconds`` to drop deleted units. Loads run in a thread and the
+    new index is swapped in whole.
+    """
+
+    # Re-read a little before the watermark so rows committed out of order are not missed.
+    WATERMARK_OVERLAP = timedelta(seconds=60)
+
+    def __init__(
+        self,
+        loader: UnitLoader,
+        cell_degrees: float = 0.05,
+        refresh_seconds: float = 300.0,
+        full_reload_seconds: float = 86400.0,
+        radius_miles: float = 5.0,
+        max_bedroom_diff: float = 0,
+        max_bathroom_diff: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.loader = loader
+        self.index = CompsIndex.empty(cell_degrees)
+        self.refresh_seconds = refresh_seconds
+        self.full_reload_seconds = full_reload_seconds
+        self.radius_miles = radius_miles
+        self.max_bedroom_diff = max_bedroom_diff
+        self.max_bathroom_diff = max_bathroom_diff
+        self._clock = clock
+        self._watermark: Optional[datetime] = None
+        self._max_unit_id = 0
+        self._last_full: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self.loads = 0
+        self.load_failures = 0
+        self.last_load_ms = 0.0
+        self.queries = 0
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> Optional["LocalCompsIndex"]:
+        if not settings.enable_local_comps_index:
+            return None
+        if not settings.database_url:
+            print("[LocalCompsIndex] ENABLE_LOCAL_COMPS_INDEX is set but DATABASE_URL is not; index disabled")
+            return None
+        database_url = settings.database_url
+        return cls(
+            lambda since, after_unit_id: load_units(database_url, since, after_unit_id),
+            cell_degrees=settings.comps_index_cell_degrees,
+            refresh_seconds=settings.comps_index_refresh_seconds,
+            full_reload_seconds=settings.comps_index_full_reload_seconds,
+            radius_miles=settings.comps_index_radius_miles,
+            max_bedroom_diff=settings.comps_index_max_bedroom_diff,
+            max_bathroom_diff=settings.comps_index_max_bathroom_diff,
+        )
+
+    async def start(self) -> None:
+        await self.refresh()
+        if self._task is None and self.refresh_seconds > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def refresh(self) -> bool:
+        """Load changes (or everything, when due) and swap in the new index; False if the load failed."""
+        full = self._last_full is None or self._clock() - self._last_full >= self.full_reload_seconds
+        since = None if full or self._watermark is None else self._watermark - self.WATERMARK_OVERLAP
+        started = time.perf_counter()
+        try:
+            changes, watermark = await asyncio.to_thread(self.loader, since, 0 if full else self._max_unit_id)
+            index = await asyncio.to_thread(self.index.apply, changes, full)
+        except Exception as exc:  # noqa: BLE001
+            self.load_failures += 1
+            print(f"[LocalCompsIndex] Refresh failed, keeping {len(self.index)} units: {exc}")
+            return False
+        self.index = index
+        if full:
+            self._last_full = self._clock()
+        if watermark is not None and (self._watermark is None or watermark > self._watermark):
+            self._watermark = watermark
+        if len(changes):
+            self._max_unit_id = max(self._max_unit_id, int(changes["unit_id"].max()))
+        self.loads += 1
+        self.last_load_ms = (time.perf_counter() - started) * 1000
+        return True
+
+    def comparables(self, request: PredictionRequest, limit: int) -> List[ComparableProperty]:
+        """Nearest similar units with an active lease, excluding the subject itself."""
+        index = self.index
+        positions, distances = self._search(index, request, limit)
+        return index.comparables(positions, distances)
+
+    def candidates(self, requests: Sequence[PredictionRequest], limit: int) -> CandidateSet:
+        """Up to ``limit`` nearest matches per request as ranking columns, without building comps."""
+        return CandidateSet.concat(self.candidate_parts(requests, limit))
+
+    def candidate_parts(self, requests: Sequence[PredictionRequest], limit: int) -> List[dict]:
+        index = self.index
+        parts = []
+        for request in requests:
+            positions, distances = self._search(index, request, limit)
+            parts.append(
+                {
+                    "ids": np.char.add("unit-", index.unit_ids[positions].astype(str)).astype(object),
+                    "addresses": index.addresses[positions],
+                    "prices": index.rents[positions],
+                    "distances": distances,
+                    "bedrooms": index.bedrooms[positions],
+                    "bathrooms": index.bathrooms[positions],
+                    "square_feet": index.square_feet[positions],
+                    "year_built": index.year_built[positions],
+                }
+            )
+        return parts
+
+    def _search(self, index: CompsIndex, request: PredictionRequest, limit: int) -> Tuple[np.ndarray, np.ndarray]:
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+        if not len(index):
+            return empty
+        if request.latitude is not None and request.longitude is not None:
+            origin: Optional[Tuple[float, float]] = (request.latitude, request.longitude)
+        else:
+            origin = index.zip_centroids.get(request.zip_code)
+        if origin is None:
+            return empty
+        self.queries += 1
+        return index.nearest(
+            origin[0],
+            origin[1],
+            k=limit,
+            radius_miles=self.radius_miles,
+            bedrooms=request.bedrooms,
+            bathrooms=request.bathrooms,
+            max_bedroom_diff=self.max_bedroom_diff,
+            max_bathroom_diff=self.max_bathroom_diff,
+            exclude_unit_id=int(request.unit_id) if request.unit_id.isdigit() else None,
+        )
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "units": len(self.index),
+            "loads": self.loads,
+            "load_failures": self.load_failures,
+            "last_load_ms": self.last_load_ms,
+            "queries": self.queries,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            await self.refresh()
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from app.models.schemas import ComparableProperty, PredictionRequest
+
+
+@dataclass
+class CandidateSet:
+    """
+    Candidate comps for a batch of subject units, as flat column arrays.
+
+    Subject ``i`` owns rows ``offsets[i]:offsets[i + 1]`` (CSR layout), so a
+    batch with hundreds of candidates per unit is a handful of arrays rather
+    than thousands of ``ComparableProperty`` objects. ``year_built`` is NaN
+    where unknown. ``coverage`` is, per subject, the fraction of queried
+    sources that answered.
+    """
+
+    offsets: np.ndarray
+    ids: np.ndarray
+    addresses: np.ndarray
+    prices: np.ndarray
+    distances: np.ndarray
+    bedrooms: np.ndarray
+    bathrooms: np.ndarray
+    square_feet: np.ndarray
+    year_built: np.ndarray
+    coverage: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    @property
+    def subjects(self) -> int:
+        return len(self.offsets) - 1
+
+    def counts(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    @classmethod
+    def empty(cls, subjects: int) -> "CandidateSet":
+        return cls.concat([cls._empty_part()] * subjects)
+
+    @classmethod
+    def from_comparables(
+        cls, comparables: Sequence[Sequence[ComparableProperty]], coverage: Optional[Sequence[float]] = None
+    ) -> "CandidateSet":
+        """Candidates from per-subject comp lists (provider or stub answers)."""
+        parts = [cls.part(comps) for comps in comparables]
+        return cls.concat(parts, coverage)
+
+    @staticmethod
+    def part(comps: Sequence[ComparableProperty]) -> dict:
+        """One subject's columns from a list of comps."""
+        return {
+            "ids": np.array([c.id for c in comps], dtype=object),
+            "addresses": np.array([c.address for c in comps], dtype=object),
+            "prices": np.array([c.price for c in comps], dtype=np.float64),
+            "distances": np.array([c.distance_miles for c in comps], dtype=np.float64),
+            "bedrooms": np.array([c.bedrooms for c in comps], dtype=np.float64),
+            "bathrooms": np.array([c.bathrooms for c in comps], dtype=np.float64),
+            "square_feet": np.array([c.square_feet for c in comps], dtype=np.float64),
+            "year_built": np.full(len(comps), np.nan),
+        }
+
+    @classmethod
+    def concat(cls, parts: Sequence[dict], coverage: Optional[Sequence[float]] = None) -> "CandidateSet":
+        """Join per-subject parts (dicts of equal-length column arrays) in subject order."""
+        lengths = np.fromiter((len(part["prices"]) for part in parts), dtype=np.int64, count=len(parts))
+        offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        columns = {}
+        for name, dtype in _COLUMNS:
+            arrays = [part[name] for part in parts]
+            columns[name] = np.concatenate(arrays).astype(dtype, copy=False) if arrays else np.empty(0, dtype=dtype)
+        coverage_array = np.ones(len(parts)) if coverage is None else np.asarray(coverage, dtype=np.float64)
+        return cls(offsets=offsets, coverage=coverage_array, **columns)
+
+    @staticmethod
+    def _empty_part() -> dict:
+        return {name: np.empty(0, dtype=dtype) for name, dtype in _COLUMNS}
+
+
+_COLUMNS = (
+    ("ids", object),
+    ("addresses", object),
+    ("prices", np.float64),
+    ("distances", np.float64),
+    ("bedrooms", np.float64),
+    ("bathrooms", np.float64),
+    ("square_feet", np.float64),
+    ("year_built", np.float64),
+)
+
+
+@dataclass
+class RankedComps:
+    """Top comps per subject (best first), their similarity-weighted mean rent (NaN when none) and source coverage."""
+
+    comparables: List[List[ComparableProperty]]
+    market_avgs: np.ndarray
+    coverage: np.ndarray
+
+
+@dataclass
+class RankingWeights:
+    """Dissimilarity cost per unit of difference; a candidate's similarity is ``1 / (1 + cost)``."""
+
+    distance_per_mile: float = 1.0
+    per_bedroom: float = 1.0
+    per_bathroom: float = 0.5
+    # Per 100% difference in square feet relative to the subject.
+    size_ratio: float = 2.0
+    per_decade_of_age: float = 0.2
+
+
+class CompsRanker:
+    """
+    Scores every candidate of a batch in one vectorized pass and keeps the top k per subject.
+
+    Subject attributes are broadcast onto candidate rows through the CSR owner
+    index, the costs are laid out as a padded ``subjects x max_candidates``
+    matrix, and ``np.argpartition`` picks each row's k cheapest in linear time.
+    ``ComparableProperty`` objects are only built for those winners.
+    """
+
+    def __init__(self, weights: Optional[RankingWeights] = None):
+        self.weights = weights or RankingWeights()
+
+    def rank(self, subjects: Sequence[PredictionRequest], candidates: CandidateSet, k: int) -> RankedComps:
+        n = len(subjects)
+        counts = candidates.counts()
+        width = int(counts.max()) if n else 0
+        if not width or k <= 0:
+            return RankedComps([[] for _ in range(n)], np.full(n, np.nan), candidates.coverage)
+
+        costs = self.costs(subjects, candidates)
+        owner = np.repeat(np.arange(n), counts)
+        matrix = np.full((n, width), np.inf)
+        matrix[owner, np.arange(len(candidates)) - candidates.offsets[owner]] = costs
+
+        k = min(k, width)
+        top = np.argpartition(matrix, k - 1, axis=1)[:, :k] if k < width else np.tile(np.arange(width), (n, 1))
+        top_costs = np.take_along_axis(matrix, top, axis=1)
+        order = np.argsort(top_costs, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_costs = np.take_along_axis(top_costs, order, axis=1)
+        valid = np.isfinite(top_costs)
+        rows = candidates.offsets[:-1, None] + top
+
+        weights = np.where(valid, 1.0 / (1.0 + np.where(valid, top_costs, 0.0)), 0.0)
+        prices = np.where(valid, candidates.prices[np.where(valid, rows, 0)], 0.0)
+        weight_sums = weights.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            market_avgs = np.where(weight_sums > 0, (weights * prices).sum(axis=1) / weight_sums, np.nan)
+
+        # Gather the winners' columns once, then build objects from plain Python values.
+        winners = rows[valid]
+        built = iter(self._comparables(candidates, winners))
+        comparables = [[next(built) for _ in range(count)] for count in valid.sum(axis=1).tolist()]
+        return RankedComps(comparables, market_avgs, candidates.coverage)
+
+    def costs(self, subjects: Sequence[PredictionRequest], candidates: CandidateSet) -> np.ndarray:
+        """Dissimilarity of every candidate row to its own subject (lower is better)."""
+        w = self.weights
+        owner = np.repeat(np.arange(len(subjects)), candidates.counts())
+        subject_beds = np.array([s.bedrooms for s in subjects], dtype=np.float64)[owner]
+        subject_baths = np.array([s.bathrooms for s in subjects], dtype=np.float64)[owner]
+        subject_sqft = np.array([max(s.square_feet, 1) for s in subjects], dtype=np.float64)[owner]
+        subject_built = np.array(
+            [s.year_built if s.year_built is not None else np.nan for s in subjects], dtype=np.float64
+        )[owner]
+
+        cost = w.distance_per_mile * candidates.distances
+        cost += w.per_bedroom * np.abs(candidates.bedrooms - subject_beds)
+        cost += w.per_bathroom * np.abs(candidates.bathrooms - subject_baths)
+        # Unknown sizes (0) and ages (NaN) add nothing rather than disqualifying a comp.
+        size_gap = np.abs(candidates.square_feet - subject_sqft) / subject_sqft
+        cost += w.size_ratio * np.where(candidates.square_feet > 0, size_gap, 0.0)
+        age_gap = np.abs(candidates.year_built - subject_built) / 10.0
+        cost += w.per_decade_of_age * np.nan_to_num(age_gap, nan=0.0)
+        return cost
+
+    @staticmethod
+    def _comparables(candidates: CandidateSet, rows: np.ndarray) -> List[ComparableProperty]:
+        columns = zip(
+            candidates.ids[rows].tolist(),
+            candidates.addresses[rows].tolist(),
+            candidates.prices[rows].tolist(),
+            np.round(candidates.distances[rows], 2).tolist(),
+            candidates.bedrooms[rows].astype(np.int64).tolist(),
+            candidates.bathrooms[rows].tolist(),
+            candidates.square_feet[rows].astype(np.int64).tolist(),
+        )
+        return [
+            ComparableProperty(
+                id=str(comp_id),
+                address=str(address or ""),
+                price=price,
+                distance_miles=distance,
+                bedrooms=bedrooms,
+                bathrooms=bathrooms,
+                square_feet=square_feet,
+            )
+            for comp_id, address, price, distance, bedrooms, bathrooms, square_feet in columns
+        ]
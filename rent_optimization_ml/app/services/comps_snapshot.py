@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.models.schemas import ComparableProperty, PredictionRequest
+from app.services.market_providers import MarketComps
+
+SNAPSHOT_META = "snapshot.json"
+
+# Per-comp columns (CSR rows) and per-group columns, with their on-disk dtypes.
+COMP_COLUMNS = {
+    "prices": np.float64,
+    "distances": np.float64,
+    "bedrooms": np.float64,
+    "bathrooms": np.float64,
+    "square_feet": np.float64,
+}
+GROUP_COLUMNS = {"offsets": np.int64, "answered": np.int32, "queried": np.int32}
+TEXT_COLUMNS = ("keys", "ids", "addresses")
+
+
+def snapshot_key(zip_code: str, bedrooms: float, bathrooms: float) -> str:
+    """Group key: zip code, bedrooms and the half-bath band."""
+    return f"{zip_code}|{int(bedrooms)}|{round(bathrooms * 2) / 2:g}"
+
+
+class CompsSnapshot:
+    """
+    Nightly comps for every (zip code, bedrooms, bathrooms band) in the portfolio.
+
+    Written by ``scripts/prefetch_comps.py`` as one ``.npy`` file per column
+    (CSR layout: group ``i`` owns comp rows ``offsets[i]:offsets[i + 1]``) and
+    memory-mapped read-only at start-up, so every worker shares the pages and a
+    lookup is one dict probe plus a few array slices. Once the snapshot is
+    older than ``max_age_seconds`` every lookup is a miss.
+    """
+
+    def __init__(
+        self, path: Path, arrays: Dict[str, np.ndarray], meta: Dict[str, Any], max_age_seconds: float = 0.0
+    ):
+        self.path = path
+        self.arrays = arrays
+        self.meta = meta
+        self.max_age_seconds = max_age_seconds
+        self._groups = {key: idx for idx, key in enumerate(arrays["keys"].tolist())}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True, max_age_seconds: float = 0.0) -> "CompsSnapshot":
+        meta = json.loads((path / SNAPSHOT_META).read_text())
+        mode = "r" if mmap else None
+        arrays = {
+            name: np.load(path / f"{name}.npy", mmap_mode=mode)
+            for name in (*COMP_COLUMNS, *GROUP_COLUMNS, *TEXT_COLUMNS)
+        }
+        return cls(path, arrays, meta, max_age_seconds)
+
+    @staticmethod
+    def write(path: Path, entries: Iterable[Tuple[str, MarketComps]], meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Write ``(key, comps)`` entries as a snapshot directory and return its metadata.
+
+        Files go to a sibling temp directory that then replaces ``path``, so a
+        reader never sees a half-written snapshot.
+        """
+        keys: List[str] = []
+        columns: Dict[str, List[Any]] = {name: [] for name in (*COMP_COLUMNS, "ids", "addresses")}
+        offsets = [0]
+        answered: List[int] = []
+        queried: List[int] = []
+        for key, result in sorted(entries, key=lambda entry: entry[0]):
+            keys.append(key)
+            answered.append(result.answered)
+            queried.append(result.queried)
+            for comp in result.comps:
+                columns["prices"].append(comp.price)
+                columns["distances"].append(comp.distance_miles)
+                columns["bedrooms"].append(comp.bedrooms)
+                columns["bathrooms"].append(comp.bathrooms)
+                columns["square_feet"].append(comp.square_feet)
+                columns["ids"].append(comp.id)
+                columns["addresses"].append(comp.address)
+            offsets.append(offsets[-1] + len(result.comps))
+
+        staging = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        for name, dtype in COMP_COLUMNS.items():
+            np.save(staging / f"{name}.npy", np.asarray(columns[name], dtype=dtype))
+        np.save(staging / "offsets.npy", np.asarray(offsets, dtype=GROUP_COLUMNS["offsets"]))
+        np.save(staging / "answered.npy", np.asarray(answered, dtype=GROUP_COLUMNS["answered"]))
+        np.save(staging / "queried.npy", np.asarray(queried, dtype=GROUP_COLUMNS["queried"]))
+        # Fixed-width unicode, not object arrays, so the text columns can be memory-mapped too.
+        for name, values in (("keys", keys), ("ids", columns["ids"]), ("addresses", columns["addresses"])):
+            np.save(staging / f"{name}.npy", np.asarray(values, dtype=str) if values else np.empty(0, dtype="<U1"))
+        meta = {
+            **(meta or {}),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "created_ts": time.time(),
+            "groups": len(keys),
+            "comps": offsets[-1],
+        }
+        (staging / SNAPSHOT_META).write_text(json.dumps(meta, indent=2))
+
+        previous = path.with_name(f".{path.name}.old-{os.getpid()}")
+        if path.exists():
+            path.rename(previous)
+        staging.rename(path)
+        # Workers still mapping the old files keep them alive until they restart.
+        shutil.rmtree(previous, ignore_errors=True)
+        return meta
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def lookup(self, request: PredictionRequest) -> Optional[int]:
+        if self.expired():
+            self.misses += 1
+            return None
+        group = self._groups.get(snapshot_key(request.zip_code, request.bedrooms, request.bathrooms))
+        if group is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return group
+
+    def age_seconds(self) -> float:
+        return time.time() - float(self.meta.get("created_ts", time.time()))
+
+    def expired(self) -> bool:
+        return self.max_age_seconds > 0 and self.age_seconds() > self.max_age_seconds
+
+    def coverage(self, group: int) -> float:
+        queried = int(self.arrays["queried"][group])
+        return int(self.arrays["answered"][group]) / queried if queried else 0.0
+
+    def candidate_part(self, group: int) -> Dict[str, np.ndarray]:
+        """The group's comps as ``CandidateSet`` columns (age is not stored)."""
+        start, end = self._rows(group)
+        arrays = self.arrays
+        return {
+            "ids": arrays["ids"][start:end].astype(object),
+            "addresses": arrays["addresses"][start:end].astype(object),
+            **{name: np.asarray(arrays[name][start:end]) for name in COMP_COLUMNS},
+            "year_built": np.full(end - start, np.nan),
+        }
+
+    def market_comps(self, group: int) -> MarketComps:
+        start, end = self._rows(group)
+        arrays = self.arrays
+        comps = [
+            ComparableProperty(
+                id=str(arrays["ids"][row]),
+                address=str(arrays["addresses"][row]),
+                price=float(arrays["prices"][row]),
+                distance_miles=float(arrays["distances"][row]),
+                bedrooms=int(arrays["bedrooms"][row]),
+                bathrooms=float(arrays["bathrooms"][row]),
+                square_feet=int(arrays["square_feet"][row]),
+            )
+            for row in range(start, end)
+        ]
+        return MarketComps(
+            comps, answered=int(arrays["answered"][group]), queried=int(arrays["queried"][group])
+        )
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "groups": len(self),
+            "comps": int(self.meta.get("comps", 0)),
+            "age_hours": self.age_seconds() / 3600,
+            "expired": int(self.expired()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _rows(self, group: int) -> Tuple[int, int]:
+        offsets = self.arrays["offsets"]
+        return int(offsets[group]), int(offsets[group + 1])
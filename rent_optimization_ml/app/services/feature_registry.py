@@ -0,0 +1,228 @@
+"""
+Engineered model features, declared once for training and serving.
+
+Each ``Feature`` names its input columns and a vectorized function of them.
+Training evaluates the registry column-wise over the extracted frame
+(``scripts/prepare_features.py``); serving evaluates the same definitions over
+the raw request columns of a batch (``FeatureExtractor``). Bucketed and
+categorical features are fitted on the training rows first; their edges and
+vocabularies are persisted in the ``FeatureSpec`` so serving, and the next
+training run, apply exactly the same ones.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Callable, Collection, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+Columns = Mapping[str, np.ndarray]
+
+
+@dataclass(frozen=True)
+class Feature:
+    """
+    One engineered column.
+
+    ``kind`` is ``"derived"`` (``compute`` of the input columns), ``"bucket"``
+    (quantile bins of ``inputs[0]``, fitted on at least ``min_rows`` rows) or
+    ``"category"`` (codes of ``inputs[0]`` in a fitted vocabulary; values
+    outside it are -1). Inputs may name earlier features.
+    """
+
+    name: str
+    inputs: Tuple[str, ...]
+    kind: str = "derived"
+    compute: Optional[Callable[[Columns], np.ndarray]] = None
+    buckets: int = 4
+    min_rows: int = 0
+
+
+def _ratio(numerator: str, denominator: str) -> Callable[[Columns], np.ndarray]:
+    # Denominators below 1 (no rent, no requests) count as 1, as the original .clip(lower=1) did.
+    return lambda c: c[numerator] / np.maximum(c[denominator], 1)
+
+
+def _property_age_bucket(c: Columns) -> np.ndarray:
+    # 0=new (<5yr), 1=recent (5-15yr), 2=established (15-30yr), 3=old (>=30yr): pd.cut(right=False) bins.
+    age = np.asarray(c["property_age"], dtype=np.float64)
+    buckets = np.searchsorted(np.array([5.0, 15.0, 30.0]), age, side="right")
+    # Unknown age defaults to "recent".
+    return np.where(np.isnan(age), 1, buckets)
+
+
+FEATURES: Dict[str, Feature] = {
+    feature.name: feature
+    for feature in (
+        # Uses current_rent, not achieved_rent (the target), to avoid leakage.
+        Feature("rent_per_sqft", ("current_rent", "square_feet"), compute=lambda c: c["current_rent"] / c["square_feet"]),
+        Feature("bath_per_bed", ("bathrooms", "bedrooms"), compute=_ratio("bathrooms", "bedrooms")),
+        Feature("size_bucket", ("square_feet",), kind="bucket", buckets=4, min_rows=4),
+        Feature(
+            "operating_cost_to_rent_ratio",
+            ("total_operating_cost_monthly", "current_rent"),
+            compute=_ratio("total_operating_cost_monthly", "current_rent"),
+        ),
+        Feature(
+            "maintenance_to_rent_ratio",
+            ("maintenance_monthly_avg", "current_rent"),
+            compute=_ratio("maintenance_monthly_avg", "current_rent"),
+        ),
+        Feature(
+            "cost_efficiency_score",
+            ("total_operating_cost_per_sqft",),
+            compute=lambda c: 1 / (c["total_operating_cost_per_sqft"] + 0.01),
+        ),
+        Feature("vacancy_penalty", ("vacancy_rate", "current_rent"), compute=lambda c: c["vacancy_rate"] * c["current_rent"]),
+        Feature(
+            "vacancy_adjusted_rent",
+            ("vacancy_rate", "current_rent"),
+            compute=lambda c: c["current_rent"] * (1 - c["vacancy_rate"]),
+        ),
+        Feature(
+            "maintenance_cost_per_request",
+            ("maintenance_monthly_avg", "maintenance_requests_12mo"),
+            compute=_ratio("maintenance_monthly_avg", "maintenance_requests_12mo"),
+        ),
+        Feature(
+            "maintenance_burden",
+            ("maintenance_requests_per_unit", "maintenance_monthly_avg"),
+            compute=lambda c: c["maintenance_requests_per_unit"] * c["maintenance_monthly_avg"],
+        ),
+        Feature("property_age_bucket", ("property_age",), compute=_property_age_bucket),
+        Feature("city_encoded", ("city",), kind="category"),
+        Feature("state_encoded", ("state",), kind="category"),
+        # Already 0-1 from the query; replaces the raw column.
+        Feature(
+            "market_competition_score",
+            ("market_competition_score",),
+            compute=lambda c: np.clip(c["market_competition_score"], 0, 1),
+        ),
+    )
+}
+
+
+class FittedFeatures:
+    """
+    Fitted state of the bucket and category features: bin edges and vocabularies.
+
+    Holds plain dicts in the ``FeatureSpec`` layout and caches the lookup
+    structures built from them, so a compiled extractor pays for those once.
+    """
+
+    def __init__(
+        self,
+        encodings: Optional[Mapping[str, Mapping[str, int]]] = None,
+        bucket_edges: Optional[Mapping[str, Sequence[float]]] = None,
+    ):
+        self.encodings: Dict[str, Dict[str, int]] = {name: dict(v) for name, v in (encodings or {}).items()}
+        self.bucket_edges: Dict[str, List[float]] = {name: list(v) for name, v in (bucket_edges or {}).items()}
+        self._lookups: Dict[str, Tuple[pd.Index, np.ndarray]] = {}
+        self._inner_edges: Dict[str, np.ndarray] = {}
+
+    def has(self, feature: Feature) -> bool:
+        if feature.kind == "category":
+            return feature.name in self.encodings
+        if feature.kind == "bucket":
+            return feature.name in self.bucket_edges
+        return True
+
+    def codes(self, name: str, values: np.ndarray) -> np.ndarray:
+        lookup = self._lookups.get(name)
+        if lookup is None:
+            vocabulary = self.encodings[name]
+            lookup = (pd.Index(list(vocabulary), dtype=object), np.array(list(vocabulary.values()), dtype=np.int64))
+            self._lookups[name] = lookup
+        index, codes = lookup
+        positions = index.get_indexer(values)
+        return np.where(positions >= 0, codes[positions], -1)
+
+    def buckets(self, name: str, values: np.ndarray) -> np.ndarray:
+        inner = self._inner_edges.get(name)
+        if inner is None:
+            inner = self._inner_edges[name] = np.asarray(self.bucket_edges[name][1:-1], dtype=np.float64)
+        # Right-closed bins, matching pd.qcut/pd.cut; values outside the range clip to the end buckets.
+        buckets = np.searchsorted(inner, values, side="left")
+        missing = np.isnan(values)
+        return np.where(missing, np.nan, buckets) if missing.any() else buckets
+
+
+def _vocabulary(values: np.ndarray, previous: Optional[Mapping[str, int]]) -> Dict[str, int]:
+    # Known values keep their codes; new ones are appended in sorted order, so codes are stable across runs.
+    vocabulary = dict(previous or {})
+    new = sorted({value for value in pd.unique(values) if isinstance(value, str)} - vocabulary.keys())
+    start = max(vocabulary.values(), default=-1) + 1
+    vocabulary.update({value: start + offset for offset, value in enumerate(new)})
+    return vocabulary
+
+
+def _edges(values: np.ndarray, buckets: int) -> List[float]:
+    try:
+        _, edges = pd.qcut(values, q=buckets, labels=False, duplicates="drop", retbins=True)
+    except ValueError:
+        # Too few distinct values for quantiles: equal-width bins instead.
+        _, edges = pd.cut(values, bins=buckets, labels=False, duplicates="drop", retbins=True)
+    return [float(edge) for edge in edges]
+
+
+def available_features(columns: Collection[str], fitted: Optional[FittedFeatures] = None) -> List[str]:
+    """Registry features, in order, whose inputs are all in ``columns`` (or earlier features) and that are fitted."""
+    known = set(columns)
+    names = []
+    for feature in FEATURES.values():
+        if all(source in known for source in feature.inputs) and (fitted is None or fitted.has(feature)):
+            names.append(feature.name)
+            known.add(feature.name)
+    return names
+
+
+def fit_features(
+    columns: Columns,
+    rows: int,
+    encodings: Optional[Mapping[str, Mapping[str, int]]] = None,
+    bucket_edges: Optional[Mapping[str, Sequence[float]]] = None,
+) -> FittedFeatures:
+    """
+    Fit every bucket and category feature whose input is in ``columns``.
+
+    ``encodings`` are the vocabularies of a previous model; their codes are kept
+    and only unseen values are added. ``bucket_edges`` given for a feature are
+    kept as they are, for models that extend a previous one's trees.
+    """
+    fitted = FittedFeatures()
+    for feature in FEATURES.values():
+        source = feature.inputs[0]
+        if source not in columns:
+            continue
+        if feature.kind == "category":
+            fitted.encodings[feature.name] = _vocabulary(columns[source], (encodings or {}).get(feature.name))
+        elif feature.kind == "bucket" and bucket_edges and feature.name in bucket_edges:
+            fitted.bucket_edges[feature.name] = list(bucket_edges[feature.name])
+        elif feature.kind == "bucket" and rows >= feature.min_rows:
+            fitted.bucket_edges[feature.name] = _edges(columns[source], feature.buckets)
+    return fitted
+
+
+def compute_features(columns: Columns, names: Iterable[str], fitted: FittedFeatures) -> Dict[str, np.ndarray]:
+    """
+    Evaluate ``names`` over ``columns`` (1-D arrays of equal length), in registry order.
+
+    Returns one array per name. Every input must be present; see
+    ``available_features``.
+    """
+    wanted = set(names)
+    scope: Dict[str, Any] = dict(columns)
+    out: Dict[str, np.ndarray] = {}
+    for feature in FEATURES.values():
+        if feature.name not in wanted:
+            continue
+        if feature.kind == "category":
+            values = fitted.codes(feature.name, scope[feature.inputs[0]])
+        elif feature.kind == "bucket":
+            values = fitted.buckets(feature.name, np.asarray(scope[feature.inputs[0]], dtype=np.float64))
+        else:
+            values = feature.compute(scope)
+        scope[feature.name] = out[feature.name] = values
+    return out
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from datetime import date
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.feature_registry import FEATURES, FittedFeatures, available_features, compute_features
+
+# Columns appended to every extracted matrix so the heuristic fallback can run
+# whatever the model was trained on. Kept in this order at the matrix tail.
+BASE_COLUMNS = ("bedrooms", "bathrooms", "square_feet", "current_rent")
+
+# PredictionRequest fields that can feed a model column directly.
+NUMERIC_REQUEST_FIELDS = (
+    "bedrooms",
+    "bathrooms",
+    "square_feet",
+    "current_rent",
+    "has_parking",
+    "has_laundry",
+    "has_pool",
+    "has_gym",
+    "has_hvac",
+    "is_furnished",
+    "pets_allowed",
+    "year_built",
+    "latitude",
+    "longitude",
+    "floor_number",
+)
+
+# PredictionRequest text fields that categorical features can encode.
+TEXT_REQUEST_FIELDS = ("city", "state", "zip_code")
+
+SPEC_FORMAT_VERSION = 1
+
+
+def spec_path_for(artifact_path: Path) -> Path:
+    """Feature spec sidecar that training writes next to the model artifact."""
+    return artifact_path.with_name(f"{artifact_path.stem}.features.json")
+
+
+@dataclass
+class FeatureSpec:
+    """
+    Ordered model inputs persisted by ``scripts/train_model.py``.
+
+    ``fill_values`` replace anything a request cannot provide (the training
+    medians), ``encodings`` hold the categorical vocabularies and
+    ``bucket_edges`` the bin edges of bucketed columns (the fitted state of
+    ``feature_registry``), and ``sources`` record the column each encoded or
+    bucketed column was computed from. ``metadata["artifact_sha256"]`` ties
+    the spec to the artifact it was written for.
+    """
+
+    columns: List[str]
+    dtype: str = "float32"
+    fill_values: Dict[str, float] = field(default_factory=dict)
+    encodings: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    bucket_edges: Dict[str, List[float]] = field(default_factory=dict)
+    sources: Dict[str, str] = field(default_factory=dict)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    format_version: int = SPEC_FORMAT_VERSION
+
+    @classmethod
+    def legacy(cls) -> "FeatureSpec":
+        """Spec for artifacts without a sidecar: the original 4-column float64 vector."""
+        return cls(columns=list(BASE_COLUMNS), dtype="float64", fill_values={c: 0.0 for c in BASE_COLUMNS})
+
+    @classmethod
+    def load(cls, path: Path) -> "FeatureSpec":
+        data = json.loads(path.read_text())
+        return cls(**data)
+
+    def save(self, path: Path) -> None:
+        # Through a temp file so a reader never sees a half-written spec.
+        staging = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+        staging.write_text(json.dumps(asdict(self), indent=2, sort_keys=True))
+        os.replace(staging, path)
+
+    def compile(self) -> "FeatureExtractor":
+        return FeatureExtractor(self)
+
+
+class FeatureExtractor:
+    """
+    Compiled request-to-matrix writer for one ``FeatureSpec``.
+
+    Columns are resolved once: request fields are copied, engineered columns
+    are computed by the shared ``feature_registry`` definitions over the raw
+    request columns of the whole batch, and anything a request cannot provide
+    (e.g. operating costs) is the training fill value. Raw columns are
+    gathered straight from the request attributes (no ``model_dump`` dicts)
+    and every feature is written into a preallocated matrix. The last
+    ``len(BASE_COLUMNS)`` columns are the base features used by the heuristic
+    fallback.
+    """
+
+    def __init__(self, spec: FeatureSpec):
+        self.spec = spec
+        self.columns = list(spec.columns)
+        self.model_width = len(self.columns)
+        self.width = self.model_width + len(BASE_COLUMNS)
+        self.dtype = np.dtype(spec.dtype)
+        self._fill = np.array([spec.fill_values.get(c, 0.0) for c in self.columns], dtype=np.float64)
+        self._fitted = FittedFeatures(spec.encodings, spec.bucket_edges)
+
+        servable = available_features(
+            set(NUMERIC_REQUEST_FIELDS) | set(TEXT_REQUEST_FIELDS) | set(REQUEST_ADAPTERS), self._fitted
+        )
+        self._engineered = [name for name in self.columns if name in servable and name not in NUMERIC_REQUEST_FIELDS]
+        inputs = _inputs_of(self._engineered) | {name for name in self.columns if name in REQUEST_ADAPTERS}
+        self._adapters = sorted(inputs & set(REQUEST_ADAPTERS))
+        for name in self._adapters:
+            inputs |= set(REQUEST_ADAPTERS[name][0])
+        self._text_fields = sorted(inputs & set(TEXT_REQUEST_FIELDS))
+        self._numeric_fields = sorted(
+            ({name for name in self.columns if name in NUMERIC_REQUEST_FIELDS} | inputs | set(BASE_COLUMNS))
+            & set(NUMERIC_REQUEST_FIELDS)
+        )
+
+    def __call__(self, payloads: Sequence[Any]) -> np.ndarray:
+        return self.extract(payloads)
+
+    def __reduce__(self):
+        # Fitted lookups are caches; ship the spec and recompile on the other side.
+        return (FeatureExtractor, (self.spec,))
+
+    def extract(self, payloads: Sequence[Any]) -> np.ndarray:
+        count = len(payloads)
+        raw: Dict[str, np.ndarray] = {
+            name: np.array([getattr(p, name, None) for p in payloads], dtype=np.float64).reshape(count)
+            for name in self._numeric_fields
+        }
+        for name in self._text_fields:
+            raw[name] = np.array([getattr(p, name, None) for p in payloads], dtype=object).reshape(count)
+        for name in self._adapters:
+            raw[name] = REQUEST_ADAPTERS[name][1](raw)
+        engineered = compute_features(raw, self._engineered, self._fitted)
+
+        matrix = np.empty((count, self.width), dtype=self.dtype)
+        for idx, name in enumerate(self.columns):
+            values = engineered.get(name)
+            if values is None:
+                values = raw.get(name)
+            if values is None:
+                # Not derivable from a request: always the training fill value.
+                matrix[:, idx] = self._fill[idx]
+                continue
+            values = np.asarray(values, dtype=np.float64)
+            if np.isnan(values).any():
+                values = np.where(np.isnan(values), self._fill[idx], values)
+            matrix[:, idx] = values
+        for offset, name in enumerate(BASE_COLUMNS):
+            matrix[:, self.model_width + offset] = np.nan_to_num(raw[name], nan=0.0)
+        return matrix
+
+    def extract_mapping(self, features: Mapping[str, Any]) -> np.ndarray:
+        """Extract one row from a plain mapping (missing keys use fill values)."""
+        return self.extract([SimpleNamespace(**features)])
+
+
+def _property_age(raw: Mapping[str, np.ndarray]) -> np.ndarray:
+    return date.today().year - raw["year_built"]
+
+
+# Training columns a request carries in another form: name -> (request fields, conversion).
+REQUEST_ADAPTERS: Dict[str, Tuple[Tuple[str, ...], Callable[[Mapping[str, np.ndarray]], np.ndarray]]] = {
+    "property_age": (("year_built",), _property_age),
+}
+
+
+def _inputs_of(names: Sequence[str]) -> set:
+    # Raw columns behind ``names``, following inputs that are themselves features.
+    pending, inputs = list(names), set()
+    while pending:
+        feature = FEATURES[pending.pop()]
+        for source in feature.inputs:
+            if source in FEATURES and source != feature.name and source not in inputs:
+                pending.append(source)
+            inputs.add(source)
+    return inputs
+
+
+def load_spec_for(artifact_path: Path) -> Optional[FeatureSpec]:
+    path = spec_path_for(artifact_path)
+    if not path.exists():
+        return None
+    try:
+        return FeatureSpec.load(path)
+    except Exception as exc:  # noqa: BLE001
+        print(f"[FeatureSpec] Ignoring unreadable spec at {path}: {exc}")
+        return None
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from dataclasses import dataclass, fields
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+
+FOREST_ARRAYS = ("feature", "threshold", "left", "right", "value", "roots")
+FOREST_FORMAT_VERSION = 1
+
+# Rows traversed at once; bounds the n_trees * rows node-index arrays.
+PREDICT_CHUNK_ROWS = 4096
+
+
+def forest_root_for(artifact_path: Path) -> Path:
+    """Directory holding the flattened forests exported for the artifacts published at ``artifact_path``."""
+    return artifact_path.with_name(f"{artifact_path.stem}.forest")
+
+
+def forest_dir_for(artifact_path: Path, artifact_sha256: str) -> Path:
+    """
+    Directory the flattened forest of one artifact version is exported to.
+
+    Keyed by the artifact's sha256 so a retrain never rewrites files that
+    workers still serving the previous model have memory-mapped (or re-open
+    by path in process workers); old versions are left in place.
+    """
+    return forest_root_for(artifact_path) / artifact_sha256[:16]
+
+
+@dataclass
+class ArrayForest:
+    """
+    A tree ensemble flattened into contiguous NumPy arrays.
+
+    Nodes of every tree live in one set of arrays indexed globally; ``roots``
+    holds each tree's root index. Leaves point ``left``/``right`` at themselves,
+    so a level-synchronous traversal of all trees and all rows at once needs no
+    branching; pairs that reach a leaf leave the active set, so the work is the
+    total path length rather than ``max_depth`` steps for every pair.
+    Matches sklearn bit-for-bit: inputs are cast to float32, compared with
+    ``<=`` against float64 thresholds, and tree outputs are summed in estimator
+    order before dividing by the tree count.
+    """
+
+    feature: np.ndarray
+    threshold: np.ndarray
+    left: np.ndarray
+    right: np.ndarray
+    value: np.ndarray
+    roots: np.ndarray
+    max_depth: int
+    n_features: int
+
+    @classmethod
+    def from_sklearn(cls, model: Any) -> "ArrayForest":
+        estimators = getattr(model, "estimators_", None)
+        if not estimators:
+            raise ValueError(f"{type(model).__name__} has no fitted tree estimators to export")
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            if tree.n_outputs != 1:
+                raise ValueError("Only single-output regression forests can be exported")
+            nodes = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, nodes, tree.children_right) + offset)
+            values.append(tree.value[:, 0, 0])
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, int(tree.max_depth))
+
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts).astype(np.int32),
+            right=np.concatenate(rights).astype(np.int32),
+            value=np.concatenate(values).astype(np.float64),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth,
+            n_features=int(model.n_features_in_),
+        )
+
+    @classmethod
+    def load(cls, directory: Path, mmap_mode: Optional[str] = None) -> "ArrayForest":
+        meta = json.loads((directory / "forest.json").read_text())
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode=mmap_mode) for name in FOREST_ARRAYS}
+        return cls(**arrays, max_depth=meta["max_depth"], n_features=meta["n_features"])
+
+    def __reduce__(self):
+        # Memory-mapped forests travel to process workers as their directory, not as array copies.
+        if isinstance(self.feature, np.memmap) and self.feature.filename:
+            return (ArrayForest.load, (Path(self.feature.filename).parent, "r"))
+        return (ArrayForest, tuple(getattr(self, f.name) for f in fields(self)))
+
+    @staticmethod
+    def read_metadata(directory: Path) -> dict:
+        return json.loads((directory / "forest.json").read_text())
+
+    def save(self, directory: Path, artifact_sha256: Optional[str] = None) -> None:
+        """
+        Write the arrays to ``directory``, which must not exist yet.
+
+        Files go to a sibling temp directory that is then renamed into place,
+        so a reader never sees a half-written forest.
+        """
+        if directory.exists():
+            raise FileExistsError(f"Array forest directory {directory} already exists")
+        staging = directory.with_name(f".{directory.name}.tmp-{os.getpid()}")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        for name in FOREST_ARRAYS:
+            np.save(staging / f"{name}.npy", np.ascontiguousarray(getattr(self, name)))
+        meta = {
+            "format_version": FOREST_FORMAT_VERSION,
+            "max_depth": self.max_depth,
+            "n_features": self.n_features,
+            "n_trees": int(len(self.roots)),
+            "n_nodes": int(len(self.feature)),
+            "artifact_sha256": artifact_sha256,
+        }
+        (staging / "forest.json").write_text(json.dumps(meta, indent=2))
+        try:
+            staging.rename(directory)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[-1]} features, but the forest expects {self.n_features}")
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        out = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), PREDICT_CHUNK_ROWS):
+            out[start : start + PREDICT_CHUNK_ROWS] = self._predict_chunk(X[start : start + PREDICT_CHUNK_ROWS])
+        return out
+
+    def _predict_chunk(self, X: np.ndarray) -> np.ndarray:
+        n_rows = len(X)
+        flat_X = X.reshape(-1)
+        # One entry per (tree, row) pair, tree-major so leaf values sum in estimator order.
+        nodes = np.repeat(self.roots, n_rows)
+        row_offsets = np.tile(np.arange(n_rows, dtype=np.int64) * self.n_features, len(self.roots))
+        active = np.flatnonzero(self.left[nodes] != nodes)
+        for _ in range(self.max_depth):
+            if not len(active):
+                break
+            current = nodes[active]
+            go_left = flat_X[row_offsets[active] + self.feature[current]] <= self.threshold[current]
+            advanced = np.where(go_left, self.left[current], self.right[current])
+            nodes[active] = advanced
+            # Deep trees are lopsided: drop pairs that reached a leaf instead of stepping them again.
+            active = active[self.left[advanced] != advanced]
+
+        leaf_values = self.value[nodes].reshape(len(self.roots), n_rows)
+        total = np.zeros(n_rows, dtype=np.float64)
+        for tree_values in leaf_values:
+            total += tree_values
+        total /= len(self.roots)
+        return total
+
+
+def export_forest(model: Any, directory: Path, X_check: np.ndarray, artifact_sha256: Optional[str] = None) -> ArrayForest:
+    """
+    Flatten ``model`` into ``directory`` after verifying it against sklearn on ``X_check``.
+
+    Raises ``ValueError`` (and writes nothing) if any prediction differs by even one bit.
+    An existing ``directory`` is an earlier export of the same artifact and is kept as is.
+    """
+    forest = ArrayForest.from_sklearn(model)
+    # Parallel sklearn predict sums trees in completion order; compare with the sequential order.
+    n_jobs = getattr(model, "n_jobs", None)
+    if n_jobs not in (None, 1):
+        model.set_params(n_jobs=1)
+    try:
+        expected = np.asarray(model.predict(X_check), dtype=np.float64)
+    finally:
+        if n_jobs not in (None, 1):
+            model.set_params(n_jobs=n_jobs)
+    actual = forest.predict(np.asarray(X_check))
+    if not np.array_equal(expected, actual):
+        mismatches = int(np.sum(expected != actual))
+        raise ValueError(f"Array forest disagrees with sklearn on {mismatches} of {len(expected)} rows")
+    if not directory.exists():
+        forest.save(directory, artifact_sha256=artifact_sha256)
+    return forest
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Deque, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.config import Settings
+from app.services.metrics import ServiceMetrics
+from app.services.model_loader import LoadedModel, ModelLoader
+
+EXECUTOR_KINDS = ("inline", "thread", "process")
+
+# Native thread pools that oversubscribe cores when every worker spins its own.
+BLAS_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "BLIS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+# Number of recent calls kept for the percentile timings in stats().
+TIMING_WINDOW = 2048
+
+_worker_loader: Optional[ModelLoader] = None
+
+
+class InferenceOverloadedError(RuntimeError):
+    """Raised when the inference queue is full; callers should shed load (HTTP 503)."""
+
+
+def limit_native_threads(threads: int) -> None:
+    """Cap BLAS/OpenMP pools for this process so workers do not oversubscribe cores."""
+    if threads <= 0:
+        return
+    for name in BLAS_ENV_VARS:
+        os.environ[name] = str(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    threadpool_limits(limits=threads)
+
+
+def _init_process_worker(settings: Settings, active: Optional[LoadedModel], blas_threads: int) -> None:
+    global _worker_loader
+    limit_native_threads(blas_threads)
+    _worker_loader = ModelLoader(settings, active=active)
+
+
+def _timed_process_predict(matrix: np.ndarray) -> Tuple[np.ndarray, Optional[str], float, float]:
+    assert _worker_loader is not None, "process worker was not initialised"
+    started = time.monotonic()
+    predictions, fallback = _worker_loader.predict_batch_status(matrix)
+    return predictions, fallback, started, time.monotonic()
+
+
+class InferenceExecutor:
+    """
+    Runs model inference off the asyncio event loop.
+
+    ``thread`` keeps one model in memory and relies on sklearn/NumPy releasing
+    the GIL; ``process`` loads the model once per worker process for models
+    that hold the GIL; ``inline`` runs on the loop (the old behaviour). At most
+    ``max_queue`` calls may wait beyond the busy workers before new calls are
+    rejected with ``InferenceOverloadedError``.
+    """
+
+    def __init__(
+        self,
+        model_loader: ModelLoader,
+        kind: str = "thread",
+        max_workers: int = 2,
+        max_queue: int = 256,
+        blas_threads: int = 1,
+        mp_start_method: str = "spawn",
+        metrics: Optional[ServiceMetrics] = None,
+    ):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown inference executor {kind!r}; expected one of {EXECUTOR_KINDS}")
+        self.model_loader = model_loader
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.blas_threads = blas_threads
+        self.mp_start_method = mp_start_method
+        # Fallbacks are reported back from the worker and counted here, so process workers count too.
+        self.metrics = metrics or ServiceMetrics(enabled=False)
+        self._pool: Optional[Executor] = None
+        self._pool_version: Optional[str] = None
+        self._inflight = 0
+        self._calls = 0
+        self._rejected = 0
+        self._wait_ms: Deque[float] = deque(maxlen=TIMING_WINDOW)
+        self._compute_ms: Deque[float] = deque(maxlen=TIMING_WINDOW)
+        self._transfer_ms: Deque[float] = deque(maxlen=TIMING_WINDOW)
+        if kind == "thread":
+            limit_native_threads(blas_threads)
+
+    @classmethod
+    def from_settings(
+        cls, model_loader: ModelLoader, settings: Settings, metrics: Optional[ServiceMetrics] = None
+    ) -> "InferenceExecutor":
+        return cls(
+            model_loader,
+            kind=settings.inference_executor,
+            max_workers=settings.inference_workers,
+            max_queue=settings.inference_max_queue,
+            blas_threads=settings.inference_blas_threads,
+            mp_start_method=settings.inference_mp_start_method,
+            metrics=metrics,
+        )
+
+    async def predict(self, matrix: np.ndarray) -> np.ndarray:
+        if self.kind == "inline":
+            started = time.monotonic()
+            predictions, fallback = self.model_loader.predict_batch_status(matrix)
+            self._record(started, started, time.monotonic(), time.monotonic())
+            self.metrics.record_model_call(len(matrix), fallback)
+            return predictions
+
+        if self._inflight >= self.max_workers + self.max_queue:
+            self._rejected += 1
+            raise InferenceOverloadedError(
+                f"Inference queue full ({self._inflight} calls pending); retry shortly"
+            )
+
+        self._inflight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            submitted = time.monotonic()
+            if self.kind == "thread":
+                predictions, fallback, started, finished = await loop.run_in_executor(
+                    self._get_pool(), self._timed_thread_predict, matrix
+                )
+            else:
+                predictions, fallback, started, finished = await loop.run_in_executor(
+                    self._get_pool(), _timed_process_predict, matrix
+                )
+            self._record(submitted, started, finished, time.monotonic())
+            self.metrics.record_model_call(len(matrix), fallback)
+            return predictions
+        finally:
+            self._inflight -= 1
+
+    def shutdown(self) -> None:
+        """Stop the workers, cancelling queued calls; for service shutdown only."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, float]:
+        stats: Dict[str, float] = {
+            "workers": self.max_workers,
+            "inflight": self._inflight,
+            "queue_depth": max(0, self._inflight - self.max_workers),
+            "calls_total": self._calls,
+            "rejected_total": self._rejected,
+        }
+        for name, samples in (
+            ("wait_ms", self._wait_ms),
+            ("compute_ms", self._compute_ms),
+            ("transfer_ms", self._transfer_ms),
+        ):
+            values = np.fromiter(samples, dtype=np.float64) if samples else np.zeros(1)
+            stats[f"{name}_mean"] = float(values.mean())
+            stats[f"{name}_p95"] = float(np.percentile(values, 95))
+            stats[f"{name}_max"] = float(values.max())
+        return stats
+
+    def _timed_thread_predict(self, matrix: np.ndarray) -> Tuple[np.ndarray, Optional[str], float, float]:
+        started = time.monotonic()
+        predictions, fallback = self.model_loader.predict_batch_status(matrix)
+        return predictions, fallback, started, time.monotonic()
+
+    def _get_pool(self) -> Executor:
+        if self.kind == "thread":
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+            return self._pool
+
+        # Process workers hold their own copy of the model: recycle them after a hot reload.
+        version = self.model_loader.version
+        if self._pool is None or self._pool_version != version:
+            retired = self._pool
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context(self.mp_start_method),
+                initializer=_init_process_worker,
+                # Ship the parent's active model so workers match it even after a rollback.
+                initargs=(self.model_loader.settings, self.model_loader.active, self.blas_threads),
+            )
+            self._pool_version = version
+            if retired is not None:
+                # Calls already queued on the old workers still finish there, so a reload fails no requests.
+                retired.shutdown(wait=False)
+        return self._pool
+
+    def _record(self, submitted: float, started: float, finished: float, received: float) -> None:
+        self._calls += 1
+        self._wait_ms.append((started - submitted) * 1000)
+        self._compute_ms.append((finished - started) * 1000)
+        self._transfer_ms.append((received - finished) * 1000)
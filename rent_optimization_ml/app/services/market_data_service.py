@@ -1,22 +1,258 @@
 from __future__ import annotations
 
+import asyncio
 import random
-from typing import List
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 from app.config import Settings
 from app.models.schemas import ComparableProperty, PredictionRequest
+from app.services.comps_cache import CompsCache
+from app.services.comps_index import LocalCompsIndex
+from app.services.comps_ranking import CandidateSet
+from app.services.comps_snapshot import SNAPSHOT_META, CompsSnapshot
+from app.services.market_providers import MarketComps, ProviderCutoff, ProviderError, ProviderPool
 
 
 class MarketDataService:
-    """Lightweight stub for market data. Replace with real API calls when keys are configured."""
+    """
+    Market comparables for a unit.
+
+    Units whose (zip, bedrooms, bathrooms band) is in the nightly comps
+    snapshot are answered from it without touching the network; the snapshot
+    is reloaded when its ``snapshot.json`` changes and ignored once older than
+    ``comps_snapshot_max_age_hours``. Otherwise, with ``market_data_providers`` configured, comps come from the provider
+    pool (one shared keep-alive client, per-provider limits and retries)
+    behind the two-tier comps cache, fanned out under a per-unit latency
+    budget. The local index of our own units answers when no providers are
+    configured; when none answer in time, the last cached comps (however old)
+    or the local index stand in. Without either, a deterministic stub stands
+    in so the service runs without keys.
+    """
 
-    def __init__(self, settings: Settings):
+    def __init__(
+        self,
+        settings: Settings,
+        providers: Optional[ProviderPool] = None,
+        comps_cache: Optional[CompsCache] = None,
+        local_index: Optional[LocalCompsIndex] = None,
+        snapshot: Optional[CompsSnapshot] = None,
+    ):
         self.settings = settings
+        self.providers = providers if providers is not None else ProviderPool.from_settings(settings)
+        self.local_index = local_index if local_index is not None else LocalCompsIndex.from_settings(settings)
+        self.comps_cache = comps_cache
+        if comps_cache is None and self.providers is not None and settings.enable_comps_cache:
+            self.comps_cache = CompsCache(
+                settings.comps_cache_path,
+                max_entries=settings.comps_cache_max_entries,
+                ttl_seconds=settings.comps_cache_ttl_seconds,
+                stale_seconds=settings.comps_cache_stale_seconds,
+                size_band_sqft=settings.comps_cache_size_band_sqft,
+            )
+        self._snapshot_signature = self._snapshot_stat()
+        self.snapshot = snapshot if snapshot is not None else self._load_snapshot(settings.comps_snapshot_path)
+        self._snapshot_task: Optional[asyncio.Task] = None
+        self.snapshot_reloads = 0
+        self.cache_fallbacks = 0
+        self.local_fallbacks = 0
 
     async def fetch_comparables(self, request: PredictionRequest) -> List[ComparableProperty]:
+        return (await self.fetch_market_comps(request)).comps
+
+    async def fetch_market_comps(self, request: PredictionRequest) -> MarketComps:
+        """Comps for one unit plus how many of the queried sources answered."""
         if not self.settings.use_market_data:
-            return []
+            return MarketComps([], answered=0, queried=0)
+        if self.snapshot is not None:
+            group = self.snapshot.lookup(request)
+            if group is not None:
+                return self.snapshot.market_comps(group)
+        return await self._fetch_live(request)
+
+    async def _fetch_live(self, request: PredictionRequest) -> MarketComps:
+        if self.providers is None:
+            if self.local_index is not None:
+                return MarketComps(self.local_index.comparables(request, self.settings.market_data_max_comps))
+            return MarketComps(self._stub_comparables(request))
+        try:
+            if self.comps_cache is not None:
+                return await self.comps_cache.get_or_fetch(request, lambda: self._fetch_from_providers(request))
+            return await self._fetch_from_providers(request)
+        except ProviderError as exc:
+            return await self._fallback(request, exc)
+
+    async def fetch_candidates(self, requests: Sequence[PredictionRequest]) -> CandidateSet:
+        """
+        Candidate comps for a batch, as columns for ``CompsRanker``.
+
+        Snapshot hits and the local index hand over rows straight from their
+        arrays (up to ``comps_index_max_candidates`` per unit for the index);
+        provider and stub comps are converted.
+        """
+        if not self.settings.use_market_data:
+            return CandidateSet.empty(len(requests))
+        parts: List[Optional[dict]] = [None] * len(requests)
+        coverage = np.ones(len(requests))
+        if self.snapshot is not None:
+            for idx, request in enumerate(requests):
+                group = self.snapshot.lookup(request)
+                if group is not None:
+                    parts[idx] = self.snapshot.candidate_part(group)
+                    coverage[idx] = self.snapshot.coverage(group)
+        misses = [idx for idx, part in enumerate(parts) if part is None]
+        if misses:
+            pending = [requests[idx] for idx in misses]
+            if self.providers is None and self.local_index is not None:
+                fetched = self.local_index.candidate_parts(pending, self.settings.comps_index_max_candidates)
+                fetched_coverage = [1.0] * len(pending)
+            else:
+                results = await asyncio.gather(*(self._fetch_live(request) for request in pending))
+                fetched = [CandidateSet.part(result.comps) for result in results]
+                fetched_coverage = [result.coverage for result in results]
+            for idx, part, share in zip(misses, fetched, fetched_coverage):
+                parts[idx] = part
+                coverage[idx] = share
+        return CandidateSet.concat(parts, coverage)
+
+    async def start(self) -> None:
+        if self.local_index is not None:
+            await self.local_index.start()
+        if (
+            self._snapshot_task is None
+            and self.settings.comps_snapshot_path is not None
+            and self.settings.comps_snapshot_watch_interval_seconds > 0
+        ):
+            self._snapshot_task = asyncio.get_running_loop().create_task(self._watch_snapshot())
+
+    async def check_snapshot(self) -> bool:
+        """Reload the snapshot if its metadata file changed; returns True when a new one went live."""
+        signature = self._snapshot_stat()
+        if signature is None or signature == self._snapshot_signature:
+            return False
+        self._snapshot_signature = signature
+        snapshot = await asyncio.to_thread(self._load_snapshot, self.settings.comps_snapshot_path)
+        if snapshot is None:
+            return False
+        if self.snapshot is not None:
+            snapshot.hits, snapshot.misses = self.snapshot.hits, self.snapshot.misses
+        # Lookups don't await, so each request sees either the old snapshot or the new one.
+        self.snapshot = snapshot
+        self.snapshot_reloads += 1
+        return True
+
+    async def close(self) -> None:
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+            try:
+                await self._snapshot_task
+            except asyncio.CancelledError:
+                pass
+            self._snapshot_task = None
+        if self.local_index is not None:
+            await self.local_index.stop()
+        if self.comps_cache is not None:
+            await self.comps_cache.close()
+        if self.providers is not None:
+            await self.providers.aclose()
+
+    def stats(self) -> Optional[Dict[str, float]]:
+        if self.providers is None and self.local_index is None and self.snapshot is None:
+            return None
+        stats = self.providers.stats() if self.providers is not None else {}
+        if self.snapshot is not None:
+            stats.update({f"snapshot_{name}": value for name, value in self.snapshot.stats().items()})
+            stats["snapshot_reloads"] = self.snapshot_reloads
+        if self.providers is not None:
+            stats["cache_fallbacks_total"] = self.cache_fallbacks
+            stats["local_fallbacks_total"] = self.local_fallbacks
+        if self.comps_cache is not None:
+            stats.update({f"comps_cache_{name}": value for name, value in self.comps_cache.stats().items()})
+        if self.local_index is not None:
+            stats.update({f"local_index_{name}": value for name, value in self.local_index.stats().items()})
+        return stats
+
+    async def _fetch_from_providers(self, request: PredictionRequest) -> MarketComps:
+        """
+        Merged comps from the providers that answered within the budget.
+
+        Raises ``ProviderError`` if none did, so an outage or a blown budget is
+        never cached as "no comps".
+        """
+        assert self.providers is not None
+        settings = self.settings
+        results = await self.providers.fetch_all(
+            request,
+            deadline_seconds=settings.market_data_deadline_ms / 1000,
+            min_comps=settings.market_data_min_comps,
+            hedge_min_samples=settings.market_data_hedge_min_samples if settings.market_data_hedge else 0,
+        )
+        failures = {name: result for name, result in results.items() if isinstance(result, BaseException)}
+        if len(failures) == len(results):
+            raise ProviderError("; ".join(f"{name}: {exc}" for name, exc in failures.items()))
+        comps: List[ComparableProperty] = []
+        seen = set()
+        for name, result in results.items():
+            if isinstance(result, BaseException):
+                if not isinstance(result, ProviderCutoff):
+                    print(f"[MarketDataService] {name} failed for {request.unit_id}: {result}")
+                continue
+            for comp in result:
+                # Providers overlap on the same listings; keep the first copy of each address.
+                key = comp.address.strip().lower() or f"{name}:{comp.id}"
+                if key not in seen:
+                    seen.add(key)
+                    comps.append(comp)
+        comps.sort(key=lambda comp: comp.distance_miles)
+        return MarketComps(
+            comps[: settings.market_data_max_comps], answered=len(results) - len(failures), queried=len(results)
+        )
+
+    async def _fallback(self, request: PredictionRequest, error: ProviderError) -> MarketComps:
+        """No provider answered in time: the last cached comps, else the local index, else none."""
+        queried = len(self.providers.providers) if self.providers is not None else 0
+        cached = await self.comps_cache.peek(request) if self.comps_cache is not None else None
+        if cached is not None:
+            self.cache_fallbacks += 1
+            return MarketComps(cached.comps, answered=0, queried=queried)
+        if self.local_index is not None:
+            comps = self.local_index.comparables(request, self.settings.market_data_max_comps)
+            if comps:
+                self.local_fallbacks += 1
+                return MarketComps(comps, answered=0, queried=queried)
+        print(f"[MarketDataService] No comps for {request.unit_id}: {error}")
+        return MarketComps([], answered=0, queried=queried)
+
+    async def _watch_snapshot(self) -> None:
+        while True:
+            await asyncio.sleep(self.settings.comps_snapshot_watch_interval_seconds)
+            try:
+                await self.check_snapshot()
+            except Exception as exc:  # noqa: BLE001
+                print(f"[MarketDataService] Comps snapshot check failed: {exc}")
+
+    def _snapshot_stat(self) -> Optional[Tuple[float, int]]:
+        """(mtime, size) of ``snapshot.json``, which a rewrite always replaces."""
+        if self.settings.comps_snapshot_path is None:
+            return None
+        try:
+            stat = (self.settings.comps_snapshot_path / SNAPSHOT_META).stat()
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size
+
+    def _load_snapshot(self, path: Optional[Path]) -> Optional[CompsSnapshot]:
+        if path is None or not path.exists():
+            return None
+        try:
+            return CompsSnapshot.load(path, max_age_seconds=self.settings.comps_snapshot_max_age_hours * 3600)
+        except Exception as exc:  # noqa: BLE001
+            print(f"[MarketDataService] Ignoring unreadable comps snapshot at {path}: {exc}")
+            return None
 
+    def _stub_comparables(self, request: PredictionRequest) -> List[ComparableProperty]:
         base_price = request.current_rent or 2000
         random.seed(request.unit_id)
 
@@ -0,0 +1,448 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.config import Settings
+from app.models.schemas import ComparableProperty, PredictionRequest
+
+# Statuses worth retrying: rate limited or a transient upstream failure.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ProviderError(RuntimeError):
+    """Raised when a provider call fails for good (non-retryable status or retries exhausted)."""
+
+
+class ProviderCutoff(ProviderError):
+    """A provider still running when the request's latency budget ran out (or enough comps had arrived)."""
+
+
+@dataclass
+class MarketComps:
+    """Comps for one unit and how many of the queried sources answered."""
+
+    comps: List[ComparableProperty]
+    answered: int = 1
+    queried: int = 1
+
+    @property
+    def coverage(self) -> float:
+        return self.answered / self.queried if self.queried else 0.0
+
+
+class TokenBucket:
+    """
+    Async token bucket: ``rate_per_second`` sustained, ``burst`` at once.
+
+    A non-positive rate disables limiting. Waiters sleep until the next token
+    is due rather than polling.
+    """
+
+    def __init__(
+        self,
+        rate_per_second: float,
+        burst: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Any] = asyncio.sleep,
+    ):
+        self.rate = rate_per_second
+        self.burst = max(1.0, burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._updated = clock()
+        self.waits = 0
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            self.waits += 1
+            await self._sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class ProviderLimits:
+    max_concurrency: int = 4
+    rate_per_second: float = 5.0
+    burst: float = 5.0
+    timeout_seconds: float = 3.0
+    max_retries: int = 2
+    backoff_seconds: float = 0.2
+
+
+class MarketDataProvider(ABC):
+    """
+    One upstream comps API: how to ask it and how to read its answer.
+
+    Subclasses build the request for a unit and parse the JSON payload into
+    ``ComparableProperty`` objects; transport, limits and retries live in
+    ``ProviderPool``.
+    """
+
+    name = "provider"
+
+    def __init__(self, base_url: str, limits: ProviderLimits, api_key: Optional[str] = None):
+        self.base_url = base_url.rstrip("/")
+        self.limits = limits
+        self.api_key = api_key
+
+    @abstractmethod
+    def build_request(self, request: PredictionRequest) -> Tuple[str, Dict[str, Any], Dict[str, str]]:
+        """Return ``(url, query params, headers)`` for ``request``."""
+
+    @abstractmethod
+    def parse(self, request: PredictionRequest, payload: Any) -> List[ComparableProperty]:
+        """Comps in a decoded JSON ``payload``; may raise on a payload of the wrong shape."""
+
+
+class RentometerProvider(MarketDataProvider):
+    """Rentometer ``nearby_comps``: listings around an address or coordinate."""
+
+    name = "rentometer"
+
+    def build_request(self, request: PredictionRequest) -> Tuple[str, Dict[str, Any], Dict[str, str]]:
+        params: Dict[str, Any] = {
+            "api_key": self.api_key,
+            "bedrooms": request.bedrooms,
+            "baths": "1" if request.bathrooms < 1.5 else "1.5+",
+        }
+        if request.latitude is not None and request.longitude is not None:
+            params.update(latitude=request.latitude, longitude=request.longitude)
+        else:
+            params["address"] = f"{request.address}, {request.city}, {request.state} {request.zip_code}"
+        return f"{self.base_url}/nearby_comps", params, {}
+
+    def parse(self, request: PredictionRequest, payload: Any) -> List[ComparableProperty]:
+        comps = []
+        for idx, item in enumerate(payload.get("nearby_properties") or []):
+            price = item.get("price")
+            if price is None:
+                continue
+            baths = str(item.get("baths", request.bathrooms)).rstrip("+")
+            comps.append(
+                ComparableProperty(
+                    id=str(item.get("id", f"{self.name}-{idx}")),
+                    address=item.get("address", ""),
+                    price=float(price),
+                    distance_miles=float(item.get("distance", 0.0)),
+                    bedrooms=int(item.get("bedrooms", request.bedrooms)),
+                    bathrooms=float(baths or request.bathrooms),
+                    square_feet=int(item.get("sqft") or request.square_feet),
+                )
+            )
+        return comps
+
+
+class CompsApiProvider(MarketDataProvider):
+    """
+    Generic JSON comps endpoint (an internal service, or a stub in tests).
+
+    ``GET {base_url}/comparables`` with the unit's location and size, answering
+    ``{"comparables": [<ComparableProperty fields>, ...]}``.
+    """
+
+    name = "comps_api"
+
+    def build_request(self, request: PredictionRequest) -> Tuple[str, Dict[str, Any], Dict[str, str]]:
+        params = {
+            "zip_code": request.zip_code,
+            "bedrooms": request.bedrooms,
+            "bathrooms": request.bathrooms,
+            "square_feet": request.square_feet,
+        }
+        if request.latitude is not None and request.longitude is not None:
+            params.update(latitude=request.latitude, longitude=request.longitude)
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        return f"{self.base_url}/comparables", params, headers
+
+    def parse(self, request: PredictionRequest, payload: Any) -> List[ComparableProperty]:
+        return [ComparableProperty.model_validate(item) for item in payload.get("comparables") or []]
+
+
+# Successful call latencies kept per provider for the hedge delay (p95).
+LATENCY_WINDOW = 256
+
+
+@dataclass
+class _ProviderStats:
+    calls: int = 0
+    attempts: int = 0
+    retries: int = 0
+    failures: int = 0
+    hedges: int = 0
+    hedge_wins: int = 0
+    cutoffs: int = 0
+    total_ms: float = 0.0
+    recent_seconds: deque = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+
+    def p95_seconds(self, min_samples: int) -> Optional[float]:
+        if len(self.recent_seconds) < max(1, min_samples):
+            return None
+        ordered = sorted(self.recent_seconds)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+
+class _LoopState:
+    """Client and semaphores bound to one event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, client: httpx.AsyncClient, providers: List[MarketDataProvider]):
+        self.loop = loop
+        self.client = client
+        self.semaphores = {p.name: asyncio.Semaphore(max(1, p.limits.max_concurrency)) for p in providers}
+
+
+class ProviderPool:
+    """
+    Calls market-data providers over one shared keep-alive ``httpx.AsyncClient``.
+
+    The client caps the total number of open connections, so a 1,000-unit
+    batch reuses a handful of sockets. Each provider also gets its own
+    concurrency semaphore and token bucket, a per-call timeout, and retries on
+    timeouts, connection errors, 429 and 5xx with full-jitter exponential
+    backoff (honouring ``Retry-After``).
+
+    ``fetch_all`` can also run under a latency budget: it returns once enough
+    comps have arrived or the deadline passes, cancelling the stragglers, and
+    can hedge a call that outlives its provider's recent p95 with a duplicate.
+    """
+
+    def __init__(
+        self,
+        providers: List[MarketDataProvider],
+        max_connections: int = 20,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        rng: Optional[random.Random] = None,
+    ):
+        self.providers = providers
+        self.max_connections = max(1, max_connections)
+        self._transport = transport
+        self._random = rng or random.Random()
+        self._buckets = {p.name: TokenBucket(p.limits.rate_per_second, p.limits.burst) for p in providers}
+        self._stats = {p.name: _ProviderStats() for p in providers}
+        self._state: Optional[_LoopState] = None
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> Optional["ProviderPool"]:
+        """Providers named in ``settings.market_data_providers``; ``None`` keeps the stub."""
+        names = [name.strip() for name in settings.market_data_providers.split(",") if name.strip()]
+        if not names:
+            return None
+
+        def limits(max_concurrency: int, rate: float) -> ProviderLimits:
+            return ProviderLimits(
+                max_concurrency=max_concurrency,
+                rate_per_second=rate,
+                burst=max(1.0, rate),
+                timeout_seconds=settings.market_data_timeout_seconds,
+                max_retries=settings.market_data_max_retries,
+                backoff_seconds=settings.market_data_retry_backoff_seconds,
+            )
+
+        providers: List[MarketDataProvider] = []
+        for name in names:
+            if name == RentometerProvider.name:
+                providers.append(
+                    RentometerProvider(
+                        settings.rentometer_base_url,
+                        limits(settings.rentometer_max_concurrency, settings.rentometer_rate_per_second),
+                        api_key=settings.rentometer_api_key,
+                    )
+                )
+            elif name == CompsApiProvider.name:
+                if not settings.comps_api_url:
+                    raise ValueError("market_data_providers includes comps_api but COMPS_API_URL is not set")
+                providers.append(
+                    CompsApiProvider(
+                        settings.comps_api_url,
+                        limits(settings.comps_api_max_concurrency, settings.comps_api_rate_per_second),
+                        api_key=settings.comps_api_key,
+                    )
+                )
+            else:
+                raise ValueError(f"Unknown market data provider {name!r}; expected rentometer or comps_api")
+        return cls(providers, max_connections=settings.market_data_max_connections)
+
+    async def fetch_all(
+        self,
+        request: PredictionRequest,
+        deadline_seconds: float = 0.0,
+        min_comps: int = 0,
+        hedge_min_samples: int = 0,
+    ) -> Dict[str, List[ComparableProperty] | BaseException]:
+        """
+        Query every provider concurrently; failures come back as the exception instead of raising.
+
+        With ``deadline_seconds`` > 0, providers still running at the deadline are
+        cancelled and reported as ``ProviderCutoff``; with ``min_comps`` > 0 the
+        rest are cut off as soon as that many comps have arrived. With
+        ``hedge_min_samples`` > 0, a call slower than its provider's p95 (once
+        that many samples exist) is raced against a duplicate.
+        """
+        tasks = {
+            asyncio.ensure_future(
+                self.fetch_hedged(provider, request, hedge_min_samples) if hedge_min_samples else self.fetch(provider, request)
+            ): provider
+            for provider in self.providers
+        }
+        results: Dict[str, List[ComparableProperty] | BaseException] = {}
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + deadline_seconds if deadline_seconds > 0 else None
+        pending = set(tasks)
+        arrived = 0
+        try:
+            while pending:
+                timeout = None if deadline is None else deadline - loop.time()
+                if timeout is not None and timeout <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    error = task.exception()
+                    if error is not None:
+                        results[tasks[task].name] = error
+                    else:
+                        results[tasks[task].name] = task.result()
+                        arrived += len(task.result())
+                if min_comps and arrived >= min_comps:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+                provider = tasks[task]
+                self._stats[provider.name].cutoffs += 1
+                results[provider.name] = ProviderCutoff(f"{provider.name} cut off before answering")
+        return {provider.name: results[provider.name] for provider in self.providers}
+
+    async def fetch_hedged(
+        self, provider: MarketDataProvider, request: PredictionRequest, min_samples: int
+    ) -> List[ComparableProperty]:
+        """``fetch``, plus a duplicate call if the first outlives the provider's p95; the first success wins."""
+        stats = self._stats[provider.name]
+        delay = stats.p95_seconds(min_samples)
+        first = asyncio.ensure_future(self.fetch(provider, request))
+        if delay is None:
+            return await first
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                stats.hedges += 1
+                tasks.add(asyncio.ensure_future(self.fetch(provider, request)))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            stats.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+            assert error is not None
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def fetch(self, provider: MarketDataProvider, request: PredictionRequest) -> List[ComparableProperty]:
+        state = self._ensure_state()
+        stats = self._stats[provider.name]
+        limits = provider.limits
+        url, params, headers = provider.build_request(request)
+        stats.calls += 1
+        started = time.perf_counter()
+        error: Optional[BaseException] = None
+        try:
+            for attempt in range(limits.max_retries + 1):
+                if attempt:
+                    stats.retries += 1
+                await self._buckets[provider.name].acquire()
+                retry_after: Optional[float] = None
+                async with state.semaphores[provider.name]:
+                    stats.attempts += 1
+                    try:
+                        response = await state.client.get(
+                            url, params=params, headers=headers, timeout=limits.timeout_seconds
+                        )
+                    except httpx.TransportError as exc:  # includes timeouts
+                        error = exc
+                    else:
+                        if response.status_code < 400:
+                            try:
+                                comps = provider.parse(request, response.json())
+                            except (ValueError, TypeError, KeyError, AttributeError) as exc:
+                                # Bad JSON or an unexpected shape (pydantic errors are ValueErrors);
+                                # asking again would get the same answer.
+                                error = ProviderError(f"{provider.name} returned an unreadable payload: {exc!r}")
+                                break
+                            stats.recent_seconds.append(time.perf_counter() - started)
+                            return comps
+                        error = ProviderError(f"{provider.name} returned HTTP {response.status_code}")
+                        if response.status_code not in RETRY_STATUSES:
+                            break
+                        retry_after = _retry_after_seconds(response)
+                if attempt < limits.max_retries:
+                    delay = self._random.uniform(0, limits.backoff_seconds * (2**attempt))
+                    await asyncio.sleep(max(delay, retry_after or 0.0))
+            stats.failures += 1
+            raise ProviderError(f"{provider.name} failed after {attempt + 1} attempt(s): {error}") from error
+        finally:
+            stats.total_ms += (time.perf_counter() - started) * 1000
+
+    async def aclose(self) -> None:
+        if self._state is not None:
+            await self._state.client.aclose()
+            self._state = None
+
+    def stats(self) -> Dict[str, float]:
+        stats: Dict[str, float] = {"max_connections": self.max_connections}
+        for name, provider_stats in self._stats.items():
+            stats[f"{name}_calls_total"] = provider_stats.calls
+            stats[f"{name}_attempts_total"] = provider_stats.attempts
+            stats[f"{name}_retries_total"] = provider_stats.retries
+            stats[f"{name}_failures_total"] = provider_stats.failures
+            stats[f"{name}_hedges_total"] = provider_stats.hedges
+            stats[f"{name}_hedge_wins_total"] = provider_stats.hedge_wins
+            stats[f"{name}_cutoffs_total"] = provider_stats.cutoffs
+            stats[f"{name}_rate_limited_waits_total"] = self._buckets[name].waits
+            stats[f"{name}_mean_ms"] = provider_stats.total_ms / provider_stats.calls if provider_stats.calls else 0.0
+            p95 = provider_stats.p95_seconds(1)
+            stats[f"{name}_p95_ms"] = p95 * 1000 if p95 is not None else 0.0
+        return stats
+
+    def _ensure_state(self) -> _LoopState:
+        # The client's connection pool and the semaphores belong to one loop; rebuild them
+        # if we are called from a new one (tests, or a second asyncio.run in a script).
+        loop = asyncio.get_running_loop()
+        if self._state is None or self._state.loop is not loop:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                transport=self._transport,
+                headers={"Accept": "application/json"},
+            )
+            self._state = _LoopState(loop, client, self.providers)
+        return self._state
+
+
+def _retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Awaitable, Callable, Dict, Iterable, List, MutableMapping, Optional, Sequence, Tuple
+
+# Starlette appends "; charset=utf-8" to text/* media types.
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Seconds; spans a cache hit (~50us) to a slow market-data call.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+STAGES = ("market_data", "features", "inference", "postprocess", "serialize")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class _NullChild:
+    """Stand-in returned by a disabled registry: recording is a no-op."""
+
+    __slots__ = ()
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def inc(self, amount: float = 1.0) -> None:
+        pass
+
+
+_NULL_CHILD = _NullChild()
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], enabled: bool):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.enabled = enabled
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        if not self.enabled:
+            return _NULL_CHILD
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        ...
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        ...
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Iterable[float], enabled: bool):
+        super().__init__(name, documentation, labelnames, enabled)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def render(self) -> List[str]:
+        lines = []
+        for values, child in sorted(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in sorted(self._children.items())
+        ]
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process Prometheus registry (histograms and counters).
+
+    Recording is a list increment plus a bisect and is only done from the event
+    loop thread, so no locking is needed. A disabled registry hands out no-op
+    children, so instrumented code needs no ``if enabled`` checks.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: List[_Metric] = []
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets, self.enabled))
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames, self.enabled))
+
+    def render(self, gauges: Optional[Dict[str, Dict[str, float]]] = None) -> str:
+        """Prometheus text exposition; ``gauges`` are the component stats from ``/stats``."""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        if gauges:
+            lines.append("# HELP rent_ml_component_stat Point-in-time component stats (same values as /stats).")
+            lines.append("# TYPE rent_ml_component_stat gauge")
+            for component, stats in sorted(gauges.items()):
+                for stat, value in sorted(stats.items()):
+                    labels = _format_labels(("component", "stat"), (component, stat))
+                    lines.append(f"rent_ml_component_stat{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+class ServiceMetrics:
+    """The service's metric families, shared by the prediction path and the HTTP middleware."""
+
+    def __init__(self, enabled: bool = True):
+        self.registry = MetricsRegistry(enabled)
+        self.enabled = enabled
+        self.stage_seconds = self.registry.histogram(
+            "rent_ml_stage_seconds", "Time spent in each stage of a prediction call.", ("stage",)
+        )
+        self.request_seconds = self.registry.histogram(
+            "rent_ml_http_request_seconds", "HTTP handler latency.", ("endpoint", "method", "status")
+        )
+        self.batch_size = self.registry.histogram(
+            "rent_ml_batch_size", "Units per prediction call and per model call.", ("call",), buckets=BATCH_SIZE_BUCKETS
+        )
+        self.predictions = self.registry.counter(
+            "rent_ml_predictions_total", "Units scored, by where the answer came from.", ("source",)
+        )
+        self.fallbacks = self.registry.counter(
+            "rent_ml_heuristic_fallback_total", "Model calls answered by the heuristic instead of the model.", ("reason",)
+        )
+        self.model_errors = self.registry.counter(
+            "rent_ml_model_errors_total", "Model predict calls that raised."
+        )
+        # Pre-resolved children keep the per-request cost to the observe itself.
+        self.stages = {stage: self.stage_seconds.labels(stage) for stage in STAGES}
+
+    def record_model_call(self, rows: int, fallback_reason: Optional[str]) -> None:
+        self.batch_size.labels("model").observe(rows)
+        if fallback_reason is not None:
+            self.fallbacks.labels(fallback_reason).inc()
+            if fallback_reason == "model_error":
+                self.model_errors.inc()
+
+    def render(self, gauges: Optional[Dict[str, Dict[str, float]]] = None) -> str:
+        return self.registry.render(gauges)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request by matched endpoint, method and status."""
+
+    def __init__(self, app: Callable[..., Awaitable[None]], metrics: ServiceMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: MutableMapping, receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or not self.metrics.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_with_status(message: MutableMapping) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router writes the matched endpoint into the shared scope; unmatched paths
+            # share one label so scanners cannot blow up the series count.
+            endpoint = scope.get("endpoint")
+            name = getattr(endpoint, "__name__", "unmatched")
+            self.metrics.request_seconds.labels(name, scope["method"], str(status[0])).observe(
+                time.perf_counter() - started
+            )
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+import numpy as np
+
+# Upper bounds of the batch-size distribution buckets reported by stats().
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+@dataclass
+class _PendingRows:
+    matrix: np.ndarray
+    future: asyncio.Future
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent small inference calls into one model call.
+
+    Rows submitted within ``max_wait_ms`` of the first queued row (or until
+    ``max_batch_size`` rows are waiting) are stacked into a single matrix,
+    handed to ``predict_fn`` (the inference executor, so the model runs off the
+    event loop), and split back to each caller.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], Awaitable[np.ndarray]],
+        max_batch_size: int,
+        max_wait_ms: float,
+    ):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(max_wait_ms, 0.0) / 1000
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue[_PendingRows]] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self._queued_rows = 0
+        self._batches = 0
+        self._rows = 0
+        self._max_batch = 0
+        self._size_counts: Dict[int, int] = {bound: 0 for bound in BATCH_SIZE_BUCKETS}
+        self._size_overflow = 0
+
+    async def submit(self, matrix: np.ndarray) -> np.ndarray:
+        """Queue ``matrix`` for the next batch and wait for its predictions."""
+        queue = self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._queued_rows += len(matrix)
+        queue.put_nowait(_PendingRows(matrix, future))
+        return await future
+
+    async def close(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        if self._queue is not None:
+            while not self._queue.empty():
+                pending = self._queue.get_nowait()
+                if not pending.future.done():
+                    pending.future.set_exception(RuntimeError("Micro-batcher closed"))
+        self._worker = None
+        self._queue = None
+        self._queued_rows = 0
+
+    def stats(self) -> Dict[str, float]:
+        stats: Dict[str, float] = {
+            "queue_depth": self._queued_rows,
+            "batches_total": self._batches,
+            "rows_total": self._rows,
+            "mean_batch_size": self._rows / self._batches if self._batches else 0.0,
+            "max_batch_size_seen": self._max_batch,
+        }
+        for bound, count in self._size_counts.items():
+            stats[f"batch_size_le_{bound}"] = count
+        stats["batch_size_gt_" + str(BATCH_SIZE_BUCKETS[-1])] = self._size_overflow
+        return stats
+
+    def _ensure_worker(self) -> asyncio.Queue[_PendingRows]:
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._queued_rows = 0
+            self._worker = loop.create_task(self._run())
+        return self._queue
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[_PendingRows] = [await queue.get()]
+            rows = len(batch[0].matrix)
+            deadline = loop.time() + self.max_wait
+            while rows < self.max_batch_size:
+                if not queue.empty():
+                    pending = queue.get_nowait()
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        pending = await asyncio.wait_for(queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                batch.append(pending)
+                rows += len(pending.matrix)
+
+            self._queued_rows -= rows
+            # Don't wait for the model: the next batch forms while this one runs,
+            # letting the executor keep all of its workers busy.
+            task = loop.create_task(self._predict(batch, rows))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _predict(self, batch: List[_PendingRows], rows: int) -> None:
+        self._record(rows)
+        stacked = batch[0].matrix if len(batch) == 1 else np.concatenate([p.matrix for p in batch])
+        try:
+            predictions = await self.predict_fn(stacked)
+        except Exception as exc:  # noqa: BLE001
+            for pending in batch:
+                if not pending.future.done():
+                    pending.future.set_exception(exc)
+            return
+
+        offset = 0
+        for pending in batch:
+            size = len(pending.matrix)
+            if not pending.future.done():
+                pending.future.set_result(predictions[offset : offset + size])
+            offset += size
+
+    def _record(self, rows: int) -> None:
+        self._batches += 1
+        self._rows += rows
+        self._max_batch = max(self._max_batch, rows)
+        for bound in BATCH_SIZE_BUCKETS:
+            if rows <= bound:
+                self._size_counts[bound] += 1
+                return
+        self._size_overflow += 1
@@ -0,0 +1,175 @@
+"""
+Model backends: the estimator families the rent model can be trained with.
+
+Every backend builds, fits, predicts with and exports its estimator through
+the same interface, so training can swap or compare them and serving only
+needs ``predict`` on the unpickled artifact. The backend name is recorded in
+the artifact's feature spec (``metadata["backend"]``).
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import io
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import joblib
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+
+from app.services.feature_spec import FeatureSpec, spec_path_for
+from app.services.forest_engine import export_forest, forest_dir_for
+
+DEFAULT_BACKEND = "random_forest"
+
+
+class BackendUnavailableError(RuntimeError):
+    """Raised when a backend's library is not installed."""
+
+
+class ModelBackend(ABC):
+    """Build, fit, predict and export one estimator family."""
+
+    name = ""
+    # Exported alongside the joblib artifact for INFERENCE_ENGINE=array.
+    exports_array_forest = False
+
+    def available(self) -> bool:
+        return True
+
+    def default_params(self, rows: int) -> Dict[str, Any]:
+        return {}
+
+    @abstractmethod
+    def create(self, params: Optional[Dict[str, Any]] = None, n_jobs: Optional[int] = None) -> Any:
+        """A new unfitted estimator with ``params`` over the defaults."""
+
+    def fit(self, X: Any, y: Any, params: Optional[Dict[str, Any]] = None, n_jobs: Optional[int] = None) -> Any:
+        """Fit a new estimator on ``X``/``y``; ``params`` default to ``default_params(len(X))``."""
+        model = self.create(params if params is not None else self.default_params(len(X)), n_jobs)
+        model.fit(X, y)
+        # Whatever parallelism training used, the saved artifact predicts with the library default.
+        if "n_jobs" in model.get_params():
+            model.set_params(n_jobs=None)
+        return model
+
+    def predict(self, model: Any, X: np.ndarray) -> np.ndarray:
+        return np.asarray(model.predict(X), dtype=np.float64)
+
+    def export(
+        self, model: Any, artifact_path: Path, X_check: np.ndarray, spec: Optional[FeatureSpec] = None
+    ) -> List[Path]:
+        """
+        Write any backend extras and ``spec``, then publish the joblib artifact.
+
+        The joblib is what ``ModelWatcher`` polls, so it goes last and through
+        a temp file and ``os.replace``: a reload never sees a half-written
+        artifact, nor one newer than its spec or array forest. The spec is
+        replaced atomically too and records the artifact's sha256, so a load
+        between the two swaps rejects the pair instead of mis-scoring. Returns
+        the model paths written (not the spec).
+        """
+        from app.services.model_loader import file_sha256
+
+        artifact_path.parent.mkdir(parents=True, exist_ok=True)
+        staging = artifact_path.with_name(f".{artifact_path.name}.tmp-{os.getpid()}")
+        try:
+            joblib.dump(model, staging)
+            sha256 = file_sha256(staging)
+            extras = self.export_extras(model, artifact_path, sha256, X_check)
+            if spec is not None:
+                metadata = {**spec.metadata, "artifact_sha256": sha256}
+                dataclasses.replace(spec, metadata=metadata).save(spec_path_for(artifact_path))
+            os.replace(staging, artifact_path)
+        finally:
+            staging.unlink(missing_ok=True)
+        return [artifact_path, *extras]
+
+    def export_extras(self, model: Any, artifact_path: Path, artifact_sha256: str, X_check: np.ndarray) -> List[Path]:
+        """Files served alongside ``artifact_path``, written before the artifact with ``artifact_sha256`` is published."""
+        return []
+
+    @staticmethod
+    def artifact_bytes(model: Any) -> int:
+        """Size of the joblib artifact ``model`` would be saved as."""
+        buffer = io.BytesIO()
+        joblib.dump(model, buffer)
+        return buffer.tell()
+
+
+class RandomForestBackend(ModelBackend):
+    name = "random_forest"
+    exports_array_forest = True
+
+    def default_params(self, rows: int) -> Dict[str, Any]:
+        return {"n_estimators": min(120, rows * 10)}
+
+    def create(self, params: Optional[Dict[str, Any]] = None, n_jobs: Optional[int] = None) -> Any:
+        return RandomForestRegressor(**{"random_state": 42, **(params or {})}, n_jobs=n_jobs)
+
+    def export_extras(self, model: Any, artifact_path: Path, artifact_sha256: str, X_check: np.ndarray) -> List[Path]:
+        # Flattened copy for INFERENCE_ENGINE=array, verified bit-for-bit on X_check
+        directory = forest_dir_for(artifact_path, artifact_sha256)
+        export_forest(model, directory, X_check, artifact_sha256=artifact_sha256)
+        return [directory]
+
+
+class HistGradientBoostingBackend(ModelBackend):
+    """sklearn's histogram gradient boosting; uses OpenMP threads on its own."""
+
+    name = "hist_gradient_boosting"
+
+    def default_params(self, rows: int) -> Dict[str, Any]:
+        return {"max_iter": 300, "learning_rate": 0.1, "max_leaf_nodes": 31}
+
+    def create(self, params: Optional[Dict[str, Any]] = None, n_jobs: Optional[int] = None) -> Any:
+        return HistGradientBoostingRegressor(**{"random_state": 42, **(params or {})})
+
+
+class XGBoostHistBackend(ModelBackend):
+    """XGBoost with the ``hist`` tree method; needs the ``xgboost`` package."""
+
+    name = "xgboost_hist"
+
+    def available(self) -> bool:
+        try:
+            import xgboost  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def default_params(self, rows: int) -> Dict[str, Any]:
+        return {"n_estimators": 300, "learning_rate": 0.1, "max_depth": 8, "max_bin": 256}
+
+    def create(self, params: Optional[Dict[str, Any]] = None, n_jobs: Optional[int] = None) -> Any:
+        try:
+            from xgboost import XGBRegressor
+        except ImportError as exc:
+            raise BackendUnavailableError("xgboost_hist needs the xgboost package (see requirements.txt)") from exc
+        return XGBRegressor(**{"random_state": 42, **(params or {})}, tree_method="hist", n_jobs=n_jobs)
+
+
+BACKENDS: Dict[str, ModelBackend] = {
+    backend.name: backend for backend in (RandomForestBackend(), HistGradientBoostingBackend(), XGBoostHistBackend())
+}
+
+
+def get_backend(name: str) -> ModelBackend:
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown model backend {name!r}; expected one of {tuple(BACKENDS)}") from None
+
+
+def backend_of(model: Any) -> str:
+    """Backend name for an estimator, for artifacts trained before the spec recorded it."""
+    if isinstance(model, RandomForestRegressor):
+        return "random_forest"
+    if isinstance(model, HistGradientBoostingRegressor):
+        return "hist_gradient_boosting"
+    if type(model).__module__.startswith("xgboost"):
+        return "xgboost_hist"
+    return type(model).__name__
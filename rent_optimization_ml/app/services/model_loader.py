@@ -1,21 +1,213 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import pickle
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Sequence, Tuple
 
 import joblib
 import numpy as np
 
 from app.config import Settings
+from app.models.schemas import PredictionRequest
+from app.services.feature_spec import BASE_COLUMNS, FeatureExtractor, FeatureSpec, load_spec_for
+from app.services.forest_engine import ArrayForest, forest_dir_for, forest_root_for
+from app.services.model_backends import backend_of
+
+INFERENCE_ENGINES = ("sklearn", "array")
+
+# Representative requests used to smoke-test a freshly loaded artifact before it goes live.
+SMOKE_TEST_REQUESTS = [
+    PredictionRequest(
+        unit_id=f"smoke-{bedrooms}",
+        bedrooms=bedrooms,
+        bathrooms=bathrooms,
+        square_feet=square_feet,
+        address="1 Smoke Test Way",
+        city="Seattle",
+        state="WA",
+        zip_code="98101",
+        current_rent=current_rent,
+        year_built=2005,
+    )
+    for bedrooms, bathrooms, square_feet, current_rent in (
+        (1, 1.0, 650, 1500.0),
+        (2, 1.0, 900, 2000.0),
+        (3, 2.0, 1250, 2400.0),
+    )
+]
+
+
+class ModelReloadError(RuntimeError):
+    """Raised when a candidate artifact cannot be loaded or fails its smoke test."""
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    model: Any
+    path: Path
+    version: str
+    sha256: str
+    mtime: float
+    loaded_at: datetime
+    extractor: FeatureExtractor
+    load_seconds: float = 0.0
+    backend: str = "random_forest"
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
 
 class ModelLoader:
-    """Responsible for loading and using the trained model if available."""
+    """
+    Responsible for loading and using the trained model if available.
+
+    The active model can be replaced at runtime with ``reload``: the new artifact
+    is deserialized and smoke-tested off to the side, then swapped in with a
+    single reference assignment. The previous model is kept for ``rollback``.
+    """
 
-    def __init__(self, settings: Settings):
+    def __init__(self, settings: Settings, active: Optional[LoadedModel] = None):
+        if settings.inference_engine not in INFERENCE_ENGINES:
+            raise ValueError(
+                f"Unknown inference engine {settings.inference_engine!r}; expected one of {INFERENCE_ENGINES}"
+            )
         self.settings = settings
-        self.model = self._load_model(settings.model_path)
+        self._legacy_extractor = FeatureSpec.legacy().compile()
+        self._reload_lock = threading.Lock()
+        self._previous: Optional[LoadedModel] = None
+        self._active: Optional[LoadedModel] = (
+            active if active is not None else self._load_artifact(settings.model_path)
+        )
+
+    @property
+    def model(self) -> Optional[Any]:
+        active = self._active
+        return active.model if active is not None else None
+
+    @property
+    def active(self) -> Optional[LoadedModel]:
+        return self._active
+
+    @property
+    def previous(self) -> Optional[LoadedModel]:
+        return self._previous
+
+    @property
+    def extractor(self) -> FeatureExtractor:
+        """Extractor for the active artifact's feature spec."""
+        active = self._active
+        return active.extractor if active is not None else self._legacy_extractor
+
+    @property
+    def version(self) -> str:
+        """Version of the active artifact; falls back to the configured version."""
+        active = self._active
+        return active.version if active is not None else self.settings.model_version
+
+    def reload(self, path: Optional[Path] = None) -> LoadedModel:
+        """
+        Load ``path`` (default: ``settings.model_path``), smoke-test it and make it active.
+
+        Blocking; call ``reload_async`` from the event loop.
+        """
+        target = path or self.settings.model_path
+        with self._reload_lock:
+            candidate = self._load_artifact(target)
+            if candidate is None:
+                raise ModelReloadError(f"Could not load model artifact at {target}")
+            self._smoke_test(candidate)
+            self._previous, self._active = self._active, candidate
+        print(f"[ModelLoader] Activated model {candidate.version} from {candidate.path}")
+        return candidate
+
+    async def reload_async(self, path: Optional[Path] = None) -> LoadedModel:
+        return await asyncio.to_thread(self.reload, path)
+
+    def rollback(self) -> LoadedModel:
+        """Swap the previous model back in."""
+        with self._reload_lock:
+            if self._previous is None:
+                raise ModelReloadError("No previous model to roll back to")
+            self._active, self._previous = self._previous, self._active
+            restored = self._active
+        print(f"[ModelLoader] Rolled back to model {restored.version}")
+        return restored
+
+    def _smoke_test(self, candidate: LoadedModel) -> None:
+        extractor = candidate.extractor
+        try:
+            matrix = extractor.extract(SMOKE_TEST_REQUESTS)
+            predictions = np.asarray(candidate.model.predict(matrix[:, : extractor.model_width]), dtype=np.float64)
+        except Exception as exc:  # noqa: BLE001
+            raise ModelReloadError(f"Smoke test failed for {candidate.path}: {exc}") from exc
+        if predictions.shape != (len(SMOKE_TEST_REQUESTS),) or not np.all(np.isfinite(predictions)):
+            raise ModelReloadError(f"Smoke test produced invalid predictions for {candidate.path}")
+
+    def _load_artifact(self, path: Path) -> Optional[LoadedModel]:
+        if not path:
+            return None
+        expanded = path.expanduser()
+        if not expanded.exists():
+            return None
+        started = time.perf_counter()
+        sha256 = file_sha256(expanded)
+        spec = load_spec_for(expanded)
+        written_for = spec.metadata.get("artifact_sha256") if spec is not None else None
+        if written_for is not None and written_for != sha256:
+            # Mid-publish (spec swapped, joblib not yet) or a stray spec: its columns may not match this model.
+            print(f"[ModelLoader] Feature spec next to {expanded} was written for another artifact; not loading it")
+            return None
+        spec = spec or FeatureSpec.legacy()
+        backend = spec.metadata.get("backend")
+        model = None
+        if self.settings.inference_engine == "array" and backend in (None, "random_forest"):
+            model = self._load_array_forest(expanded, sha256)
+        if model is None:
+            model = self._load_model(expanded)
+        if model is None:
+            return None
+        return LoadedModel(
+            model=model,
+            path=expanded,
+            version=f"{self.settings.model_version}+{sha256[:12]}",
+            sha256=sha256,
+            mtime=expanded.stat().st_mtime,
+            loaded_at=datetime.now(timezone.utc),
+            extractor=spec.compile(),
+            load_seconds=time.perf_counter() - started,
+            # Artifacts from before backends were recorded are identified by their estimator.
+            backend=backend or ("random_forest" if isinstance(model, ArrayForest) else backend_of(model)),
+        )
+
+    def _load_array_forest(self, path: Path, sha256: str) -> Optional[ArrayForest]:
+        """Load the flattened forest exported for this exact artifact, if there is one."""
+        directory = forest_dir_for(path, sha256)
+        if not directory.exists() and (forest_root_for(path) / "forest.json").exists():
+            # Exported before forests were versioned by artifact.
+            directory = forest_root_for(path)
+        if not directory.exists():
+            print(f"[ModelLoader] No array forest at {directory}; using the sklearn engine")
+            return None
+        try:
+            exported_for = ArrayForest.read_metadata(directory).get("artifact_sha256")
+            if exported_for != sha256:
+                print(f"[ModelLoader] Array forest at {directory} was exported for another artifact; using the sklearn engine")
+                return None
+            return ArrayForest.load(directory, mmap_mode="r" if self.settings.model_mmap else None)
+        except Exception as exc:  # noqa: BLE001
+            print(f"[ModelLoader] Failed to load array forest at {directory}: {exc}")
+            return None
 
     def _load_model(self, path: Path) -> Optional[Any]:
         if not path:
@@ -33,35 +225,54 @@ class ModelLoader:
             print(f"[ModelLoader] Failed to load model at {expanded}: {exc}")
             return None
 
+    def build_matrix(self, payloads: Sequence[PredictionRequest]) -> np.ndarray:
+        """Write requests straight into the active spec's feature matrix."""
+        return self.extractor.extract(payloads)
+
     def predict(self, features: Dict[str, Any]) -> float:
         """
         Predict rent using the loaded model or a deterministic heuristic.
 
         The heuristic provides stable output when no trained model is present.
         """
-        if self.model is not None:
-            try:
-                feature_vector = np.array(
-                    [
-                        features.get("bedrooms", 0),
-                        features.get("bathrooms", 0),
-                        features.get("square_feet", 0),
-                        features.get("current_rent", 0),
-                    ]
-                ).reshape(1, -4)
-                prediction = float(self.model.predict(feature_vector)[0])
-                return prediction
-            except Exception as exc:  # noqa: BLE001
-                print(f"[ModelLoader] Model predict failed, falling back: {exc}")
-
-        # Heuristic fallback
-        base = float(features.get("current_rent", 0))
-        bedrooms = float(features.get("bedrooms", 0))
-        bathrooms = float(features.get("bathrooms", 0))
-        sqft = float(features.get("square_feet", 0))
+        return float(self.predict_batch(self.extractor.extract_mapping(features))[0])
+
+    def predict_batch(self, matrix: np.ndarray) -> np.ndarray:
+        """
+        Predict rents for every row of ``matrix`` with a single model call.
+
+        ``matrix`` comes from ``build_matrix``: the model columns followed by the
+        base columns. Falls back to the vectorized heuristic for the whole batch
+        if the model is missing, rejects the input, or was swapped for one with a
+        different spec after the matrix was built.
+        """
+        return self.predict_batch_status(matrix)[0]
+
+    def predict_batch_status(self, matrix: np.ndarray) -> Tuple[np.ndarray, Optional[str]]:
+        """``predict_batch`` plus why it fell back: ``None``, ``"no_model"`` or ``"model_error"``."""
+        active = self._active
+        if active is None or not len(matrix):
+            reason = "no_model" if active is None else None
+            return self._heuristic_batch(matrix[:, -len(BASE_COLUMNS) :].astype(np.float64, copy=False)), reason
+
+        width = active.extractor.model_width
+        try:
+            if matrix.shape[1] != active.extractor.width:
+                raise ValueError(f"matrix has {matrix.shape[1]} columns, spec expects {active.extractor.width}")
+            return np.asarray(active.model.predict(matrix[:, :width]), dtype=np.float64), None
+        except Exception as exc:  # noqa: BLE001
+            print(f"[ModelLoader] Model predict failed, falling back: {exc}")
+        return self._heuristic_batch(matrix[:, -len(BASE_COLUMNS) :].astype(np.float64, copy=False)), "model_error"
+
+    @staticmethod
+    def _heuristic_batch(base: np.ndarray) -> np.ndarray:
+        bedrooms = base[:, 0]
+        bathrooms = base[:, 1]
+        sqft = base[:, 2]
+        base_rent = base[:, 3]
 
         size_factor = 0.35 * (sqft / 1000)
         bed_factor = 0.12 * bedrooms
         bath_factor = 0.08 * bathrooms
-        baseline = max(base, 1200.0)
+        baseline = np.maximum(base_rent, 1200.0)
         return baseline * (1 + size_factor + bed_factor + bath_factor)
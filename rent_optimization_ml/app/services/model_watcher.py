@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+from typing import Optional, Tuple
+
+from app.services.model_loader import ModelLoader, ModelReloadError, file_sha256
+
+
+class ModelWatcher:
+    """
+    Polls the model artifact and hot-reloads it when its content changes.
+
+    A cheap (mtime, size) check runs every ``interval_seconds``; the file is only
+    hashed when that signature moves, and only reloaded when the hash differs
+    from the active model. A candidate that fails to load is not retried until
+    the file changes again.
+    """
+
+    def __init__(self, model_loader: ModelLoader, path: Path, interval_seconds: float):
+        self.model_loader = model_loader
+        self.path = path.expanduser()
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._signature: Optional[Tuple[float, int]] = self._stat()
+        self._rejected_sha256: Optional[str] = None
+
+    def start(self) -> None:
+        if self._task is None and self.interval_seconds > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def check(self) -> bool:
+        """Reload if the artifact changed; returns True when a new model went live."""
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+
+        sha256 = await asyncio.to_thread(file_sha256, self.path)
+        active = self.model_loader.active
+        if (active is not None and active.sha256 == sha256) or sha256 == self._rejected_sha256:
+            return False
+        try:
+            await self.model_loader.reload_async(self.path)
+        except ModelReloadError as exc:
+            self._rejected_sha256 = sha256
+            print(f"[ModelWatcher] Keeping current model: {exc}")
+            return False
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await self.check()
+            except Exception as exc:  # noqa: BLE001
+                print(f"[ModelWatcher] Artifact check failed: {exc}")
+
+    def _stat(self) -> Optional[Tuple[float, int]]:
+        try:
+            stat = self.path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime, stat.st_size
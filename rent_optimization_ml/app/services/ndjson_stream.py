@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import json
+import time
+from typing import TYPE_CHECKING, AsyncIterable, AsyncIterator, List, Tuple
+
+from pydantic import ValidationError
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.models.schemas import PredictionRequest
+from app.services.inference_executor import InferenceOverloadedError
+
+if TYPE_CHECKING:
+    from app.services.prediction_service import PredictionService
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body iterator may keep reading the request body.
+
+    Starlette's implementation runs a disconnect listener that consumes
+    ``receive()`` messages, which would swallow request chunks still being
+    read by the iterator. Here a disconnect surfaces from ``request.stream()``
+    (``ClientDisconnect``) or from ``send`` instead.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def iter_ndjson_lines(
+    chunks: AsyncIterable[bytes],
+    max_line_bytes: int,
+) -> AsyncIterator[Tuple[int, bytes]]:
+    """Yield ``(line_number, line)`` for each non-blank line as bytes arrive."""
+    buffer = bytearray()
+    line_number = 0
+    async for chunk in chunks:
+        buffer.extend(chunk)
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end < 0:
+                break
+            line_number += 1
+            if end - start > max_line_bytes:
+                raise ValueError(f"NDJSON line {line_number} exceeds {max_line_bytes} bytes")
+            line = bytes(buffer[start:end])
+            start = end + 1
+            if line.strip():
+                yield line_number, line
+        del buffer[:start]
+        if len(buffer) > max_line_bytes:
+            raise ValueError(f"NDJSON line {line_number + 1} exceeds {max_line_bytes} bytes")
+
+    if buffer.strip():
+        yield line_number + 1, bytes(buffer)
+
+
+async def stream_predictions(
+    service: PredictionService,
+    chunks: AsyncIterable[bytes],
+    chunk_size: int,
+    max_line_bytes: int,
+) -> AsyncIterator[bytes]:
+    """
+    Score NDJSON ``PredictionRequest`` lines in bounded chunks.
+
+    At most ``chunk_size`` parsed requests are held at once, so memory stays flat
+    regardless of input size and the first results go out after the first chunk.
+    Output follows input order. Invalid lines, and lines of a chunk rejected
+    because inference is overloaded, produce an ``{"line": n, "error": ...}``
+    record instead of failing the whole stream.
+    """
+    pending: List[PredictionRequest] = []
+    pending_lines: List[int] = []
+
+    async def flush() -> bytes:
+        try:
+            results = await service.predict_many(pending)
+        except InferenceOverloadedError as exc:
+            return b"".join(_error_line(line_number, str(exc)) for line_number in pending_lines)
+        finally:
+            pending.clear()
+            pending_lines.clear()
+        started = time.perf_counter()
+        body = b"".join(result.model_dump_json().encode() + b"\n" for result in results)
+        service.metrics.stages["serialize"].observe(time.perf_counter() - started)
+        return body
+
+    try:
+        async for line_number, line in iter_ndjson_lines(chunks, max_line_bytes):
+            try:
+                request = PredictionRequest.model_validate_json(line)
+            except ValidationError as exc:
+                # Results for the lines before this one go out first.
+                if pending:
+                    yield await flush()
+                yield _error_line(line_number, exc.errors(include_url=False))
+                continue
+            pending.append(request)
+            pending_lines.append(line_number)
+            if len(pending) >= chunk_size:
+                yield await flush()
+    except ValueError as exc:
+        if pending:
+            yield await flush()
+        yield _error_line(None, str(exc))
+        return
+
+    if pending:
+        yield await flush()
+
+
+def _error_line(line_number: int | None, error: object) -> bytes:
+    return json.dumps({"line": line_number, "error": error}, default=str).encode() + b"\n"
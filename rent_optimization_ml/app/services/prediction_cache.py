@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from app.models.schemas import PredictionRequest, PredictionResponse
+
+
+class PredictionCache:
+    """
+    Bounded LRU + TTL cache of prediction responses.
+
+    Identical requests that arrive while the first one is still being computed
+    wait on the same in-flight future instead of recomputing. If the request
+    computing it is cancelled, the future resolves to ``None`` and the waiters
+    compute the result themselves.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[str, Tuple[float, PredictionResponse]] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(payload: PredictionRequest, model_version: str) -> str:
+        """Canonical hash of the request fields plus the model version."""
+        canonical = json.dumps(payload.model_dump(mode="json"), sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(f"{model_version}|{canonical}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[PredictionResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return response
+
+    def inflight(self, key: str) -> Optional[asyncio.Future]:
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        return future
+
+    def begin(self, key: str) -> None:
+        """Mark ``key`` as being computed so concurrent callers can wait on it."""
+        self.misses += 1
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+
+    def put(self, key: str, response: PredictionResponse) -> None:
+        self._entries[key] = (self._clock() + self.ttl_seconds, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        future = self._inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(response)
+
+    def fail(self, key: str, exc: BaseException) -> None:
+        future = self._inflight.pop(key, None)
+        if future is None or future.done():
+            return
+        if isinstance(exc, asyncio.CancelledError):
+            # Only the owner's client went away; the waiters' clients are still there.
+            future.set_result(None)
+            return
+        future.set_exception(exc)
+        # Mark retrieved so an unobserved failure does not log a warning.
+        future.exception()
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
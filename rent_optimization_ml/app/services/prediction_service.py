@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import asyncio
+import os
+import time
 from datetime import datetime, timezone
-from statistics import mean
-from typing import List, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 from app.config import Settings
 from app.models.schemas import (
@@ -11,8 +15,17 @@ from app.models.schemas import (
     PredictionRequest,
     PredictionResponse,
 )
+from app.services.comps_ranking import CompsRanker, RankedComps
+from app.services.inference_executor import InferenceExecutor
 from app.services.market_data_service import MarketDataService
-from app.services.model_loader import ModelLoader
+from app.services.metrics import ServiceMetrics
+from app.services.micro_batcher import MicroBatcher
+from app.services.model_loader import SMOKE_TEST_REQUESTS, ModelLoader
+from app.services.model_watcher import ModelWatcher
+from app.services.prediction_cache import PredictionCache
+from app.services.process_memory import memory_usage
+
+REASONING = "Recommendation blends model output, market comps, and amenity heuristics."
 
 
 class PredictionService:
@@ -20,57 +33,240 @@ class PredictionService:
 
     def __init__(self, settings: Settings):
         self.settings = settings
+        self.metrics = ServiceMetrics(enabled=settings.enable_metrics)
         self.model_loader = ModelLoader(settings)
+        self.executor = InferenceExecutor.from_settings(self.model_loader, settings, self.metrics)
         self.market_data = MarketDataService(settings)
+        self.comps_ranker = CompsRanker()
+        self.model_watcher = ModelWatcher(
+            self.model_loader,
+            settings.model_path,
+            interval_seconds=settings.model_watch_interval_seconds,
+        )
+        self.batcher: Optional[MicroBatcher] = None
+        if settings.enable_micro_batching:
+            self.batcher = MicroBatcher(
+                self.executor.predict,
+                max_batch_size=settings.micro_batch_max_size,
+                max_wait_ms=settings.micro_batch_max_wait_ms,
+            )
+        self.cache: Optional[PredictionCache] = None
+        if settings.enable_prediction_cache:
+            self.cache = PredictionCache(
+                max_entries=settings.prediction_cache_max_entries,
+                ttl_seconds=settings.cache_ttl_seconds,
+            )
+        # Readiness: set once start() has warmed up this process (liveness is /health).
+        self.ready = False
+        self.warmup_ms: Optional[float] = None
+        self.startup_ms: Optional[float] = None
+
+    async def start(self) -> None:
+        started = time.perf_counter()
+        self.model_watcher.start()
+        await self.market_data.start()
+        await self.warm_up()
+        self.startup_ms = (time.perf_counter() - started) * 1000
+
+    async def warm_up(self) -> None:
+        """
+        Score the smoke-test requests end to end before taking traffic.
+
+        Creates the executor pools and faults in the model pages (memory-mapped
+        or inherited from a preloading parent) so the first real request does
+        not pay for them. The service only reports ready once this succeeds.
+        """
+        started = time.perf_counter()
+        try:
+            await self._predict_uncached(SMOKE_TEST_REQUESTS)
+        except Exception as exc:  # noqa: BLE001
+            print(f"[PredictionService] Warm-up failed, not ready: {exc}")
+            return
+        self.warmup_ms = (time.perf_counter() - started) * 1000
+        self.ready = True
+
+    async def close(self) -> None:
+        await self.model_watcher.stop()
+        await self.market_data.close()
+        if self.batcher is not None:
+            await self.batcher.close()
+        self.executor.shutdown()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        stats: Dict[str, Dict[str, float]] = {"inference_executor": self.executor.stats()}
+        if self.batcher is not None:
+            stats["micro_batcher"] = self.batcher.stats()
+        if self.cache is not None:
+            stats["prediction_cache"] = self.cache.stats()
+        market_stats = self.market_data.stats()
+        if market_stats is not None:
+            stats["market_data"] = market_stats
+        stats["process"] = {"pid": os.getpid(), "ready": float(self.ready), **memory_usage()}
+        return stats
+
+    def model_load_ms(self) -> Optional[float]:
+        active = self.model_loader.active
+        return active.load_seconds * 1000 if active is not None else None
 
     async def predict(self, payload: PredictionRequest) -> PredictionResponse:
-        comparables = await self.market_data.fetch_comparables(payload)
-        model_rent = self.model_loader.predict(payload.model_dump())
+        results = await self.predict_many([payload])
+        return results[0]
+
+    async def predict_many(self, payloads: Sequence[PredictionRequest]) -> List[PredictionResponse]:
+        """
+        Score a batch of units with one feature matrix and one model call.
+
+        Market signal, confidence intervals and factor impacts are computed
+        column-wise; per-item results match ``predict``. Cached responses are
+        reused and only the misses are computed.
+        """
+        if not payloads:
+            return []
+        self.metrics.batch_size.labels("request").observe(len(payloads))
+        if self.cache is None:
+            self.metrics.predictions.labels("computed").inc(len(payloads))
+            return await self._predict_uncached(payloads)
 
-        market_signal = self._market_signal(payload.current_rent, comparables)
-        recommended = max(model_rent * market_signal, payload.current_rent * 0.85)
+        cache = self.cache
+        # Keyed on the active artifact so a hot reload never serves stale predictions.
+        model_version = self.model_loader.version
+        results: List[Optional[PredictionResponse]] = [None] * len(payloads)
+        waiting: Dict[int, asyncio.Future] = {}
+        owned: Dict[str, List[int]] = {}
+        for idx, payload in enumerate(payloads):
+            key = cache.make_key(payload, model_version)
+            if key in owned:
+                owned[key].append(idx)
+                continue
+            cached = cache.get(key)
+            if cached is not None:
+                results[idx] = cached
+                continue
+            inflight = cache.inflight(key)
+            if inflight is not None:
+                waiting[idx] = inflight
+                continue
+            cache.begin(key)
+            owned[key] = [idx]
+
+        if owned:
+            try:
+                computed = await self._predict_uncached([payloads[idxs[0]] for idxs in owned.values()])
+            except BaseException as exc:
+                for key in owned:
+                    cache.fail(key, exc)
+                raise
+            for (key, idxs), response in zip(owned.items(), computed):
+                cache.put(key, response)
+                for idx in idxs:
+                    results[idx] = response
+
+        abandoned: List[int] = []
+        for idx, future in waiting.items():
+            results[idx] = await asyncio.shield(future)
+            if results[idx] is None:
+                abandoned.append(idx)
+        if abandoned:
+            # The request computing these was cancelled: compute them here (or join a newer computation).
+            retried = await self.predict_many([payloads[idx] for idx in abandoned])
+            for idx, response in zip(abandoned, retried):
+                results[idx] = response
+
+        computed_count = sum(len(idxs) for idxs in owned.values())
+        predictions = self.metrics.predictions
+        predictions.labels("computed").inc(computed_count)
+        predictions.labels("coalesced").inc(len(waiting) - len(abandoned))
+        predictions.labels("cache").inc(len(payloads) - computed_count - len(waiting))
+        return results  # type: ignore[return-value]
+
+    async def _predict_uncached(self, payloads: Sequence[PredictionRequest]) -> List[PredictionResponse]:
+        stages = self.metrics.stages
+        started = time.perf_counter()
+        candidates = await self.market_data.fetch_candidates(payloads)
+        ranked = self.comps_ranker.rank(payloads, candidates, self.settings.market_data_max_comps)
+        comparables = ranked.comparables
+        fetched = time.perf_counter()
+        stages["market_data"].observe(fetched - started)
+        matrix = self.model_loader.build_matrix(payloads)
+        built = time.perf_counter()
+        stages["features"].observe(built - fetched)
+        model_rents = await self._infer(matrix)
+        inferred = time.perf_counter()
+        stages["inference"].observe(inferred - built)
+        current_rents = np.array([p.current_rent for p in payloads], dtype=np.float64)
+
+        market_avgs = ranked.market_avgs
+        market_signals = self._market_signal(current_rents, market_avgs)
+        recommended = np.maximum(model_rents * market_signals, current_rents * 0.85)
 
         ci_low, ci_high = self._confidence_interval(recommended)
-        factors = self._factors(payload, comparables, model_rent, recommended)
-
-        return PredictionResponse(
-            unit_id=payload.unit_id,
-            current_rent=payload.current_rent,
-            recommended_rent=round(recommended, 2),
-            confidence_interval_low=round(ci_low, 2),
-            confidence_interval_high=round(ci_high, 2),
-            confidence_score=0.82 if comparables else 0.68,
-            factors=factors,
-            market_comparables=comparables,
-            reasoning="Recommendation blends model output, market comps, and amenity heuristics.",
-            model_version=self.settings.model_version,
-            generated_at=datetime.now(timezone.utc),
-            market_trend="rising" if market_signal > 1 else "flat",
-            seasonality_factor=1.05 if self.settings.use_seasonal_adjustment else 1.0,
-        )
+        confidence = self._confidence_score(ranked)
+        impacts = (recommended - current_rents) / np.maximum(current_rents, 1) * 100
+
+        generated_at = datetime.now(timezone.utc)
+        seasonality = 1.05 if self.settings.use_seasonal_adjustment else 1.0
+        results: List[PredictionResponse] = []
+        for idx, payload in enumerate(payloads):
+            comps = comparables[idx]
+            results.append(
+                PredictionResponse(
+                    unit_id=payload.unit_id,
+                    current_rent=payload.current_rent,
+                    recommended_rent=round(float(recommended[idx]), 2),
+                    confidence_interval_low=round(float(ci_low[idx]), 2),
+                    confidence_interval_high=round(float(ci_high[idx]), 2),
+                    confidence_score=float(confidence[idx]),
+                    factors=self._factors(
+                        payload,
+                        comps,
+                        float(market_avgs[idx]),
+                        float(model_rents[idx]),
+                        float(impacts[idx]),
+                    ),
+                    market_comparables=comps,
+                    reasoning=REASONING,
+                    model_version=self.settings.model_version,
+                    generated_at=generated_at,
+                    market_trend="rising" if market_signals[idx] > 1 else "flat",
+                    seasonality_factor=seasonality,
+                )
+            )
+        stages["postprocess"].observe(time.perf_counter() - inferred)
+        return results
+
+    async def _infer(self, matrix: np.ndarray) -> np.ndarray:
+        # Small requests ride the micro-batcher; full batches are already one matrix.
+        if self.batcher is not None and len(matrix) < self.batcher.max_batch_size:
+            return await self.batcher.submit(matrix)
+        return await self.executor.predict(matrix)
+
+    def _market_signal(self, current_rents: np.ndarray, market_avgs: np.ndarray) -> np.ndarray:
+        """Clamp the delta between the ranked comps' weighted average and current rent to +/-12%; NaN means no comps."""
+        valid = ~np.isnan(market_avgs) & (current_rents > 0)
+        safe_rents = np.where(valid, current_rents, 1.0)
+        delta = (np.where(valid, market_avgs, safe_rents) - safe_rents) / safe_rents
+        return np.where(valid, 1 + np.clip(delta, -0.12, 0.12), 1.0)
+
+    @staticmethod
+    def _confidence_score(ranked: RankedComps) -> np.ndarray:
+        """0.68 without comps, up to 0.82 as the share of market sources that answered grows."""
+        has_comps = np.array([bool(comps) for comps in ranked.comparables])
+        return np.round(np.where(has_comps, 0.68 + 0.14 * ranked.coverage, 0.68), 4)
 
-    def _market_signal(self, current_rent: float, comparables: List[ComparableProperty]) -> float:
-        if not comparables:
-            return 1.0
-        market_avg = mean([c.price for c in comparables])
-        if current_rent <= 0:
-            return 1.0
-        delta = (market_avg - current_rent) / current_rent
-        return 1 + max(min(delta, 0.12), -0.12)
-
-    def _confidence_interval(self, recommended: float) -> Tuple[float, float]:
-        spread = max(recommended * 0.08, 80.0)
+    def _confidence_interval(self, recommended: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        spread = np.maximum(recommended * 0.08, 80.0)
         return recommended - spread, recommended + spread
 
     def _factors(
         self,
         payload: PredictionRequest,
         comparables: List[ComparableProperty],
+        market_avg: float,
         model_rent: float,
-        recommended: float,
+        impact: float,
     ) -> List[PredictionFactors]:
         comps_text = (
-            f"{len(comparables)} comps avg ${mean(c.price for c in comparables):.0f}"
+            f"{len(comparables)} comps avg ${market_avg:.0f}"
             if comparables
             else "No live comps; using heuristic"
         )
@@ -87,7 +283,7 @@ class PredictionService:
         return [
             PredictionFactors(
                 name="Model Baseline",
-                impact_percentage=round((recommended - payload.current_rent) / max(payload.current_rent, 1) * 100, 2),
+                impact_percentage=round(impact, 2),
                 description=f"Model suggested ${model_rent:.0f} before adjustments.",
             ),
             PredictionFactors(
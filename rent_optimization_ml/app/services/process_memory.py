@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import os
+import resource
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+
+# smaps_rollup fields reported by memory_usage(), in MiB.
+SMAPS_FIELDS = {
+    "Rss": "rss_mb",
+    "Pss": "pss_mb",
+    "Shared_Clean": "shared_clean_mb",
+    "Shared_Dirty": "shared_dirty_mb",
+    "Private_Clean": "private_clean_mb",
+    "Private_Dirty": "private_dirty_mb",
+}
+
+
+def memory_usage(pid: Optional[int] = None) -> Dict[str, float]:
+    """
+    Resident memory of ``pid`` (default: this process) in MiB.
+
+    On Linux this reads ``/proc/<pid>/smaps_rollup``: ``pss_mb`` divides
+    shared pages between the processes mapping them, so summing it across
+    workers gives the real footprint of a preforked server where ``rss_mb``
+    would count a shared model once per worker. Elsewhere only the peak RSS of
+    this process is available.
+    """
+    path = Path(f"/proc/{pid or os.getpid()}/smaps_rollup")
+    try:
+        lines = path.read_text().splitlines()
+    except OSError:
+        if pid not in (None, os.getpid()):
+            return {}
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS, KiB on Linux.
+        return {"peak_rss_mb": peak / (1 << 20) if sys.platform == "darwin" else peak / 1024}
+
+    usage: Dict[str, float] = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        key = SMAPS_FIELDS.get(name)
+        if key is not None:
+            usage[key] = int(value.split()[0]) / 1024
+    return usage
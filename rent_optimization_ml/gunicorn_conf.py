@@ -0,0 +1,33 @@
+"""
+Production launch: ``gunicorn -c gunicorn_conf.py main:app``.
+
+With ``preload_app`` the master imports ``main`` (and so loads the model) once,
+then forks the uvicorn workers, which share the model's pages copy-on-write
+instead of each deserializing their own copy. Pair with
+``INFERENCE_ENGINE=array`` and ``MODEL_MMAP=true`` to map the exported forest
+straight from the page cache. Each worker warms up in its lifespan and only
+then reports ready on ``/ready``.
+"""
+
+import gc
+import os
+
+from app.config import get_settings
+
+_settings = get_settings()
+
+bind = f"{_settings.api_host}:{_settings.api_port}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() not in {"0", "false", "no"}
+# Warm-up happens before a worker accepts traffic; leave room for a slow first model load.
+timeout = 120
+graceful_timeout = 30
+
+
+def when_ready(server) -> None:
+    # Runs in the master after the preload and before the first fork: move everything
+    # allocated so far out of the collector's reach so gc passes in the workers don't
+    # write to (and un-share) the inherited pages.
+    if preload_app:
+        gc.freeze()
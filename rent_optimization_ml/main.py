@@ -1,9 +1,13 @@
-import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
-from typing import List
+from typing import AsyncIterator, Dict
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel
 
 from app.config import get_settings
 from app.models.schemas import (
@@ -13,16 +17,32 @@ from app.models.schemas import (
     ModelInfo,
     PredictionRequest,
     PredictionResponse,
+    ReadinessResponse,
 )
+from app.services.inference_executor import InferenceOverloadedError
+from app.services.metrics import PROMETHEUS_CONTENT_TYPE, MetricsMiddleware
+from app.services.model_loader import ModelReloadError
+from app.services.ndjson_stream import NDJSON_MEDIA_TYPE, DuplexStreamingResponse, stream_predictions
 from app.services.prediction_service import PredictionService
+from app.services.process_memory import memory_usage
 
 settings = get_settings()
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    await prediction_service.start()
+    yield
+    await prediction_service.close()
+
+
 app = FastAPI(
     title="Rent Optimization ML",
     version=settings.model_version,
     description="Digital Twin ML microservice for rent recommendations",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -34,6 +54,20 @@ app.add_middleware(
 )
 
 prediction_service = PredictionService(settings)
+app.add_middleware(MetricsMiddleware, metrics=prediction_service.metrics)
+
+
+def _json_response(model: BaseModel) -> Response:
+    """Serialize ``model`` directly (same bytes as FastAPI's encoder) and time it as a stage."""
+    started = time.perf_counter()
+    body = model.model_dump_json()
+    prediction_service.metrics.stages["serialize"].observe(time.perf_counter() - started)
+    return Response(content=body, media_type="application/json")
+
+
+@app.exception_handler(InferenceOverloadedError)
+async def inference_overloaded(_: Request, exc: InferenceOverloadedError) -> JSONResponse:
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
 
 
 @app.get("/health", response_model=HealthResponse)
@@ -45,37 +79,104 @@ async def health() -> HealthResponse:
     )
 
 
-@app.get("/model/info", response_model=ModelInfo)
-async def model_info() -> ModelInfo:
+@app.get("/ready", response_model=ReadinessResponse)
+async def ready(response: Response) -> ReadinessResponse:
+    """Readiness for this worker: 503 until the model is loaded and warmed up."""
+    if not prediction_service.ready:
+        response.status_code = 503
+    return ReadinessResponse(
+        ready=prediction_service.ready,
+        pid=os.getpid(),
+        model_version=prediction_service.model_loader.version,
+        loaded_model=prediction_service.model_loader.model is not None,
+        model_load_ms=prediction_service.model_load_ms(),
+        warmup_ms=prediction_service.warmup_ms,
+        startup_ms=prediction_service.startup_ms,
+        memory_mb=memory_usage(),
+    )
+
+
+def _model_info() -> ModelInfo:
+    loader = prediction_service.model_loader
+    active = loader.active
+    previous = loader.previous
+    spec = loader.extractor.spec
     return ModelInfo(
         model_version=settings.model_version,
-        ready=prediction_service.model_loader.model is not None,
-        features=[
-            "bedrooms",
-            "bathrooms",
-            "square_feet",
-            "current_rent",
-            "amenities",
-            "market_comps",
-        ],
+        trained_on=spec.metadata.get("trained_on"),
+        ready=active is not None,
+        active_version=loader.version,
+        artifact_sha256=active.sha256 if active else None,
+        backend=active.backend if active else None,
+        loaded_at=active.loaded_at if active else None,
+        previous_version=previous.version if previous else None,
+        features=list(spec.columns),
     )
 
 
+@app.get("/model/info", response_model=ModelInfo)
+async def model_info() -> ModelInfo:
+    return _model_info()
+
+
+@app.post("/model/reload", response_model=ModelInfo)
+async def reload_model() -> ModelInfo:
+    try:
+        await prediction_service.model_loader.reload_async()
+    except ModelReloadError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+    return _model_info()
+
+
+@app.post("/model/rollback", response_model=ModelInfo)
+async def rollback_model() -> ModelInfo:
+    try:
+        prediction_service.model_loader.rollback()
+    except ModelReloadError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    return _model_info()
+
+
+@app.get("/stats", response_model=Dict[str, Dict[str, float]])
+async def stats() -> Dict[str, Dict[str, float]]:
+    return prediction_service.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    """Prometheus text exposition for this worker process."""
+    if not settings.enable_metrics:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (ENABLE_METRICS=false)")
+    body = prediction_service.metrics.render(gauges=prediction_service.stats())
+    return PlainTextResponse(body, media_type=PROMETHEUS_CONTENT_TYPE)
+
+
 @app.post("/predict", response_model=PredictionResponse)
-async def predict(payload: PredictionRequest) -> PredictionResponse:
-    return await prediction_service.predict(payload)
+async def predict(payload: PredictionRequest) -> Response:
+    return _json_response(await prediction_service.predict(payload))
 
 
 @app.post("/predict/batch", response_model=BatchPredictionResponse)
-async def predict_batch(payload: BatchPredictionRequest) -> BatchPredictionResponse:
+async def predict_batch(payload: BatchPredictionRequest) -> Response:
     if not payload.root:
         raise HTTPException(status_code=400, detail="No payloads provided")
 
-    tasks: List[asyncio.Task[PredictionResponse]] = [
-        asyncio.create_task(prediction_service.predict(item)) for item in payload.root
-    ]
-    results = await asyncio.gather(*tasks)
-    return BatchPredictionResponse(results=results)
+    results = await prediction_service.predict_many(payload.root)
+    return _json_response(BatchPredictionResponse(results=results))
+
+
+@app.post("/predict/stream")
+async def predict_stream(request: Request) -> DuplexStreamingResponse:
+    """Score NDJSON request lines incrementally and stream NDJSON results back."""
+    return DuplexStreamingResponse(
+        stream_predictions(
+            prediction_service,
+            request.stream(),
+            chunk_size=settings.stream_chunk_size,
+            max_line_bytes=settings.stream_max_line_bytes,
+        ),
+        media_type=NDJSON_MEDIA_TYPE,
+    )
 
 
 if __name__ == "__main__":
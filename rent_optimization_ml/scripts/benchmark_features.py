@@ -0,0 +1,245 @@
+"""
+Benchmark feature engineering: the registry against the former ``add_basic_features``.
+
+Builds a synthetic training frame (the extraction's columns and dtypes) and
+times, median of ``--repeat`` runs:
+- ``legacy``: the former ``add_basic_features`` (frame copy, ``.apply`` age
+  buckets, per-row label-encoding lambdas), kept below as
+  ``legacy_add_basic_features``;
+- ``engineer``: ``engineer_features``, fitting and computing the registry
+  column-wise and returning only the engineered columns;
+- ``add_basic``: the current ``add_basic_features`` (the above plus the
+  frame copy its callers expect).
+
+It also checks that both produce the same values (category codes only have
+to pair up one to one, since the numbering changed) and times serving
+extraction of the same features over request batches.
+
+Usage:
+    python scripts/benchmark_features.py [--rows 1000000] [--repeat 3] [--batch 256]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = Path(__file__).parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.services.feature_registry import FEATURES
+from scripts.extract_training_data import TRAINING_COLUMNS
+from scripts.prepare_features import add_basic_features, engineer_features
+from scripts.train_model import build_feature_spec
+
+CATEGORIES = [name for name, feature in FEATURES.items() if feature.kind == "category"]
+
+
+def legacy_add_basic_features(df: pd.DataFrame) -> pd.DataFrame:
+    """The former ``prepare_features.add_basic_features``, for comparison only."""
+    engineered = df.copy()
+
+    if "current_rent" in engineered.columns and "square_feet" in engineered.columns:
+        engineered["rent_per_sqft"] = engineered["current_rent"] / engineered["square_feet"]
+
+    engineered["bath_per_bed"] = engineered["bathrooms"] / engineered["bedrooms"].clip(lower=1)
+
+    if len(engineered) >= 4:
+        try:
+            engineered["size_bucket"] = pd.qcut(
+                engineered["square_feet"], q=4, labels=False, duplicates="drop"
+            )
+        except ValueError:
+            engineered["size_bucket"] = pd.cut(
+                engineered["square_feet"], bins=4, labels=False, duplicates="drop"
+            )
+
+    if "total_operating_cost_monthly" in engineered.columns and "current_rent" in engineered.columns:
+        engineered["operating_cost_to_rent_ratio"] = (
+            engineered["total_operating_cost_monthly"] / engineered["current_rent"].clip(lower=1)
+        )
+
+    if "maintenance_monthly_avg" in engineered.columns and "current_rent" in engineered.columns:
+        engineered["maintenance_to_rent_ratio"] = (
+            engineered["maintenance_monthly_avg"] / engineered["current_rent"].clip(lower=1)
+        )
+
+    if "total_operating_cost_per_sqft" in engineered.columns:
+        engineered["cost_efficiency_score"] = 1 / (engineered["total_operating_cost_per_sqft"] + 0.01)
+
+    if "vacancy_rate" in engineered.columns and "current_rent" in engineered.columns:
+        engineered["vacancy_penalty"] = engineered["vacancy_rate"] * engineered["current_rent"]
+        engineered["vacancy_adjusted_rent"] = engineered["current_rent"] * (1 - engineered["vacancy_rate"])
+
+    if "maintenance_monthly_avg" in engineered.columns and "maintenance_requests_12mo" in engineered.columns:
+        engineered["maintenance_cost_per_request"] = (
+            engineered["maintenance_monthly_avg"] / engineered["maintenance_requests_12mo"].clip(lower=1)
+        )
+
+    if "maintenance_requests_per_unit" in engineered.columns and "maintenance_monthly_avg" in engineered.columns:
+        engineered["maintenance_burden"] = (
+            engineered["maintenance_requests_per_unit"] * engineered["maintenance_monthly_avg"]
+        )
+
+    if "property_age" in engineered.columns:
+        def age_bucket(age: float) -> int:
+            if pd.isna(age):
+                return 1
+            if age < 5:
+                return 0
+            elif age < 15:
+                return 1
+            elif age < 30:
+                return 2
+            else:
+                return 3
+
+        engineered["property_age_bucket"] = engineered["property_age"].apply(age_bucket)
+
+    if "city" in engineered.columns:
+        unique_cities = engineered["city"].unique()
+        city_codes = {city: idx for idx, city in enumerate(unique_cities)}
+        engineered["city_encoded"] = engineered["city"].apply(lambda x: city_codes.get(x, -1))
+
+    if "state" in engineered.columns:
+        unique_states = engineered["state"].unique()
+        state_codes = {state: idx for idx, state in enumerate(unique_states)}
+        engineered["state_encoded"] = engineered["state"].apply(lambda x: state_codes.get(x, -1))
+
+    if "market_competition_score" in engineered.columns:
+        engineered["market_competition_score"] = engineered["market_competition_score"].clip(0, 1)
+
+    return engineered
+
+
+def synthetic_training_frame(rows: int, seed: int = 0, cities: int = 2000) -> pd.DataFrame:
+    """``rows`` training rows with the extraction's columns and dtypes and plausible values."""
+    rng = np.random.default_rng(seed)
+    bedrooms = rng.integers(0, 5, rows).astype(np.float32)
+    square_feet = (450 + bedrooms * 300 + rng.integers(0, 400, rows)).astype(np.int32)
+    current_rent = np.round(900 + square_feet * rng.uniform(1.2, 2.8, rows), 2)
+    data: Dict[str, Any] = {
+        "bedrooms": bedrooms,
+        "bathrooms": np.maximum(1, bedrooms - rng.integers(0, 2, rows)).astype(np.float32),
+        "square_feet": square_feet,
+        "current_rent": current_rent,
+        "achieved_rent": np.round(current_rent * rng.uniform(0.95, 1.1, rows), 2),
+        "vacancy_rate": rng.uniform(0, 0.2, rows),
+        "maintenance_requests_12mo": rng.poisson(4, rows).astype(np.int32),
+        "property_age": rng.integers(0, 80, rows).astype(np.int32),
+        "properties_in_city_count": rng.integers(1, 200, rows).astype(np.int32),
+        "market_competition_score": rng.uniform(0, 1, rows),
+    }
+    total_monthly = np.zeros(rows)
+    for category in ("maintenance", "taxes", "insurance", "repairs", "other"):
+        yearly = np.round(rng.gamma(2.0, 900.0, rows), 2)
+        data[f"{category}_yearly_total"] = yearly
+        data[f"{category}_monthly_avg"] = yearly / 12
+        data[f"{category}_per_sqft"] = yearly / square_feet
+        total_monthly += yearly / 12
+    data["total_operating_cost_monthly"] = total_monthly
+    data["total_operating_cost_yearly"] = total_monthly * 12
+    data["total_operating_cost_per_sqft"] = total_monthly * 12 / square_feet
+    data["maintenance_requests_per_unit"] = data["maintenance_requests_12mo"] / 25.0
+    data["maintenance_frequency_bucket"] = np.digitize(data["maintenance_requests_12mo"], [4, 9]).astype(np.int8)
+    city = rng.integers(0, cities, rows)
+    data["city"] = np.array([f"City {n}" for n in range(cities)], dtype=object)[city]
+    data["state"] = np.array([f"S{n % 50:02d}" for n in range(cities)], dtype=object)[city]
+    data["zip_code"] = np.array([f"{10000 + n}" for n in range(cities)], dtype=object)[city]
+    return pd.DataFrame(data)[TRAINING_COLUMNS]
+
+
+def compare(legacy: pd.DataFrame, current: pd.DataFrame) -> List[str]:
+    """Engineered columns whose values differ between the two implementations."""
+    differing = []
+    for name in FEATURES:
+        if name not in legacy.columns or name not in current.columns:
+            continue
+        if name in CATEGORIES:
+            # Codes are numbered differently; they must still pair up one to one.
+            pairs = pd.DataFrame({"legacy": legacy[name], "current": current[name]}).drop_duplicates()
+            same = pairs["legacy"].is_unique and pairs["current"].is_unique
+        else:
+            same = np.allclose(
+                legacy[name].to_numpy(dtype=np.float64), current[name].to_numpy(dtype=np.float64), equal_nan=True
+            )
+        if not same:
+            differing.append(name)
+    return differing
+
+
+def _median_seconds(fn: Callable[[], Any], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def benchmark_serving(frame: pd.DataFrame, batch: int, repeat: int) -> Dict[str, float]:
+    """Extraction time per request batch with a spec trained on ``frame``."""
+    features, fitted = engineer_features(frame)
+    columns = ["bedrooms", "bathrooms", "square_feet", "current_rent", *features.columns]
+    extractor = build_feature_spec(frame, columns, frame.median(numeric_only=True), fitted).compile()
+    sample = frame.sample(batch, random_state=0)
+    payloads = [
+        SimpleNamespace(
+            bedrooms=row.bedrooms, bathrooms=row.bathrooms, square_feet=row.square_feet,
+            current_rent=row.current_rent, city=row.city, state=row.state, zip_code=row.zip_code,
+        )
+        for row in sample.itertuples()
+    ]
+    extractor.extract(payloads)  # build the vocabulary lookups once, as a warm service has
+    seconds = _median_seconds(lambda: extractor.extract(payloads), max(repeat, 20))
+    return {"batch": batch, "ms_per_batch": seconds * 1000, "us_per_row": seconds * 1e6 / batch}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch", type=int, default=256, help="requests per serving batch")
+    parser.add_argument("--output", type=Path, help="also write the report as JSON")
+    args = parser.parse_args()
+
+    frame = synthetic_training_frame(args.rows)
+    legacy = legacy_add_basic_features(frame)
+    differing = compare(legacy, add_basic_features(frame))
+    report = {
+        "rows": args.rows,
+        "repeat": args.repeat,
+        "legacy_s": _median_seconds(lambda: legacy_add_basic_features(frame), args.repeat),
+        "engineer_s": _median_seconds(lambda: engineer_features(frame), args.repeat),
+        "add_basic_s": _median_seconds(lambda: add_basic_features(frame), args.repeat),
+        "serving": benchmark_serving(frame, args.batch, args.repeat),
+        "differing_columns": differing,
+    }
+    report["speedup"] = report["legacy_s"] / report["engineer_s"]
+
+    print(f"{'rows':>10}{'legacy s':>10}{'engineer s':>12}{'add_basic s':>13}{'speedup':>9}  identical")
+    print(
+        f"{args.rows:>10}{report['legacy_s']:>10.2f}{report['engineer_s']:>12.2f}"
+        f"{report['add_basic_s']:>13.2f}{report['speedup']:>8.1f}x  {str(not differing).lower()}"
+    )
+    serving = report["serving"]
+    print(f"serving: {serving['ms_per_batch']:.2f} ms per {serving['batch']}-request batch ({serving['us_per_row']:.1f} µs/row)")
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+    if differing:
+        print(f"Differing columns: {', '.join(differing)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+In-process load and latency benchmark for the ML service.
+
+Drives the FastAPI ``app`` through ``httpx.ASGITransport`` (no sockets, no
+server process) with synthetic ``PredictionRequest`` workloads and reports,
+per path, throughput and p50/p95/p99 latency per HTTP call:
+
+- ``single``: ``POST /predict``, one unit per call
+- ``batch``:  ``POST /predict/batch`` with ``--batch-size`` units per call
+- ``stream``: ``POST /predict/stream`` with ``--stream-size`` NDJSON lines per call
+
+Calls are issued by ``--concurrency`` concurrent clients. Every unit id is
+unique, so the prediction cache never turns the run into a cache benchmark.
+The app lifespan runs (executor start-up, warm-up) before timing starts.
+
+Results are compared against a stored baseline; any path whose throughput
+drops, or whose p95/p99 grows, by more than ``--tolerance`` fails the run with
+exit code 1. Baselines are machine-specific: record one per CI runner with
+``--update-baseline``.
+
+Usage:
+    python scripts/benchmark_service.py [--units 2000] [--concurrency 16] [--paths single,batch]
+    python scripts/benchmark_service.py --update-baseline
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+
+import numpy as np
+
+SCRIPT_DIR = Path(__file__).parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+DEFAULT_BASELINE = SCRIPT_DIR / "benchmark_baseline.json"
+PATHS = ("single", "batch", "stream")
+# Metrics where a larger value is a regression; throughput regresses when it shrinks.
+LATENCY_METRICS = ("p95_ms", "p99_ms")
+
+CITIES = (
+    ("Seattle", "WA", "98101"),
+    ("Austin", "TX", "78701"),
+    ("Denver", "CO", "80202"),
+    ("Atlanta", "GA", "30303"),
+    ("Phoenix", "AZ", "85004"),
+)
+
+
+def synthetic_payloads(count: int, seed: int = 0, prefix: str = "bench") -> List[Dict[str, Any]]:
+    """Deterministic, varied ``PredictionRequest`` bodies with unique unit ids."""
+    rng = random.Random(seed)
+    payloads = []
+    for idx in range(count):
+        city, state, zip_code = CITIES[idx % len(CITIES)]
+        bedrooms = rng.randint(0, 4)
+        payloads.append(
+            {
+                "unit_id": f"{prefix}-{seed}-{idx}",
+                "bedrooms": bedrooms,
+                "bathrooms": rng.choice((1.0, 1.5, 2.0, 2.5)),
+                "square_feet": rng.randint(350, 600) + 350 * bedrooms,
+                "address": f"{rng.randint(1, 9999)} Benchmark Ave",
+                "city": city,
+                "state": state,
+                "zip_code": zip_code,
+                "current_rent": round(rng.uniform(900, 4200), 2),
+                "has_parking": rng.random() < 0.5,
+                "has_laundry": rng.random() < 0.6,
+                "has_pool": rng.random() < 0.2,
+                "has_gym": rng.random() < 0.3,
+                "year_built": rng.randint(1950, 2023),
+                "floor_number": rng.randint(1, 20),
+            }
+        )
+    return payloads
+
+
+def summarize(latencies_s: Sequence[float], units: int, wall_s: float) -> Dict[str, float]:
+    latencies_ms = np.asarray(latencies_s, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "calls": len(latencies_ms),
+        "units": units,
+        "wall_s": round(wall_s, 4),
+        "calls_per_s": round(len(latencies_ms) / wall_s, 2),
+        "units_per_s": round(units / wall_s, 2),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(latencies_ms.max()), 3),
+    }
+
+
+async def _drive(calls: Sequence[Callable[[], Awaitable[int]]], concurrency: int) -> List[float]:
+    """Run ``calls`` with ``concurrency`` clients; returns each call's latency in seconds."""
+    latencies: List[float] = []
+    pending = iter(calls)
+
+    async def client() -> None:
+        for call in pending:
+            started = time.perf_counter()
+            units = await call()
+            latencies.append(time.perf_counter() - started)
+            if units < 0:
+                raise RuntimeError("benchmark call failed")
+
+    await asyncio.gather(*(client() for _ in range(max(1, concurrency))))
+    return latencies
+
+
+async def run_benchmark(
+    paths: Sequence[str] = PATHS,
+    units: int = 2000,
+    concurrency: int = 16,
+    batch_size: int = 50,
+    stream_size: int = 500,
+    warmup_units: int = 50,
+    seed: int = 0,
+) -> Dict[str, Dict[str, float]]:
+    import httpx
+
+    from main import app
+
+    results: Dict[str, Dict[str, float]] = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+            def post_single(body: Dict[str, Any]) -> Callable[[], Awaitable[int]]:
+                async def call() -> int:
+                    response = await client.post("/predict", json=body)
+                    return 1 if response.status_code == 200 else -1
+
+                return call
+
+            def post_batch(bodies: List[Dict[str, Any]]) -> Callable[[], Awaitable[int]]:
+                async def call() -> int:
+                    response = await client.post("/predict/batch", json=bodies)
+                    return len(bodies) if response.status_code == 200 else -1
+
+                return call
+
+            def post_stream(bodies: List[Dict[str, Any]]) -> Callable[[], Awaitable[int]]:
+                content = "\n".join(json.dumps(body) for body in bodies).encode()
+
+                async def call() -> int:
+                    response = await client.post("/predict/stream", content=content)
+                    if response.status_code != 200 or response.text.count("\n") != len(bodies):
+                        return -1
+                    return len(bodies)
+
+                return call
+
+            builders = {
+                "single": lambda bodies: [post_single(body) for body in bodies],
+                "batch": lambda bodies: [
+                    post_batch(bodies[i : i + batch_size]) for i in range(0, len(bodies), batch_size)
+                ],
+                "stream": lambda bodies: [
+                    post_stream(bodies[i : i + stream_size]) for i in range(0, len(bodies), stream_size)
+                ],
+            }
+            for offset, path in enumerate(paths):
+                # Untimed pass first so lazily created pools and code paths are warm.
+                await _drive(builders[path](synthetic_payloads(warmup_units, seed + 1000 + offset, "warm")), concurrency)
+                bodies = synthetic_payloads(units, seed + offset, path)
+                calls = builders[path](bodies)
+                started = time.perf_counter()
+                latencies = await _drive(calls, concurrency)
+                results[path] = summarize(latencies, units, time.perf_counter() - started)
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float
+) -> List[str]:
+    """Human-readable regressions of ``results`` against ``baseline`` (empty when none)."""
+    regressions = []
+    for path, current in results.items():
+        reference = baseline.get(path)
+        if not reference:
+            continue
+        if current["units_per_s"] < reference["units_per_s"] * (1 - tolerance):
+            regressions.append(
+                f"{path}: throughput {current['units_per_s']:.1f} units/s < baseline "
+                f"{reference['units_per_s']:.1f} (-{(1 - current['units_per_s'] / reference['units_per_s']) * 100:.0f}%)"
+            )
+        for metric in LATENCY_METRICS:
+            if current[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{path}: {metric} {current[metric]:.2f} ms > baseline {reference[metric]:.2f} ms "
+                    f"(+{(current[metric] / reference[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paths", default=",".join(PATHS), help="comma-separated subset of single,batch,stream")
+    parser.add_argument("--units", type=int, default=2000, help="units scored per path")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--stream-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed fractional slowdown")
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--json", type=Path, help="also write this run's results here")
+    args = parser.parse_args()
+
+    paths = [path.strip() for path in args.paths.split(",") if path.strip()]
+    unknown = set(paths) - set(PATHS)
+    if unknown:
+        parser.error(f"unknown paths: {', '.join(sorted(unknown))}")
+
+    workload = {
+        "units": args.units,
+        "concurrency": args.concurrency,
+        "batch_size": args.batch_size,
+        "stream_size": args.stream_size,
+    }
+    # Service logging (e.g. one fallback line per call for a mismatched artifact) would dominate the timings.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = asyncio.run(run_benchmark(paths, seed=args.seed, **workload))
+    print(f"{'path':<8}{'units/s':>11}{'calls/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for path, row in results.items():
+        print(
+            f"{path:<8}{row['units_per_s']:>11.1f}{row['calls_per_s']:>10.1f}"
+            f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}"
+        )
+
+    report = {"environment": environment(), "workload": workload, "results": results}
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2))
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --update-baseline to record one")
+        return
+
+    stored = json.loads(args.baseline.read_text())
+    if stored.get("workload") != workload:
+        print(f"WARNING: workload differs from the baseline's {stored.get('workload')}; comparison is approximate")
+    regressions = compare(results, stored["results"], args.tolerance)
+    if regressions:
+        print("\nPERFORMANCE REGRESSION against " + str(args.baseline), file=sys.stderr)
+        for line in regressions:
+            print(f"  - {line}", file=sys.stderr)
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
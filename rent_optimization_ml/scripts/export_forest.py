@@ -0,0 +1,81 @@
+"""
+Export an existing RandomForest artifact as a flattened array forest.
+
+Writes ``<artifact>.forest/<sha256 prefix>/`` next to the artifact for ``INFERENCE_ENGINE=array``.
+The export is verified bit-for-bit against sklearn on random rows drawn around
+the model's split thresholds (or on a CSV of real feature rows) before saving.
+
+Usage:
+    python scripts/export_forest.py [--model models/rent_predictor.joblib] [--check-csv rows.csv]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import warnings
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = Path(__file__).parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.services.forest_engine import ArrayForest, export_forest, forest_dir_for
+from app.services.model_loader import file_sha256
+
+
+def synthetic_rows(forest: ArrayForest, rows: int, seed: int = 7) -> np.ndarray:
+    """Rows that straddle the model's own thresholds, so every branch direction is exercised."""
+    rng = np.random.default_rng(seed)
+    X = np.zeros((rows, forest.n_features), dtype=np.float32)
+    for column in range(forest.n_features):
+        splits = forest.threshold[(forest.feature == column) & np.isfinite(forest.threshold)]
+        if len(splits):
+            low, high = float(splits.min()), float(splits.max())
+            pad = max(high - low, 1.0) * 0.1
+            X[:, column] = rng.uniform(low - pad, high + pad, size=rows)
+            # Exact threshold values hit the `<=` boundary case.
+            exact = rng.random(rows) < 0.1
+            X[exact, column] = rng.choice(splits, size=int(exact.sum()))
+    return X
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", type=Path, default=PROJECT_ROOT / "models" / "rent_predictor.joblib")
+    parser.add_argument("--check-csv", type=Path, help="feature rows (model column order) to verify on")
+    parser.add_argument("--check-rows", type=int, default=5000, help="synthetic rows when no CSV is given")
+    args = parser.parse_args()
+    # Artifacts fitted on DataFrames warn on every ndarray predict; the column order is the spec's.
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+    model = joblib.load(args.model)
+    if args.check_csv:
+        X_check = pd.read_csv(args.check_csv).to_numpy(dtype=np.float32)
+    else:
+        X_check = synthetic_rows(ArrayForest.from_sklearn(model), args.check_rows)
+
+    sha256 = file_sha256(args.model)
+    directory = forest_dir_for(args.model, sha256)
+    forest = export_forest(model, directory, X_check, artifact_sha256=sha256)
+    print(f"Exported {len(forest.roots)} trees / {len(forest.feature)} nodes to {directory.resolve()}")
+    print(f"Verified bit-for-bit on {len(X_check)} rows")
+
+    for batch in (1, 64, 1000):
+        rows = X_check[:batch]
+        started = time.perf_counter()
+        model.predict(rows)
+        sklearn_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        forest.predict(rows)
+        array_ms = (time.perf_counter() - started) * 1000
+        print(f"batch={batch:>5}  sklearn={sklearn_ms:8.2f} ms  array={array_ms:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+Incremental, partitioned store of training features.
+
+Keeps the training query's rows (see ``extract_training_data``) on disk in
+month partitions, ``month=<YYYY-MM>/part-<n>.npy``. Each part is a structured
+NumPy array of whole properties sorted by property id. ``manifest.json``
+indexes every property to the part and row range holding its latest rows, and
+records the watermark of the last refresh. A file per property would mean tens
+of thousands of tiny files; at 1M units writing and loading those was slower
+than a full extract.
+
+A refresh only re-extracts properties where something changed since the
+watermark:
+- the property row itself (``updatedAt``);
+- one of its leases, expenses or maintenance requests (``updatedAt``, which
+  Prisma also sets on insert, so new rows count too);
+- a new unit (unit ids above the last one seen; ``Unit`` has no ``updatedAt``);
+- an expense or request that aged out of the trailing 12 months;
+- another property in the same city (``properties_in_city_count``).
+
+Changed properties are written to a new part of the current month and
+re-pointed in the index; every other property keeps its cached rows, whatever
+month they were written in. Parts no property points at any more are deleted.
+Each part records when it was written, so ``written_since`` can tell which
+properties changed after a model was trained.
+Deleted units are only noticed by a full refresh (``--full``). A full refresh
+also runs on the first refresh of each year, because ``property_age`` moves,
+and once ``MAX_PARTS`` parts have piled up.
+
+Loading memory-maps each part and copies only the requested columns of the
+live row ranges; nothing is parsed, unlike a CSV or a fresh extract.
+
+Usage:
+    python scripts/feature_store.py refresh [--store data/feature_store] [--full] [--itersize 50000]
+    python scripts/feature_store.py info [--store data/feature_store]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = Path(__file__).parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from scripts.extract_training_data import (
+    DEFAULT_ITERSIZE,
+    TRAINING_COLUMNS,
+    TRAINING_ROWS_QUERY,
+    clean_database_url,
+    iter_training_chunks,
+)
+
+DEFAULT_STORE = PROJECT_ROOT / "data" / "feature_store"
+MANIFEST = "manifest.json"
+# Re-read this much before the stored watermark, for rows committed while the last refresh ran.
+WATERMARK_OVERLAP = timedelta(seconds=60)
+# Incremental refreshes each add a part; past this many the next refresh is a full one.
+MAX_PARTS = 64
+
+PARTITION_QUERY = f"""
+SELECT * FROM ({TRAINING_ROWS_QUERY}) q
+WHERE %(all)s OR q.property_id = ANY(%(property_ids)s)
+ORDER BY q.property_id, q.unit_id
+"""
+
+CHANGED_PROPERTIES_QUERY = """
+WITH changed AS (
+    SELECT p.id FROM "Property" p WHERE p."updatedAt" > %(since)s
+    UNION
+    SELECT u."propertyId" FROM "Unit" u WHERE u.id > %(after_unit_id)s
+    UNION
+    SELECT u."propertyId" FROM "Lease" l JOIN "Unit" u ON u.id = l."unitId" WHERE l."updatedAt" > %(since)s
+    UNION
+    SELECT e."propertyId" FROM "Expense" e
+    WHERE e."updatedAt" > %(since)s
+       OR (e.date >= %(since)s::date - INTERVAL '12 months' AND e.date < CURRENT_DATE - INTERVAL '12 months')
+    UNION
+    SELECT COALESCE(mr."propertyId", u."propertyId") FROM "MaintenanceRequest" mr
+    LEFT JOIN "Unit" u ON u.id = mr."unitId"
+    WHERE mr."updatedAt" > %(since)s
+       OR (mr."createdAt" >= %(since)s::date - INTERVAL '12 months' AND mr."createdAt" < CURRENT_DATE - INTERVAL '12 months')
+)
+SELECT id FROM changed WHERE id IS NOT NULL
+UNION
+-- Same-city properties share properties_in_city_count.
+SELECT peer.id
+FROM "Property" p
+JOIN "Property" peer ON peer.city = p.city AND peer.state = p.state
+WHERE p."updatedAt" > %(since)s
+"""
+
+
+def _structured(frame: pd.DataFrame) -> np.ndarray:
+    """One record array for a part; text columns become fixed-width unicode so they can be mapped too."""
+    fields = []
+    for column in frame.columns:
+        values = frame[column].to_numpy()
+        if values.dtype == object:
+            values = values.astype(str)
+        fields.append((column, values.dtype))
+    records = np.empty(len(frame), dtype=fields)
+    for column in frame.columns:
+        records[column] = frame[column].to_numpy()
+    return records
+
+
+def _ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Concatenated ``arange(start, start + count)`` for every pair, without a Python loop."""
+    ends = np.cumsum(counts)
+    return np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - (ends - counts), counts)
+
+
+class FeatureStore:
+    """Training rows in month parts under ``root``, plus the manifest indexing each property's rows."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        path = root / MANIFEST
+        self.manifest: Dict[str, Any] = (
+            json.loads(path.read_text()) if path.exists() else {"properties": {}, "parts": {}, "next_part": 0}
+        )
+
+    @property
+    def properties(self) -> Dict[str, Dict[str, Any]]:
+        return self.manifest["properties"]
+
+    @property
+    def parts(self) -> Dict[str, Dict[str, Any]]:
+        return self.manifest["parts"]
+
+    def __len__(self) -> int:
+        return sum(entry["rows"] for entry in self.properties.values())
+
+    # ---------------------------------------------------------------- loading
+
+    def written_since(self, when: datetime) -> Set[str]:
+        """Properties whose rows were (re-)extracted at or after ``when``, e.g. since a model was trained."""
+        fresh = {
+            part
+            for part, entry in self.parts.items()
+            if "written_at" in entry and datetime.fromisoformat(entry["written_at"]) >= when
+        }
+        return {pid for pid, entry in self.properties.items() if entry["part"] in fresh}
+
+    def columns(self, names: Sequence[str], properties: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+        """
+        Each of ``names`` for every live row, in property order.
+
+        ``properties`` limits the rows to those property ids. Parts are
+        memory-mapped one at a time and only the requested fields of their
+        live row ranges are copied into the output arrays.
+        """
+        wanted = self.properties if properties is None else [pid for pid in properties if pid in self.properties]
+        order = sorted(wanted, key=int)
+        entries = [self.properties[pid] for pid in order]
+        counts = np.array([entry["rows"] for entry in entries], dtype=np.int64)
+        destinations = np.cumsum(counts) - counts
+        by_part: Dict[str, List[int]] = {}
+        for position, entry in enumerate(entries):
+            by_part.setdefault(entry["part"], []).append(position)
+
+        mapped = {part: np.load(self.root / part, mmap_mode="r") for part in by_part}
+        out = {
+            name: np.empty(int(counts.sum()), dtype=np.result_type(*(records.dtype[name] for records in mapped.values())))
+            for name in names
+        } if mapped else {name: np.empty(0) for name in names}
+        for part, positions in by_part.items():
+            records = mapped.pop(part)
+            index = np.array(positions)
+            starts = np.array([entries[position]["start"] for position in positions], dtype=np.int64)
+            source = _ranges(starts, counts[index])
+            target = _ranges(destinations[index], counts[index])
+            for name in names:
+                out[name][target] = records[name][source]
+            del records
+        return out
+
+    def frame(self, columns: Optional[Sequence[str]] = None, properties: Optional[Iterable[str]] = None) -> pd.DataFrame:
+        """
+        The stored rows as a DataFrame of ``columns`` (default: the training columns).
+
+        ``properties`` limits the rows as in ``columns``. Text columns come
+        back as Python strings, like ``fetch_from_database``.
+        """
+        columns = list(columns or TRAINING_COLUMNS)
+        data = self.columns(columns, properties)
+        return pd.DataFrame(
+            {name: values.astype(object) if values.dtype.kind == "U" else values for name, values in data.items()},
+            columns=columns,
+        )
+
+    # --------------------------------------------------------------- writing
+
+    def apply(
+        self,
+        chunks: Iterable[pd.DataFrame],
+        month: str,
+        refreshed: Optional[Set[int]] = None,
+    ) -> Dict[str, int]:
+        """
+        Write ``chunks`` (rows with ``KEY_COLUMNS``, ordered by property) as parts of ``month``.
+
+        Each chunk becomes one part, less its last property, which is carried
+        into the next part so a property never spans two. ``refreshed`` names
+        the properties that were re-extracted; those that came back without
+        rows are dropped from the index. ``None`` means a full refresh: every
+        property not in ``chunks`` is dropped.
+        """
+        seen: Set[int] = set()
+        result = {"parts_written": 0, "rows_written": 0}
+        carry: Optional[pd.DataFrame] = None
+
+        def write(frame: pd.DataFrame) -> None:
+            ids = frame["property_id"].to_numpy()
+            starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+            counts = np.diff(np.r_[starts, len(ids)])
+            part = self._write_part(month, frame)
+            cities = frame["city"].to_numpy()[starts]
+            states = frame["state"].to_numpy()[starts]
+            for property_id, start, count, city, state in zip(ids[starts], starts, counts, cities, states):
+                self.properties[str(property_id)] = {
+                    "part": part,
+                    "start": int(start),
+                    "rows": int(count),
+                    "city": str(city),
+                    "state": str(state),
+                }
+                seen.add(int(property_id))
+            result["parts_written"] += 1
+            result["rows_written"] += len(frame)
+
+        for chunk in chunks:
+            if carry is not None:
+                chunk = pd.concat([carry, chunk], ignore_index=True)
+            ids = chunk["property_id"].to_numpy()
+            last = int(np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])[-1])
+            carry = chunk.iloc[last:]
+            if last:
+                write(chunk.iloc[:last].reset_index(drop=True))
+        if carry is not None and len(carry):
+            write(carry.reset_index(drop=True))
+
+        candidates = set(map(int, self.properties)) if refreshed is None else refreshed
+        removed = [pid for pid in candidates - seen if self.properties.pop(str(pid), None) is not None]
+        return {"properties_written": len(seen), **result, "properties_removed": len(removed)}
+
+    def _write_part(self, month: str, frame: pd.DataFrame) -> str:
+        part = f"month={month}/part-{self.manifest['next_part']:05d}.npy"
+        self.manifest["next_part"] += 1
+        target = self.root / part
+        target.parent.mkdir(parents=True, exist_ok=True)
+        staging = target.with_name(f".{target.name}.tmp-{os.getpid()}")
+        with open(staging, "wb") as handle:
+            np.save(handle, _structured(frame))
+        os.replace(staging, target)
+        self.parts[part] = {"month": month, "rows": len(frame), "written_at": datetime.now(timezone.utc).isoformat()}
+        return part
+
+    def save(self) -> int:
+        """Write the manifest, then delete parts it no longer references; returns how many were deleted."""
+        live = {entry["part"] for entry in self.properties.values()}
+        dead = [part for part in self.parts if part not in live]
+        for part in dead:
+            del self.parts[part]
+        self.root.mkdir(parents=True, exist_ok=True)
+        staging = self.root / f".{MANIFEST}.tmp-{os.getpid()}"
+        staging.write_text(json.dumps(self.manifest, sort_keys=True))
+        os.replace(staging, self.root / MANIFEST)
+        # Only now that no manifest points at them.
+        for part in dead:
+            (self.root / part).unlink(missing_ok=True)
+        return len(dead)
+
+    # ------------------------------------------------------------- refreshing
+
+    def refresh(self, conn: Any, full: bool = False, itersize: int = DEFAULT_ITERSIZE) -> Dict[str, Any]:
+        """
+        Bring the store up to date from ``conn`` and save the manifest.
+
+        Returns what was done: mode, properties re-extracted and reused, parts
+        written and deleted, rows written and seconds taken.
+        """
+        started = time.perf_counter()
+        with conn.cursor() as cur:
+            # Prisma's "updatedAt" is a timestamp without time zone holding UTC, so the watermark is naive UTC
+            # too; an aware value would be compared in the session's time zone.
+            cur.execute('SELECT now() AT TIME ZONE \'UTC\', COALESCE(MAX(id), 0) FROM "Unit"')
+            now, max_unit_id = cur.fetchone()
+        month = now.strftime("%Y-%m")
+        watermark = self.manifest.get("watermark")
+        full = full or watermark is None or self.manifest.get("year") != now.year or len(self.parts) >= MAX_PARTS
+
+        if full:
+            refreshed: Optional[Set[int]] = None
+            params = {"all": True, "property_ids": []}
+        else:
+            since = datetime.fromisoformat(watermark) - WATERMARK_OVERLAP
+            if since.tzinfo is not None:
+                # Manifests written before the watermark was naive UTC.
+                since = since.astimezone(timezone.utc).replace(tzinfo=None)
+            with conn.cursor() as cur:
+                cur.execute(
+                    CHANGED_PROPERTIES_QUERY,
+                    {"since": since, "after_unit_id": self.manifest.get("last_unit_id", 0)},
+                )
+                refreshed = {int(row[0]) for row in cur.fetchall()}
+            params = {"all": False, "property_ids": sorted(refreshed)}
+
+        previous_cities = {pid: (entry["city"], entry["state"]) for pid, entry in self.properties.items()}
+        result = {"properties_written": 0, "parts_written": 0, "rows_written": 0, "properties_removed": 0}
+        if refreshed is None or refreshed:
+            chunks = iter_training_chunks(conn, itersize, PARTITION_QUERY, params, with_keys=True)
+            result = self.apply(chunks, month, refreshed)
+
+        if refreshed:
+            # A property that moved city also changes the count of the city it left.
+            left = set()
+            for property_id in refreshed:
+                before = previous_cities.get(str(property_id))
+                entry = self.properties.get(str(property_id))
+                if before and (entry is None or (entry["city"], entry["state"]) != before):
+                    left.add(before)
+            peers = {int(pid) for pid, city in previous_cities.items() if city in left} - refreshed
+            if peers:
+                params = {"all": False, "property_ids": sorted(peers)}
+                chunks = iter_training_chunks(conn, itersize, PARTITION_QUERY, params, with_keys=True)
+                more = self.apply(chunks, month, peers)
+                refreshed |= peers
+                result = {key: result[key] + more[key] for key in result}
+
+        self.manifest.update(
+            {
+                "watermark": now.isoformat(),
+                "last_unit_id": int(max_unit_id),
+                "year": now.year,
+                "refreshed_at": datetime.now(timezone.utc).isoformat(),
+            }
+        )
+        deleted = self.save()
+        return {
+            "mode": "full" if refreshed is None else "incremental",
+            **result,
+            "properties_reused": len(self.properties) - result["properties_written"],
+            "parts_deleted": deleted,
+            "rows_total": len(self),
+            "seconds": round(time.perf_counter() - started, 2),
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("refresh", "info"))
+    parser.add_argument("--store", type=Path, default=DEFAULT_STORE)
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--full", action="store_true", help="re-extract every property")
+    parser.add_argument("--itersize", type=int, default=DEFAULT_ITERSIZE, help="rows per server-side fetch")
+    args = parser.parse_args()
+
+    store = FeatureStore(args.store)
+    if args.command == "info":
+        months: Dict[str, int] = {}
+        for entry in store.parts.values():
+            months[entry["month"]] = months.get(entry["month"], 0) + entry["rows"]
+        print(f"{len(store.properties)} properties, {len(store)} rows, watermark {store.manifest.get('watermark')}")
+        for month, rows in sorted(months.items()):
+            print(f"  {month}: {rows} rows written")
+        return
+
+    if not args.database_url:
+        parser.error("DATABASE_URL is not set (or pass --database-url)")
+    import psycopg2
+
+    conn = psycopg2.connect(clean_database_url(args.database_url))
+    try:
+        report = store.refresh(conn, full=args.full, itersize=args.itersize)
+    finally:
+        conn.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Cross-validated hyperparameter search for the rent model's random forest.
+
+Evaluates a grid (or a random sample) of ``RandomForestRegressor``
+configurations with K-fold cross-validation across a process pool. The
+feature matrix is written once to ``.npy`` files and every worker maps it
+read-only, so nothing but fold numbers and parameters is pickled per task;
+each fold copies only its own training rows.
+
+Unpromising configurations stop early by successive halving over folds:
+after each fold, only the best ``keep_fraction`` of the surviving
+configurations (by mean MAE so far) go on to the next one. The winner is the
+configuration with the lowest mean MAE over all folds.
+
+``train_model.py --search`` runs this on the training split and then fits the
+winner; run directly, it searches without training anything.
+
+Usage:
+    python scripts/train_model.py --search grid [--folds 5] [--workers 8]
+    python scripts/hyperparameter_search.py --search random --samples 24 [--rows 200000] [--search-report report.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import KFold
+
+SCRIPT_DIR = Path(__file__).parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.services.forest_engine import ArrayForest
+from app.services.inference_executor import limit_native_threads
+
+SEARCH_MODES = ("grid", "random")
+
+DEFAULT_GRID: Dict[str, List[Any]] = {
+    "n_estimators": [60, 120, 240],
+    "max_depth": [None, 16, 24],
+    "min_samples_leaf": [1, 3],
+    "max_features": [1.0, 0.5],
+}
+
+# Batch sizes the serving latency of the winner is measured at.
+LATENCY_BATCHES = (1, 64)
+
+
+@dataclass
+class SearchOptions:
+    """How to search; ``workers=None`` means one per CPU and ``grid=None`` the ``DEFAULT_GRID``."""
+
+    mode: str = "grid"
+    grid: Optional[Dict[str, List[Any]]] = None
+    samples: int = 20
+    folds: int = 5
+    workers: Optional[int] = None
+    keep_fraction: float = 0.5
+    seed: int = 42
+
+
+def grid_configurations(grid: Optional[Dict[str, List[Any]]] = None) -> List[Dict[str, Any]]:
+    grid = grid or DEFAULT_GRID
+    return [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+
+
+def random_configurations(samples: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """``samples`` distinct configurations drawn from ranges around the default grid."""
+    rng = np.random.default_rng(seed)
+    configs: List[Dict[str, Any]] = []
+    seen = set()
+    # Bounded: small ranges can run out of distinct configurations.
+    for _ in range(samples * 20):
+        if len(configs) == samples:
+            break
+        depth = int(rng.integers(6, 33))
+        config = {
+            "n_estimators": int(rng.integers(4, 31)) * 10,
+            "max_depth": None if depth > 30 else depth,
+            "min_samples_leaf": int(rng.integers(1, 9)),
+            "max_features": round(float(rng.uniform(0.3, 1.0)), 2),
+        }
+        key = tuple(config.values())
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+    return configs
+
+
+def configurations(options: SearchOptions) -> List[Dict[str, Any]]:
+    if options.mode == "grid":
+        return grid_configurations(options.grid)
+    if options.mode == "random":
+        return random_configurations(options.samples, options.seed)
+    raise ValueError(f"Unknown search mode {options.mode!r}; expected one of {SEARCH_MODES}")
+
+
+# Per-process state set by _init_search_worker.
+_shared: Dict[str, Any] = {}
+
+
+def _init_search_worker(x_path: str, y_path: str, folds: int, seed: int) -> None:
+    # One core per configuration; nested BLAS/OpenMP threads would only oversubscribe.
+    limit_native_threads(1)
+    X = np.load(x_path, mmap_mode="r")
+    _shared.update(
+        X=X,
+        y=np.load(y_path, mmap_mode="r"),
+        folds=list(KFold(n_splits=folds, shuffle=True, random_state=seed).split(np.empty(len(X)))),
+        seed=seed,
+    )
+
+
+def mape(y_true: np.ndarray, preds: np.ndarray) -> float:
+    """Mean absolute percentage error over the non-zero targets."""
+    nonzero = y_true != 0
+    if not nonzero.any():
+        return float("nan")
+    return float(np.mean(np.abs(y_true[nonzero] - preds[nonzero]) / y_true[nonzero]) * 100)
+
+
+def _evaluate_fold(config_index: int, params: Dict[str, Any], fold: int) -> Dict[str, Any]:
+    X, y = _shared["X"], _shared["y"]
+    train_idx, test_idx = _shared["folds"][fold]
+    started = time.perf_counter()
+    model = RandomForestRegressor(**params, random_state=_shared["seed"], n_jobs=1)
+    model.fit(X[train_idx], y[train_idx])
+    fitted = time.perf_counter()
+    y_test = np.asarray(y[test_idx])
+    preds = model.predict(X[test_idx])
+    finished = time.perf_counter()
+    return {
+        "config": config_index,
+        "fold": fold,
+        "mae": float(np.mean(np.abs(y_test - preds))),
+        "mape": mape(y_test, preds),
+        "fit_seconds": fitted - started,
+        "predict_seconds": finished - fitted,
+        "test_rows": int(len(test_idx)),
+    }
+
+
+def search(
+    X: np.ndarray,
+    y: np.ndarray,
+    configs: Sequence[Dict[str, Any]],
+    options: SearchOptions,
+) -> Dict[str, Any]:
+    """
+    Cross-validate ``configs`` on ``X``/``y`` and return the search report.
+
+    The report lists every configuration with its status (``complete`` or
+    ``stopped``), folds evaluated, mean MAE/MAPE over those folds and its
+    total fit and predict seconds, and names the best complete one.
+    """
+    if not configs:
+        raise ValueError("No configurations to search")
+    if options.folds < 2 or len(X) < options.folds:
+        raise ValueError(f"{options.folds}-fold cross-validation needs at least {max(options.folds, 2)} rows and folds")
+    workers = options.workers or os.cpu_count() or 1
+    records = [{"params": dict(params), "folds": []} for params in configs]
+    alive = list(range(len(configs)))
+    started = time.perf_counter()
+
+    with tempfile.TemporaryDirectory(prefix="rent-search-") as scratch:
+        x_path, y_path = os.path.join(scratch, "X.npy"), os.path.join(scratch, "y.npy")
+        np.save(x_path, np.ascontiguousarray(X, dtype=np.float32))
+        np.save(y_path, np.ascontiguousarray(y, dtype=np.float64))
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(configs)),
+            initializer=_init_search_worker,
+            initargs=(x_path, y_path, options.folds, options.seed),
+        ) as pool:
+            for fold in range(options.folds):
+                futures = [pool.submit(_evaluate_fold, index, configs[index], fold) for index in alive]
+                for future in futures:
+                    result = future.result()
+                    records[result.pop("config")]["folds"].append(result)
+                if fold + 1 < options.folds:
+                    # Successive halving: everyone alive has the same folds, so the means compare fairly.
+                    keep = max(1, math.ceil(len(alive) * options.keep_fraction))
+                    alive = sorted(alive, key=lambda index: _mean(records[index], "mae"))[:keep]
+
+    for record in records:
+        folds = record["folds"]
+        record.update(
+            status="complete" if len(folds) == options.folds else "stopped",
+            folds_evaluated=len(folds),
+            mae=_mean(record, "mae"),
+            mae_std=statistics.pstdev(fold["mae"] for fold in folds),
+            mape=_mean(record, "mape"),
+            fit_seconds=sum(fold["fit_seconds"] for fold in folds),
+            predict_seconds=sum(fold["predict_seconds"] for fold in folds),
+        )
+        record["seconds"] = record["fit_seconds"] + record["predict_seconds"]
+    best = min((r for r in records if r["status"] == "complete"), key=lambda r: r["mae"])
+    wall = time.perf_counter() - started
+    task_seconds = sum(record["seconds"] for record in records)
+    return {
+        "mode": options.mode,
+        "rows": int(len(X)),
+        "features": int(X.shape[1]),
+        "folds": options.folds,
+        "workers": min(workers, len(configs)),
+        "keep_fraction": options.keep_fraction,
+        "configurations": records,
+        "best_params": best["params"],
+        "best_mae": best["mae"],
+        "best_mape": best["mape"],
+        "wall_seconds": wall,
+        "task_seconds": task_seconds,
+        # Fold fits a full grid would have needed, against what halving ran.
+        "fold_fits": sum(record["folds_evaluated"] for record in records),
+        "fold_fits_without_stopping": len(records) * options.folds,
+    }
+
+
+def _mean(record: Dict[str, Any], key: str) -> float:
+    return float(np.mean([fold[key] for fold in record["folds"]]))
+
+
+def serving_latency(model: Any, X: np.ndarray, repeat: int = 50) -> Dict[str, Dict[str, float]]:
+    """
+    Median predict time of ``model`` in ms per batch size, for both inference engines.
+
+    Rows are taken from ``X``; this is the model call only, without request
+    parsing or feature extraction.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    forest = ArrayForest.from_sklearn(model)
+    engines = {"sklearn": model.predict, "array": forest.predict}
+    latency: Dict[str, Dict[str, float]] = {}
+    for name, predict in engines.items():
+        latency[name] = {}
+        for batch in LATENCY_BATCHES:
+            rows = X[np.arange(batch) % len(X)]
+            predict(rows)
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                predict(rows)
+                timings.append(time.perf_counter() - started)
+            latency[name][f"batch_{batch}_ms"] = statistics.median(timings) * 1000
+    return latency
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [f"{'#':>3}  {'status':<8}{'folds':>6}{'MAE':>10}{'MAPE %':>8}{'seconds':>9}  params"]
+    ranked = sorted(enumerate(report["configurations"]), key=lambda item: (-item[1]["folds_evaluated"], item[1]["mae"]))
+    for index, record in ranked:
+        lines.append(
+            f"{index:>3}  {record['status']:<8}{record['folds_evaluated']:>6}{record['mae']:>10.2f}"
+            f"{record['mape']:>8.2f}{record['seconds']:>9.2f}  {record['params']}"
+        )
+    lines.append(
+        f"best {report['best_params']}: MAE {report['best_mae']:.2f}, MAPE {report['best_mape']:.2f}% | "
+        f"{report['fold_fits']}/{report['fold_fits_without_stopping']} fold fits, "
+        f"{report['wall_seconds']:.1f}s wall for {report['task_seconds']:.1f}s of work on {report['workers']} workers"
+    )
+    latency = report.get("serving_latency_ms")
+    if latency:
+        lines.append(
+            "winner serving latency: "
+            + ", ".join(f"{engine} {' / '.join(f'{ms:.2f}' for ms in times.values())} ms" for engine, times in latency.items())
+            + f" (batch {' / '.join(str(batch) for batch in LATENCY_BATCHES)})"
+        )
+    return "\n".join(lines)
+
+
+def add_search_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--search", choices=SEARCH_MODES, help="cross-validated hyperparameter search mode")
+    parser.add_argument("--samples", type=int, default=20, help="configurations for --search random")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--workers", type=int, help="search processes (default: one per CPU)")
+    parser.add_argument("--keep-fraction", type=float, default=0.5, help="configurations kept after each fold")
+    parser.add_argument("--search-report", type=Path, help="write the search report as JSON")
+
+
+def options_from_args(args: argparse.Namespace) -> Optional[SearchOptions]:
+    if not args.search:
+        return None
+    return SearchOptions(
+        mode=args.search,
+        samples=args.samples,
+        folds=args.folds,
+        workers=args.workers,
+        keep_fraction=args.keep_fraction,
+    )
+
+
+def main() -> None:
+    from scripts.benchmark_features import synthetic_training_frame
+    from scripts.train_model import build_training_set, load_training_data
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_search_arguments(parser)
+    parser.add_argument("--rows", type=int, help="search on this many synthetic rows instead of the training data")
+    parser.add_argument("--feature-store", type=Path, help="search on the feature store's rows")
+    parser.set_defaults(search="grid")
+    args = parser.parse_args()
+
+    data = synthetic_training_frame(args.rows) if args.rows else load_training_data(args.feature_store)
+    training = build_training_set(data)
+    options = options_from_args(args)
+    report = search(
+        training.X.to_numpy(dtype=np.float32), training.y.to_numpy(dtype=np.float64), configurations(options), options
+    )
+    print(format_report(report))
+    if args.search_report:
+        args.search_report.write_text(json.dumps(report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+Warm-start incremental retraining of the deployed random forest.
+
+A full retrain rebuilds every tree on the whole history. This loads the
+deployed artifact instead and, through the forest's ``warm_start``, fits
+``add_trees`` more trees on the rows re-extracted since it was trained (the
+feature store's ``written_since`` the spec's ``trained_on``). The oldest trees
+are then retired, so the forest never grows past ``max_trees`` (default: its
+deployed size) and each refresh replaces its most out-of-date share.
+
+Features are computed with the deployed spec: the old trees split on its
+bucket edges, so those are kept, and category vocabularies only gain codes.
+A ``holdout_fraction`` of the new rows is held out. The candidate replaces the
+artifact only if its holdout MAE is within ``max_regression`` of the deployed
+model's on the same rows; otherwise the script exits with status 1.
+``--compare-full`` also rebuilds the forest from scratch, with the deployed
+parameters, on the history plus the new training rows. It then reports CPU
+time, holdout accuracy and predict throughput side by side; the rebuild is
+not saved.
+
+Only the random_forest backend can be extended; other backends need
+``train_model.py``.
+
+Usage:
+    python scripts/incremental_retrain.py --feature-store data/feature_store [--add-trees 20] [--max-trees 120]
+    python scripts/incremental_retrain.py --feature-store data/feature_store --compare-full --report incremental.json
+    python scripts/incremental_retrain.py --rows 200000 --new-fraction 0.05 --compare-full   # synthetic, nothing saved
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import json
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import train_test_split
+
+SCRIPT_DIR = Path(__file__).parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.services.feature_spec import load_spec_for
+from app.services.model_backends import DEFAULT_BACKEND, backend_of, get_backend
+from scripts.extract_training_data import validate_training_data
+from scripts.feature_store import FeatureStore
+from scripts.hyperparameter_search import mape
+from scripts.train_model import build_training_set, predict_ms_per_10k, refresh_feature_store, train
+
+# Fewest new rows worth extending the forest with (and holding some out).
+MIN_NEW_ROWS = 8
+
+
+@dataclass
+class IncrementalOptions:
+    """How to extend the forest; ``max_trees=None`` keeps the deployed tree count."""
+
+    add_trees: int = 20
+    max_trees: Optional[int] = None
+    holdout_fraction: float = 0.25
+    max_regression: float = 0.02
+    seed: int = 42
+
+
+def extend_forest(
+    model: RandomForestRegressor, X: Any, y: Any, add_trees: int, max_trees: int, random_state: Optional[int] = None
+) -> int:
+    """
+    Fit ``add_trees`` more trees of ``model`` on ``X``/``y`` in place, then
+    drop the oldest beyond ``max_trees``; returns how many were dropped.
+
+    Warm start seeds the new trees by their position in the forest, and
+    retiring trees keeps that position the same, so pass a fresh
+    ``random_state`` per refresh or every refresh repeats the same seeds.
+    """
+    if random_state is not None:
+        model.set_params(random_state=random_state)
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + add_trees, n_jobs=-1)
+    try:
+        model.fit(X, y)
+    finally:
+        model.set_params(warm_start=False, n_jobs=None)
+    retired = max(len(model.estimators_) - max_trees, 0)
+    # Trees are appended in fit order, so the oldest come first.
+    del model.estimators_[:retired]
+    model.set_params(n_estimators=len(model.estimators_))
+    return retired
+
+
+def _measure(model: Any, X_holdout: pd.DataFrame, y_holdout: np.ndarray) -> Dict[str, Any]:
+    preds = np.asarray(model.predict(X_holdout), dtype=np.float64)
+    return {
+        "trees": len(model.estimators_),
+        "mae": float(mean_absolute_error(y_holdout, preds)),
+        "mape": mape(y_holdout, preds),
+        "predict_ms_per_10k": predict_ms_per_10k(get_backend(DEFAULT_BACKEND), model, X_holdout.to_numpy(dtype=np.float32)),
+    }
+
+
+def retrain(
+    artifact_path: Path,
+    new_data: pd.DataFrame,
+    options: IncrementalOptions | None = None,
+    history: pd.DataFrame | None = None,
+    replace: bool = True,
+) -> Dict[str, Any]:
+    """
+    Extend the forest at ``artifact_path`` with trees fitted on ``new_data``.
+
+    ``history`` (the rest of the training rows) is only needed to compare
+    against a full rebuild. With ``replace`` a candidate that passes the
+    holdout check is published through the backend's ``export``: its array
+    forest goes to a new directory keyed by its sha256 and the joblib is
+    swapped in atomically, so workers still serving the deployed model never
+    see its files change.
+
+    Returns the ``deployed``, ``incremental`` and (with ``history``)
+    ``full_rebuild`` holdout MAE/MAPE, tree counts and timings, and whether
+    the candidate was ``accepted`` and ``replaced``.
+    """
+    options = options or IncrementalOptions()
+    # The next refresh picks up rows written after this one started.
+    started_at = datetime.now(timezone.utc)
+    spec = load_spec_for(artifact_path)
+    if spec is None:
+        raise ValueError(f"No feature spec next to {artifact_path}; train a full model first")
+    deployed = joblib.load(artifact_path)
+    if backend_of(deployed) != DEFAULT_BACKEND:
+        raise ValueError(f"Warm start extends {DEFAULT_BACKEND} models only, not {backend_of(deployed)}")
+    if options.add_trees < 1:
+        raise ValueError("add_trees must be at least 1")
+
+    combined = pd.concat([new_data] if history is None else [new_data, history], ignore_index=True)
+    training = build_training_set(combined, spec.encodings, spec.bucket_edges)
+    if training.feature_cols != spec.columns:
+        raise ValueError(
+            f"Feature columns changed from the deployed {spec.columns} to {training.feature_cols}; run a full retrain"
+        )
+    is_new = training.X.index < len(new_data)
+    if is_new.sum() < MIN_NEW_ROWS:
+        raise ValueError(f"Only {is_new.sum()} new rows; need at least {MIN_NEW_ROWS}")
+    X_fit, X_holdout, y_fit, y_holdout = train_test_split(
+        training.X[is_new], training.y[is_new], test_size=options.holdout_fraction, random_state=options.seed
+    )
+    y_holdout = y_holdout.to_numpy(dtype=np.float64)
+
+    report: Dict[str, Any] = {"new_rows": int(is_new.sum()), "holdout_rows": len(X_holdout)}
+    # Measured before the forest is extended in place.
+    report["deployed"] = _measure(deployed, X_holdout, y_holdout)
+    full_params = {k: v for k, v in deployed.get_params().items() if k not in ("n_jobs", "warm_start")}
+    max_trees = options.max_trees or len(deployed.estimators_)
+
+    tree_seed = int(started_at.timestamp() * 1_000_000) % 2**32
+    started, cpu_started = time.perf_counter(), time.process_time()
+    retired = extend_forest(deployed, X_fit, y_fit, options.add_trees, max_trees, random_state=tree_seed)
+    report["incremental"] = {
+        "fit_seconds": time.perf_counter() - started,
+        "fit_cpu_seconds": time.process_time() - cpu_started,
+        "added_trees": options.add_trees,
+        "retired_trees": retired,
+        **_measure(deployed, X_holdout, y_holdout),
+    }
+
+    if history is not None:
+        rebuild_X = pd.concat([training.X[~is_new], X_fit])
+        rebuild_y = pd.concat([training.y[~is_new], y_fit])
+        full_params["n_estimators"] = max_trees
+        started, cpu_started = time.perf_counter(), time.process_time()
+        rebuilt = get_backend(DEFAULT_BACKEND).fit(rebuild_X, rebuild_y, full_params, n_jobs=-1)
+        report["full_rebuild"] = {
+            "fit_seconds": time.perf_counter() - started,
+            "fit_cpu_seconds": time.process_time() - cpu_started,
+            "training_rows": len(rebuild_X),
+            **_measure(rebuilt, X_holdout, y_holdout),
+        }
+        report["cpu_fraction_of_full"] = report["incremental"]["fit_cpu_seconds"] / report["full_rebuild"]["fit_cpu_seconds"]
+        del rebuilt
+
+    report["accepted"] = report["incremental"]["mae"] <= report["deployed"]["mae"] * (1 + options.max_regression)
+    report["replaced"] = False
+    if report["accepted"] and replace:
+        refreshed = dataclasses.replace(
+            spec,
+            encodings={name: training.fitted.encodings[name] for name in spec.encodings},
+            metadata={
+                **spec.metadata,
+                "trained_on": started_at.isoformat(),
+                # Rows seen by any tree since the last full train; the trees themselves cover fewer.
+                "training_rows": int(spec.metadata.get("training_rows", 0)) + len(X_fit),
+                "new_rows": len(X_fit),
+                "warm_start": {
+                    "base_trained_on": spec.metadata.get("trained_on"),
+                    "added_trees": options.add_trees,
+                    "retired_trees": retired,
+                    "random_state": tree_seed,
+                },
+            },
+        )
+        get_backend(DEFAULT_BACKEND).export(deployed, artifact_path, X_fit, refreshed)
+        report["replaced"] = True
+    return report
+
+
+def format_incremental(report: Dict[str, Any]) -> str:
+    lines = [f"{'model':<14}{'trees':>7}{'fit s':>9}{'cpu s':>9}{'ms/10k':>9}{'MAE':>9}{'MAPE %':>8}"]
+    for name in ("deployed", "incremental", "full_rebuild"):
+        row = report.get(name)
+        if row is None:
+            continue
+        fit = f"{row['fit_seconds']:>9.2f}{row['fit_cpu_seconds']:>9.2f}" if "fit_seconds" in row else " " * 18
+        lines.append(
+            f"{name:<14}{row['trees']:>7}{fit}{row['predict_ms_per_10k']:>9.1f}{row['mae']:>9.2f}{row['mape']:>8.2f}"
+        )
+    if "cpu_fraction_of_full" in report:
+        lines.append(f"incremental CPU time: {report['cpu_fraction_of_full']:.1%} of a full rebuild")
+    lines.append(
+        f"{report['new_rows']} new rows, {report['holdout_rows']} held out; "
+        f"{report['incremental']['added_trees']} trees added, {report['incremental']['retired_trees']} retired; "
+        + ("replaced" if report["replaced"] else "accepted" if report["accepted"] else "rejected")
+    )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    from scripts.benchmark_features import synthetic_training_frame
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", type=Path, help="deployed artifact (default: models/rent_predictor.joblib)")
+    parser.add_argument("--feature-store", type=Path, help="new rows are those re-extracted since the model was trained")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="count rows written since this time as new")
+    parser.add_argument("--add-trees", type=int, default=20)
+    parser.add_argument("--max-trees", type=int, help="trees kept after retiring the oldest (default: deployed count)")
+    parser.add_argument("--holdout-fraction", type=float, default=0.25)
+    parser.add_argument("--max-regression", type=float, default=0.02, help="allowed relative holdout MAE increase")
+    parser.add_argument("--compare-full", action="store_true", help="also time and score a full rebuild")
+    parser.add_argument("--dry-run", action="store_true", help="validate and report without replacing the artifact")
+    parser.add_argument("--report", type=Path, help="write the report as JSON")
+    parser.add_argument("--rows", type=int, help="benchmark on this many synthetic rows in a scratch directory")
+    parser.add_argument("--new-fraction", type=float, default=0.05, help="share of --rows that is new")
+    args = parser.parse_args()
+    options = IncrementalOptions(
+        add_trees=args.add_trees,
+        max_trees=args.max_trees,
+        holdout_fraction=args.holdout_fraction,
+        max_regression=args.max_regression,
+    )
+
+    if args.rows:
+        data = synthetic_training_frame(args.rows)
+        new_rows = int(args.rows * args.new_fraction)
+        history, new_data = data.iloc[new_rows:], data.iloc[:new_rows]
+        with tempfile.TemporaryDirectory() as scratch:
+            artifact = Path(scratch) / "rent_predictor.joblib"
+            train(artifact, history)
+            report = retrain(artifact, new_data, options, history if args.compare_full else None)
+    else:
+        if args.feature_store is None:
+            parser.error("--feature-store or --rows is required")
+        artifact = args.output or PROJECT_ROOT / "models" / "rent_predictor.joblib"
+        spec = load_spec_for(artifact)
+        if spec is None:
+            parser.error(f"no feature spec next to {artifact}; train a full model first")
+        store = FeatureStore(args.feature_store)
+        refresh_feature_store(store)
+        since = args.since or datetime.fromisoformat(spec.metadata["trained_on"])
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        changed = store.written_since(since)
+        if not changed:
+            print(f"No properties re-extracted since {since.isoformat()}; nothing to retrain.")
+            return
+        print(f"{len(changed)} properties re-extracted since {since.isoformat()}")
+        new_data = validate_training_data(store.frame(properties=changed))
+        history = None
+        if args.compare_full:
+            history = validate_training_data(store.frame(properties=set(store.properties) - changed), report=False)
+        report = retrain(artifact, new_data, options, history, replace=not args.dry_run)
+
+    print(format_incremental(report))
+    if args.report:
+        args.report.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Report written to {args.report.resolve()}")
+    if not report["accepted"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Measure time-to-ready and resident memory of the production launch modes.
+
+Starts ``gunicorn -c gunicorn_conf.py main:app`` once per mode, polls
+``/ready`` until every worker has answered ready, then reads each worker's
+``/proc/<pid>/smaps_rollup``. PSS splits shared pages between the workers
+mapping them, so the PSS total is the real footprint; RSS counts a shared
+model once per worker.
+
+Usage:
+    python scripts/measure_workers.py [--workers 4] [--model models/rent_predictor.joblib] [--json out.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+SCRIPT_DIR = Path(__file__).parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.services.process_memory import memory_usage
+
+MODES = {
+    "per-worker load": {"GUNICORN_PRELOAD": "false"},
+    "preload": {"GUNICORN_PRELOAD": "true"},
+    "preload + array mmap": {"GUNICORN_PRELOAD": "true", "INFERENCE_ENGINE": "array", "MODEL_MMAP": "true"},
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def worker_pids(master_pid: int) -> List[int]:
+    children = Path(f"/proc/{master_pid}/task/{master_pid}/children")
+    return [int(pid) for pid in children.read_text().split()]
+
+
+def measure(mode: str, overrides: Dict[str, str], workers: int, model: Path, timeout: float) -> Dict[str, object]:
+    port = free_port()
+    env = {
+        **os.environ,
+        **overrides,
+        "API_HOST": "127.0.0.1",
+        "API_PORT": str(port),
+        "WEB_CONCURRENCY": str(workers),
+        "MODEL_PATH": str(model.resolve()),
+    }
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn_conf.py", "main:app"],
+        cwd=PROJECT_ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        ready: Dict[int, dict] = {}
+        deadline = started + timeout
+        while len(ready) < workers:
+            if time.perf_counter() > deadline or server.poll() is not None:
+                raise RuntimeError(f"{mode}: only {len(ready)}/{workers} workers ready before timeout")
+            try:
+                # A fresh connection per probe so the kernel spreads them across workers.
+                response = httpx.get(f"http://127.0.0.1:{port}/ready", timeout=2.0)
+                body = response.json()
+                if response.status_code == 200 and body["pid"] not in ready:
+                    ready[body["pid"]] = body
+            except (httpx.HTTPError, ValueError):
+                time.sleep(0.05)
+        time_to_ready = time.perf_counter() - started
+
+        pids = worker_pids(server.pid)
+        per_worker = [memory_usage(pid) for pid in pids]
+        master = memory_usage(server.pid)
+        return {
+            "mode": mode,
+            "workers": len(pids),
+            "time_to_ready_s": round(time_to_ready, 3),
+            "worker_startup_ms_max": max(body["startup_ms"] or 0.0 for body in ready.values()),
+            "model_load_ms_max": max(body["model_load_ms"] or 0.0 for body in ready.values()),
+            "worker_rss_mb_mean": sum(m.get("rss_mb", 0.0) for m in per_worker) / len(per_worker),
+            "worker_pss_mb_mean": sum(m.get("pss_mb", 0.0) for m in per_worker) / len(per_worker),
+            "total_pss_mb": master.get("pss_mb", 0.0) + sum(m.get("pss_mb", 0.0) for m in per_worker),
+        }
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--model", type=Path, default=PROJECT_ROOT / "models" / "rent_predictor.joblib")
+    parser.add_argument("--mode", choices=sorted(MODES), action="append", help="modes to run (default: all)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--json", type=Path, help="also write the results here")
+    args = parser.parse_args()
+
+    if not Path("/proc/self/smaps_rollup").exists():
+        sys.exit("measure_workers.py reads /proc/<pid>/smaps_rollup and needs Linux")
+
+    results = []
+    for mode in args.mode or list(MODES):
+        if "array" in mode and not args.model.with_name(f"{args.model.stem}.forest").exists():
+            print(f"Skipping '{mode}': no array forest export (run scripts/export_forest.py)")
+            continue
+        result = measure(mode, MODES[mode], args.workers, args.model, args.timeout)
+        results.append(result)
+        print(
+            f"{mode:<22} ready in {result['time_to_ready_s']:6.2f}s  "
+            f"worker RSS {result['worker_rss_mb_mean']:7.1f} MiB  "
+            f"worker PSS {result['worker_pss_mb_mean']:7.1f} MiB  "
+            f"total PSS {result['total_pss_mb']:7.1f} MiB  "
+            f"model load {result['model_load_ms_max']:8.1f} ms"
+        )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Nightly market comps prefetch.
+
+Enumerates every distinct (zip code, bedrooms, bathrooms band) in the
+portfolio from Postgres, fetches comps for each group from the configured
+providers (``MARKET_DATA_PROVIDERS``) with bounded concurrency, and writes a
+columnar snapshot (one ``.npy`` per column) that ``MarketDataService``
+memory-maps at start-up. Units in a snapshotted group then get comps without a
+request-time provider call.
+
+Each group is queried as one synthetic unit at the group's median size and
+mean coordinates. Groups that no provider answered are left out, so those
+units still go to the providers live. The job prints its throughput and the
+provider retry counts.
+
+Usage:
+    python scripts/prefetch_comps.py [--output data/comps_snapshot] [--concurrency 16] [--max-comps 25]
+    python scripts/prefetch_comps.py --limit 100   # smoke run on the first 100 groups
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+SCRIPT_DIR = Path(__file__).parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.config import Settings, get_settings
+from app.models.schemas import PredictionRequest
+from app.services.comps_index import psycopg2_dsn
+from app.services.comps_snapshot import CompsSnapshot, snapshot_key
+from app.services.market_data_service import MarketDataService
+from app.services.market_providers import MarketComps, ProviderPool
+
+PORTFOLIO_GROUPS_QUERY = """
+SELECT
+    p."zipCode" AS zip_code,
+    u.bedrooms,
+    ROUND(COALESCE(u.bathrooms, 1) * 2) / 2 AS bathrooms,
+    COUNT(*) AS units,
+    PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY u."squareFeet") AS square_feet,
+    AVG(p.latitude) AS latitude,
+    AVG(p.longitude) AS longitude,
+    MIN(p.city) AS city,
+    MIN(p.state) AS state
+FROM "Unit" u
+JOIN "Property" p ON p.id = u."propertyId"
+WHERE p."zipCode" IS NOT NULL AND u.bedrooms IS NOT NULL
+GROUP BY 1, 2, 3
+ORDER BY 1, 2, 3
+"""
+
+
+def load_groups(database_url: str) -> List[Dict[str, Any]]:
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+
+    conn = psycopg2.connect(psycopg2_dsn(database_url))
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(PORTFOLIO_GROUPS_QUERY)
+            return [dict(row) for row in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+def group_request(group: Dict[str, Any]) -> PredictionRequest:
+    """A representative unit for one group: the group's median size at its mean location."""
+    return PredictionRequest(
+        unit_id=f"prefetch:{snapshot_key(group['zip_code'], group['bedrooms'], group['bathrooms'])}",
+        bedrooms=int(group["bedrooms"]),
+        bathrooms=float(group["bathrooms"]),
+        square_feet=int(group.get("square_feet") or 0),
+        address="",
+        city=group.get("city") or "",
+        state=group.get("state") or "",
+        zip_code=str(group["zip_code"]),
+        current_rent=0,
+        latitude=group.get("latitude"),
+        longitude=group.get("longitude"),
+    )
+
+
+def prefetch_settings(settings: Settings, max_comps: int) -> Settings:
+    # Offline: no latency budget, no hedging, no cache, snapshot or local fallbacks, just the providers.
+    return settings.model_copy(
+        update={
+            "use_market_data": True,
+            "market_data_max_comps": max_comps,
+            "market_data_deadline_ms": 0,
+            "market_data_min_comps": 0,
+            "market_data_hedge": False,
+            "enable_comps_cache": False,
+            "enable_local_comps_index": False,
+            "comps_snapshot_path": None,
+        }
+    )
+
+
+async def prefetch(
+    groups: Sequence[Dict[str, Any]], service: MarketDataService, concurrency: int
+) -> Tuple[List[Tuple[str, MarketComps]], Dict[str, float]]:
+    """Fetch every group with at most ``concurrency`` in flight; returns the answered entries and a report."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    entries: List[Tuple[str, MarketComps]] = []
+    failed = 0
+
+    async def fetch(group: Dict[str, Any]) -> None:
+        nonlocal failed
+        request = group_request(group)
+        async with semaphore:
+            result = await service.fetch_market_comps(request)
+        if result.answered:
+            entries.append((snapshot_key(request.zip_code, request.bedrooms, request.bathrooms), result))
+        else:
+            failed += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(fetch(group) for group in groups))
+    elapsed = time.perf_counter() - started
+    comps = sum(len(result.comps) for _, result in entries)
+    report = {
+        "groups": len(groups),
+        "answered": len(entries),
+        "failed": failed,
+        "comps": comps,
+        "seconds": round(elapsed, 3),
+        "groups_per_s": round(len(groups) / elapsed, 2) if elapsed else 0.0,
+        "comps_per_s": round(comps / elapsed, 2) if elapsed else 0.0,
+    }
+    return entries, report
+
+
+def main() -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.database_url or os.getenv("DATABASE_URL"))
+    parser.add_argument("--output", type=Path, default=settings.comps_snapshot_path or Path("data/comps_snapshot"))
+    parser.add_argument("--concurrency", type=int, default=16, help="groups in flight at once")
+    parser.add_argument("--max-comps", type=int, default=25, help="comps kept per group for the ranker")
+    parser.add_argument("--limit", type=int, help="only the first N groups")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("DATABASE_URL is not set (or pass --database-url)")
+    service_settings = prefetch_settings(settings, args.max_comps)
+    pool = ProviderPool.from_settings(service_settings)
+    if pool is None:
+        parser.error("MARKET_DATA_PROVIDERS is empty; nothing to prefetch from")
+
+    started = time.perf_counter()
+    groups = load_groups(args.database_url)
+    if args.limit:
+        groups = groups[: args.limit]
+    print(f"{len(groups)} (zip, bedrooms, bathrooms band) groups in {time.perf_counter() - started:.1f}s")
+
+    service = MarketDataService(service_settings, providers=pool)
+
+    async def run() -> Tuple[List[Tuple[str, MarketComps]], Dict[str, float]]:
+        try:
+            return await prefetch(groups, service, args.concurrency)
+        finally:
+            await service.close()
+
+    entries, report = asyncio.run(run())
+    meta = CompsSnapshot.write(args.output, entries, {"providers": settings.market_data_providers, "report": report})
+
+    print(
+        f"Fetched {report['answered']}/{report['groups']} groups ({report['failed']} failed), "
+        f"{report['comps']} comps in {report['seconds']:.1f}s: "
+        f"{report['groups_per_s']:.1f} groups/s, {report['comps_per_s']:.1f} comps/s"
+    )
+    provider_stats = pool.stats()
+    for provider in pool.providers:
+        name = provider.name
+        print(
+            f"  {name}: {provider_stats[f'{name}_attempts_total']:.0f} attempts, "
+            f"{provider_stats[f'{name}_retries_total']:.0f} retries, "
+            f"{provider_stats[f'{name}_failures_total']:.0f} failures, "
+            f"{provider_stats[f'{name}_rate_limited_waits_total']:.0f} rate-limit waits, "
+            f"p95 {provider_stats[f'{name}_p95_ms']:.0f} ms"
+        )
+    print(f"Snapshot of {meta['groups']} groups / {meta['comps']} comps written to {args.output.resolve()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,34 @@
 """
 Lightweight training script for the rent optimization model.
 
-Uses scikit-learn so the project remains dependency-light. Swap in
-XGBoost if desired; keep the interface consistent for the loader.
+Uses scikit-learn so the project remains dependency-light. ``--backend``
+picks the estimator (random forest, sklearn histogram gradient boosting or
+XGBoost ``hist``, see ``app/services/model_backends.py``), and
+``--compare-backends`` fits them side by side on the same split first.
+
+Usage:
+    python scripts/train_model.py                                   # sample data
+    python scripts/train_model.py --feature-store data/feature_store  # incremental extract, then train
+    python scripts/train_model.py --search grid --folds 5 --workers 8 --search-report search.json
+    python scripts/train_model.py --compare-backends --backend hist_gradient_boosting
+    python scripts/train_model.py --profile data/profiles --flame-graph    # per-stage time and memory report
 """
 
 from __future__ import annotations
 
+import argparse
+import json
+import os
+import statistics
 import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any, Dict, List, Mapping, Sequence
 
-import joblib
+import numpy as np
 import pandas as pd
-from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error
 
@@ -21,32 +37,139 @@ SCRIPT_DIR = Path(__file__).parent
 PROJECT_ROOT = SCRIPT_DIR.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 
-from scripts.extract_training_data import fetch_sample_training_data
-from scripts.prepare_features import add_basic_features
+from app.services.feature_registry import FEATURES, FittedFeatures
+from app.services.feature_spec import FeatureSpec, load_spec_for, spec_path_for
+from app.services.model_backends import BACKENDS, DEFAULT_BACKEND, ModelBackend, get_backend
+from scripts.extract_training_data import clean_database_url, fetch_sample_training_data, validate_training_data
+from scripts.feature_store import FeatureStore
+from scripts.hyperparameter_search import (
+    SearchOptions,
+    add_search_arguments,
+    configurations,
+    format_report,
+    mape,
+    options_from_args,
+    search as run_search,
+    serving_latency,
+)
+from scripts.prepare_features import engineer_features
+from scripts.training_profiler import TrainingProfiler, format_profile
+
+# Rows per throughput measurement in the backend comparison.
+COMPARISON_ROWS = 10_000
 
 
-def train(output_path: Path | None = None) -> None:
+def build_feature_spec(
+    data: pd.DataFrame,
+    feature_cols: List[str],
+    fill_values: pd.Series,
+    fitted: FittedFeatures | None = None,
+    backend: str = DEFAULT_BACKEND,
+) -> FeatureSpec:
     """
-    Train the rent prediction model.
-    
-    Args:
-        output_path: Optional path to save the model. Defaults to models/rent_predictor.joblib
-                    relative to the project root.
+    Capture everything serving needs to rebuild ``feature_cols`` from a request.
+
+    Records the column order, the median fill values, the categorical
+    vocabularies and bucket edges of the registry features (``fitted``, or
+    fitted on ``data`` when not given), and the model backend.
     """
-    if output_path is None:
-        output_path = PROJECT_ROOT / "models" / "rent_predictor.joblib"
-    
-    # Load and prepare data
-    data = fetch_sample_training_data()
-    
-    if data.empty:
-        raise ValueError("No training data available. Check data extraction.")
-    
-    if len(data) < 10:
-        print(f"Warning: Only {len(data)} samples available. Model may not perform well.")
-        print("Consider adding more training data for better results.")
-    
-    data = add_basic_features(data)
+    if fitted is None:
+        _, fitted = engineer_features(data)
+    encodings = {name: codes for name, codes in fitted.encodings.items() if name in feature_cols}
+    bucket_edges = {name: edges for name, edges in fitted.bucket_edges.items() if name in feature_cols}
+    sources = {name: FEATURES[name].inputs[0] for name in [*encodings, *bucket_edges]}
+
+    return FeatureSpec(
+        columns=list(feature_cols),
+        dtype="float32",
+        fill_values={column: float(fill_values.get(column, 0.0)) for column in feature_cols},
+        encodings=encodings,
+        bucket_edges=bucket_edges,
+        sources=sources,
+        metadata={
+            "trained_on": datetime.now(timezone.utc).isoformat(),
+            "training_rows": int(len(data)),
+            "backend": backend,
+        },
+    )
+
+
+def refresh_feature_store(store: FeatureStore, full_refresh: bool = False) -> bool:
+    """Refresh ``store`` from DATABASE_URL; returns False, doing nothing, when it is not set."""
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        return False
+    import psycopg2
+
+    conn = psycopg2.connect(clean_database_url(database_url))
+    try:
+        report = store.refresh(conn, full=full_refresh)
+    finally:
+        conn.close()
+    print(
+        f"Feature store {report['mode']} refresh: {report['properties_written']} properties re-extracted, "
+        f"{report['properties_reused']} reused in {report['seconds']:.1f}s"
+    )
+    return True
+
+
+def load_training_data(
+    feature_store: Path | None = None,
+    full_refresh: bool = False,
+    profiler: TrainingProfiler | None = None,
+) -> pd.DataFrame:
+    """
+    Training rows from the feature store, refreshed first when DATABASE_URL is set.
+
+    Without a store this is the sample data (validated as part of ``extract``).
+    """
+    profiler = profiler or TrainingProfiler(enabled=False)
+    with profiler.stage("extract") as stage:
+        frame = None
+        if feature_store is not None:
+            store = FeatureStore(feature_store)
+            if refresh_feature_store(store, full_refresh) or store.properties:
+                frame = store.frame()
+            else:
+                print("Warning: feature store is empty and DATABASE_URL is not set. Using sample data.")
+        if frame is None:
+            data = fetch_sample_training_data()
+            stage.record(data)
+            return data
+        stage.record(frame)
+    with profiler.stage("validate") as stage:
+        data = validate_training_data(frame)
+        stage.record(data)
+    return data
+
+
+@dataclass
+class TrainingSet:
+    """Rows with engineered features, and the model matrix taken from them."""
+
+    data: pd.DataFrame
+    X: pd.DataFrame
+    y: pd.Series
+    feature_cols: List[str]
+    fill_values: pd.Series
+    fitted: FittedFeatures
+
+
+def build_training_set(
+    data: pd.DataFrame,
+    encodings: Mapping[str, Mapping[str, int]] | None = None,
+    bucket_edges: Mapping[str, Sequence[float]] | None = None,
+) -> TrainingSet:
+    """
+    Engineer features on ``data`` and select the model columns.
+
+    ``encodings`` are the deployed model's vocabularies, so category codes stay
+    stable; ``bucket_edges``, when given, are kept rather than refitted.
+    Missing feature values are filled with the median and rows without a
+    target dropped.
+    """
+    features, fitted = engineer_features(data, encodings, bucket_edges)
+    data = pd.concat([data.drop(columns=features.columns, errors="ignore"), features], axis=1)
 
     # Define features (excluding rent_per_sqft if it uses target variable)
     # Note: rent_per_sqft should use current_rent, not achieved_rent, to avoid data leakage
@@ -121,9 +244,10 @@ def train(output_path: Path | None = None) -> None:
     y = data["achieved_rent"]
     
     # Check for missing values
+    fill_values = X.median(numeric_only=True)
     if X.isnull().sum().sum() > 0:
         print("Warning: Missing values detected in features. Filling with median.")
-        X = X.fillna(X.median())
+        X = X.fillna(fill_values)
     
     if y.isnull().sum() > 0:
         print("Warning: Missing values detected in target. Dropping rows.")
@@ -131,25 +255,168 @@ def train(output_path: Path | None = None) -> None:
         X = X[mask]
         y = y[mask]
     
+    return TrainingSet(data, X, y, feature_cols, fill_values, fitted)
+
+
+def predict_ms_per_10k(backend: ModelBackend, model: Any, X: np.ndarray) -> float:
+    """Median of three predict calls on ``COMPARISON_ROWS`` rows cycled from ``X``, in milliseconds."""
+    rows = X[np.arange(COMPARISON_ROWS) % len(X)]
+    timings = []
+    for _ in range(3):
+        started = time.perf_counter()
+        backend.predict(model, rows)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def compare_backends(
+    names: Sequence[str],
+    X_train: pd.DataFrame,
+    y_train: pd.Series,
+    X_test: pd.DataFrame,
+    y_test: pd.Series,
+) -> List[Dict[str, Any]]:
+    """
+    Fit each backend in ``names`` with its default parameters and measure it on the holdout.
+
+    One row per backend: fit seconds, predict milliseconds per 10k rows (median
+    of three, float32 input as served), joblib artifact bytes, MAE and MAPE.
+    Backends whose library is missing get an ``error`` instead.
+    """
+    X_fit = X_train.to_numpy(dtype=np.float32)
+    X_eval = X_test.to_numpy(dtype=np.float32)
+    y_eval = y_test.to_numpy(dtype=np.float64)
+    rows = []
+    for name in names:
+        backend = get_backend(name)
+        if not backend.available():
+            rows.append({"backend": name, "error": f"{name} is not available (library not installed)"})
+            continue
+        started = time.perf_counter()
+        model = backend.fit(X_fit, y_train.to_numpy(dtype=np.float64), n_jobs=-1)
+        fit_seconds = time.perf_counter() - started
+        preds = backend.predict(model, X_eval)
+        rows.append(
+            {
+                "backend": name,
+                "params": backend.default_params(len(X_fit)),
+                "fit_seconds": fit_seconds,
+                "predict_ms_per_10k": predict_ms_per_10k(backend, model, X_eval),
+                "artifact_bytes": backend.artifact_bytes(model),
+                "mae": float(mean_absolute_error(y_eval, preds)),
+                "mape": mape(y_eval, preds),
+            }
+        )
+    return rows
+
+
+def format_comparison(rows: Sequence[Dict[str, Any]]) -> str:
+    lines = [f"{'backend':<24}{'fit s':>8}{'ms/10k':>9}{'artifact':>11}{'MAE':>9}{'MAPE %':>8}"]
+    for row in rows:
+        if "error" in row:
+            lines.append(f"{row['backend']:<24}  {row['error']}")
+            continue
+        lines.append(
+            f"{row['backend']:<24}{row['fit_seconds']:>8.2f}{row['predict_ms_per_10k']:>9.1f}"
+            f"{row['artifact_bytes'] / 2**20:>9.1f}MB{row['mae']:>9.2f}{row['mape']:>8.2f}"
+        )
+    return "\n".join(lines)
+
+
+def train(
+    output_path: Path | None = None,
+    data: pd.DataFrame | None = None,
+    search: SearchOptions | None = None,
+    backend: str = DEFAULT_BACKEND,
+    compare: Sequence[str] = (),
+    profiler: TrainingProfiler | None = None,
+) -> Dict[str, Any]:
+    """
+    Train the rent prediction model.
+    
+    Args:
+        output_path: Optional path to save the model. Defaults to models/rent_predictor.joblib
+                    relative to the project root.
+        data: Training rows; defaults to the sample data.
+        search: Cross-validate candidate hyperparameters on the training split
+                first and train the best configuration.
+        backend: Model backend to train (see ``app/services/model_backends.py``).
+        compare: Backends to fit and compare on the same split first.
+        profiler: Records each stage's time and memory (see
+                  ``scripts/training_profiler.py``).
+
+    Returns:
+        The backend, parameters and holdout MAE/MAPE of the saved model, plus
+        the ``search`` report (see ``scripts/hyperparameter_search.py``) and the
+        backend ``comparison`` when requested.
+    """
+    if output_path is None:
+        output_path = PROJECT_ROOT / "models" / "rent_predictor.joblib"
+    
+    profiler = profiler or TrainingProfiler(enabled=False)
+
+    # Load and prepare data
+    if data is None:
+        data = load_training_data(profiler=profiler)
+    
+    if data.empty:
+        raise ValueError("No training data available. Check data extraction.")
+    
+    if len(data) < 10:
+        print(f"Warning: Only {len(data)} samples available. Model may not perform well.")
+        print("Consider adding more training data for better results.")
+    
+    # Keep the deployed model's category codes; new values get new codes.
+    previous = load_spec_for(output_path)
+    with profiler.stage("features") as stage:
+        training = build_training_set(data, previous.encodings if previous else None)
+        stage.record(training.X)
+    data, X, y = training.data, training.X, training.y
+    feature_cols, fill_values = training.feature_cols, training.fill_values
+
     if len(X) < 2:
         raise ValueError(f"Insufficient data after cleaning: {len(X)} samples. Need at least 2.")
     
     # Adjust test size for small datasets
     test_size = 0.25 if len(X) >= 8 else 0.2 if len(X) >= 5 else 0.0
     
-    if test_size > 0:
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=test_size, random_state=42
-        )
-    else:
-        # Use all data for training if too small for split
-        X_train, X_test = X, X
-        y_train, y_test = y, y
-        print("Warning: Dataset too small for train/test split. Using all data for training.")
+    with profiler.stage("split") as stage:
+        if test_size > 0:
+            X_train, X_test, y_train, y_test = train_test_split(
+                X, y, test_size=test_size, random_state=42
+            )
+        else:
+            # Use all data for training if too small for split
+            X_train, X_test = X, X
+            y_train, y_test = y, y
+            print("Warning: Dataset too small for train/test split. Using all data for training.")
+        stage.record(X_train)
     
+    result: Dict[str, Any] = {"backend": backend}
+    if compare:
+        with profiler.stage("compare_backends") as stage:
+            result["comparison"] = compare_backends(compare, X_train, y_train, X_test, y_test)
+            stage.record(X_train)
+        print(format_comparison(result["comparison"]))
+
     # Train model
-    model = RandomForestRegressor(n_estimators=min(120, len(X_train) * 10), random_state=42)
-    model.fit(X_train, y_train)
+    model_backend = get_backend(backend)
+    params = model_backend.default_params(len(X_train))
+    if search is not None:
+        if backend != DEFAULT_BACKEND:
+            raise ValueError(f"Hyperparameter search covers the {DEFAULT_BACKEND} backend only, not {backend}")
+        with profiler.stage("search") as stage:
+            result["search"] = run_search(
+                X_train.to_numpy(dtype=np.float32), y_train.to_numpy(dtype=np.float64), configurations(search), search
+            )
+            stage.record(X_train)
+        print(format_report(result["search"]))
+        params = result["search"]["best_params"]
+    # All cores for the one fit; the saved artifact goes back to the library's default.
+    with profiler.stage("fit") as stage:
+        model = model_backend.fit(X_train, y_train, params, n_jobs=(search.workers or -1) if search else None)
+        stage.record(X_train)
+    result["params"] = params
 
     # Feature importance analysis
     if hasattr(model, "feature_importances_"):
@@ -170,31 +437,92 @@ def train(output_path: Path | None = None) -> None:
             print(operating_cost_importance.to_string(index=False))
 
     # Evaluate
-    preds = model.predict(X_test)
-    mae = mean_absolute_error(y_test, preds)
+    with profiler.stage("evaluate") as stage:
+        preds = model_backend.predict(model, X_test)
+        mae = mean_absolute_error(y_test, preds)
+        stage.record(X_test)
+    result["holdout_mae"] = float(mae)
     print(f"\nValidation MAE: ${mae:.2f}")
     
     if len(X_test) > 0:
-        # Calculate MAPE, avoiding division by zero
-        # Filter out zero values to avoid division by zero
-        # Convert to pandas Series if needed for indexing
-        y_test_series = pd.Series(y_test) if not isinstance(y_test, pd.Series) else y_test
-        preds_series = pd.Series(preds) if not isinstance(preds, pd.Series) else preds
-        
-        non_zero_mask = y_test_series != 0
-        if non_zero_mask.sum() > 0:
-            y_test_nonzero = y_test_series[non_zero_mask]
-            preds_nonzero = preds_series[non_zero_mask]
-            mape = (abs(y_test_nonzero - preds_nonzero) / y_test_nonzero).mean() * 100
-            print(f"Validation MAPE: {mape:.2f}%")
-        else:
+        # MAPE over the non-zero targets, to avoid division by zero
+        holdout_mape = mape(y_test.to_numpy(dtype=np.float64), preds)
+        if np.isnan(holdout_mape):
             print("Validation MAPE: Cannot calculate (all target values are zero)")
+        else:
+            result["holdout_mape"] = holdout_mape
+            print(f"Validation MAPE: {holdout_mape:.2f}%")
     
-    # Save model
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    joblib.dump(model, output_path)
-    print(f"Model saved to {output_path.resolve()}")
+    # Save model (plus the array forest for random forests) and the feature spec the service compiles
+    with profiler.stage("export"):
+        spec = build_feature_spec(data, feature_cols, fill_values, training.fitted, backend)
+        written = model_backend.export(model, output_path, X_train, spec)
+        spec_path = spec_path_for(output_path)
+    for path in written:
+        print(f"{'Model saved' if path == output_path else 'Exported'} to {path.resolve()}")
+    print(f"Feature spec saved to {spec_path.resolve()}")
+
+    if search is not None:
+        report = result["search"]
+        report["final_params"] = params
+        report["holdout_mae"] = float(mae)
+        with profiler.stage("serving_latency"):
+            report["serving_latency_ms"] = serving_latency(model, X_test.to_numpy(dtype=np.float32))
+        latency = report["serving_latency_ms"]
+        print(
+            f"Winner serving latency (model call, single row): sklearn {latency['sklearn']['batch_1_ms']:.2f} ms, "
+            f"array {latency['array']['batch_1_ms']:.2f} ms"
+        )
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", type=Path, help="artifact path (default: models/rent_predictor.joblib)")
+    parser.add_argument("--feature-store", type=Path, help="train from this feature store, refreshing it first")
+    parser.add_argument("--full-refresh", action="store_true", help="re-extract every property into the store")
+    parser.add_argument("--backend", choices=tuple(BACKENDS), default=DEFAULT_BACKEND, help="model to train")
+    parser.add_argument(
+        "--compare-backends",
+        nargs="*",
+        choices=tuple(BACKENDS),
+        help="fit these backends (default: all) on the same split and report them side by side first",
+    )
+    parser.add_argument("--comparison-report", type=Path, help="write the backend comparison as JSON")
+    parser.add_argument("--profile", type=Path, metavar="DIR", help="write a per-stage time and memory report here")
+    parser.add_argument(
+        "--flame-graph", action="store_true", help="with --profile, sample stacks and graph the slowest stage"
+    )
+    parser.add_argument(
+        "--no-trace-allocations", action="store_true", help="with --profile, skip tracemalloc (it slows Python code)"
+    )
+    add_search_arguments(parser)
+    args = parser.parse_args()
+
+    compare = () if args.compare_backends is None else args.compare_backends or tuple(BACKENDS)
+    profiler = TrainingProfiler(
+        enabled=args.profile is not None,
+        trace_allocations=not args.no_trace_allocations,
+        flame_graph=args.flame_graph,
+    )
+    with profiler:
+        result = train(
+            args.output,
+            load_training_data(args.feature_store, args.full_refresh, profiler),
+            options_from_args(args),
+            backend=args.backend,
+            compare=compare,
+            profiler=profiler,
+        )
+    if args.profile is not None:
+        print(format_profile(profiler.report()))
+        for path in profiler.write(args.profile):
+            print(f"Profile written to {path.resolve()}")
+    for key, path in (("search", args.search_report), ("comparison", args.comparison_report)):
+        if path and key in result:
+            path.write_text(json.dumps(result[key], indent=2) + "\n")
+            print(f"{key.capitalize()} report written to {path.resolve()}")
 
 
 if __name__ == "__main__":
-    train()
+    main()
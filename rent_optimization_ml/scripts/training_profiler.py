@@ -0,0 +1,316 @@
+"""
+Per-stage profile of a training run.
+
+``train_model.train`` runs each stage (extract, validate, features, fit,
+evaluate, export, ...) inside ``TrainingProfiler.stage``. For each stage the
+profiler records:
+- wall and CPU seconds, the CPU including reaped child processes such as the
+  search pool;
+- peak RSS of this process during the stage;
+- tracemalloc's peak and net traced bytes, and the lines that allocated most;
+- the row and column count of the stage's output.
+
+``write`` saves one JSON report per run. With ``flame_graph`` a sampler thread
+also records the main thread's stack every ``interval`` seconds; the slowest
+stage's samples are written as folded stacks (for ``flamegraph.pl`` or
+speedscope) and as a self-contained SVG flame graph.
+
+Per-stage peak RSS needs Linux, where the high-water mark can be reset
+(``/proc/self/clear_refs``). Elsewhere each stage reports the process peak so
+far. Stages do not nest.
+
+Usage:
+    python scripts/train_model.py --profile data/profiles
+    python scripts/train_model.py --profile data/profiles --flame-graph
+"""
+
+from __future__ import annotations
+
+import html
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# Allocation sites listed per stage.
+TOP_ALLOCATIONS = 5
+# Flame graph geometry, in SVG pixels.
+FLAME_WIDTH = 1200
+FLAME_FRAME_HEIGHT = 16
+
+
+@dataclass
+class Stage:
+    """Measurements of one stage; ``rows``/``columns`` describe its output."""
+
+    name: str
+    rows: Optional[int] = None
+    columns: Optional[int] = None
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    peak_rss_mb: Optional[float] = None
+    rss_start_mb: Optional[float] = None
+    rss_end_mb: Optional[float] = None
+    traced_peak_mb: Optional[float] = None
+    traced_net_mb: Optional[float] = None
+    top_allocations: List[Dict[str, Any]] = field(default_factory=list)
+    samples: int = 0
+
+    def record(self, output: Any) -> None:
+        """Take ``rows``/``columns`` from a frame, series or array's shape."""
+        shape = getattr(output, "shape", None) or (len(output),)
+        self.rows = int(shape[0])
+        self.columns = int(shape[1]) if len(shape) > 1 else None
+
+
+def _cpu_seconds() -> float:
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _status_mb(field_name: str) -> Optional[float]:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(field_name + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _process_peak_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, KiB on Linux.
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def _reset_peak_rss() -> bool:
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        return False
+    return True
+
+
+class TrainingProfiler:
+    """
+    Collects ``Stage`` measurements for one run.
+
+    Use as a context manager around the run: entering starts tracemalloc (with
+    ``trace_allocations``) and the stack sampler (with ``flame_graph``),
+    leaving stops them. When ``enabled`` is false, ``stage`` measures nothing,
+    so callers can profile unconditionally.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        trace_allocations: bool = True,
+        flame_graph: bool = False,
+        interval: float = 0.005,
+    ):
+        self.enabled = enabled
+        self.trace_allocations = trace_allocations and enabled
+        self.flame_graph = flame_graph and enabled
+        self.interval = interval
+        self.stages: List[Stage] = []
+        self.stacks: Dict[str, Counter] = {}
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self._cpu_started = _cpu_seconds()
+        self._current: Optional[Stage] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._main_thread = threading.main_thread().ident
+        self._wall_seconds: Optional[float] = None
+        self._cpu_seconds: Optional[float] = None
+
+    def __enter__(self) -> "TrainingProfiler":
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.flame_graph:
+            self._sampler = threading.Thread(target=self._sample, name="training-profiler", daemon=True)
+            self._sampler.start()
+        self._started = time.perf_counter()
+        self._cpu_started = _cpu_seconds()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._wall_seconds = time.perf_counter() - self._started
+        self._cpu_seconds = _cpu_seconds() - self._cpu_started
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+        if self.trace_allocations and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Stage]:
+        """Measure the ``with`` block as stage ``name``; the yielded ``Stage`` takes the output shape."""
+        stage = Stage(name)
+        if not self.enabled:
+            yield stage
+            return
+
+        tracing = self.trace_allocations and tracemalloc.is_tracing()
+        if tracing:
+            before = tracemalloc.take_snapshot()
+            traced_start, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+        resettable = _reset_peak_rss()
+        stage.rss_start_mb = _status_mb("VmRSS")
+        cpu_started = _cpu_seconds()
+        started = time.perf_counter()
+        self._current = stage
+        try:
+            yield stage
+        finally:
+            self._current = None
+            stage.wall_seconds = time.perf_counter() - started
+            stage.cpu_seconds = _cpu_seconds() - cpu_started
+            stage.rss_end_mb = _status_mb("VmRSS")
+            stage.peak_rss_mb = (_status_mb("VmHWM") if resettable else None) or _process_peak_mb()
+            if tracing:
+                traced_end, traced_peak = tracemalloc.get_traced_memory()
+                stage.traced_peak_mb = traced_peak / 2**20
+                stage.traced_net_mb = (traced_end - traced_start) / 2**20
+                stage.top_allocations = _top_allocations(before, tracemalloc.take_snapshot())
+            stage.samples = sum(self.stacks.get(name, Counter()).values())
+            self.stages.append(stage)
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            stage = self._current
+            frame = sys._current_frames().get(self._main_thread)
+            if stage is None or frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks.setdefault(stage.name, Counter())[";".join(reversed(stack))] += 1
+
+    def slowest(self) -> Optional[Stage]:
+        return max(self.stages, key=lambda stage: stage.wall_seconds, default=None)
+
+    def report(self) -> Dict[str, Any]:
+        slowest = self.slowest()
+        return {
+            "started_at": self.started_at.isoformat(),
+            "wall_seconds": self._wall_seconds if self._wall_seconds is not None else time.perf_counter() - self._started,
+            "cpu_seconds": self._cpu_seconds if self._cpu_seconds is not None else _cpu_seconds() - self._cpu_started,
+            # Resetting the high-water mark per stage resets ru_maxrss too.
+            "peak_rss_mb": max([_process_peak_mb()] + [stage.peak_rss_mb for stage in self.stages]),
+            "slowest_stage": slowest.name if slowest else None,
+            "stages": [asdict(stage) for stage in self.stages],
+        }
+
+    def write(self, directory: Path) -> List[Path]:
+        """
+        Write ``train-<UTC time>.json`` to ``directory``, plus ``.folded`` and
+        ``.svg`` stacks of the slowest stage when sampled; returns the paths.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        base = directory / f"train-{self.started_at.strftime('%Y%m%dT%H%M%SZ')}"
+        report = self.report()
+        written = []
+        slowest = self.slowest()
+        stacks = self.stacks.get(slowest.name) if slowest else None
+        if stacks:
+            folded = base.with_name(f"{base.name}-{slowest.name}.folded")
+            folded.write_text("".join(f"{stack} {count}\n" for stack, count in stacks.most_common()))
+            svg = folded.with_suffix(".svg")
+            svg.write_text(flame_graph_svg(stacks, f"{slowest.name}: {slowest.wall_seconds:.2f}s"))
+            report["flame_graph"] = {"stage": slowest.name, "folded": folded.name, "svg": svg.name}
+            written += [folded, svg]
+        path = base.with_suffix(".json")
+        path.write_text(json.dumps(report, indent=2) + "\n")
+        return [path] + written
+
+
+def _top_allocations(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot) -> List[Dict[str, Any]]:
+    # The profiler's own bookkeeping (snapshots, sampled stacks) is not the stage's.
+    ignore = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    )
+    diffs = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+    top = sorted(diffs, key=lambda diff: diff.size_diff, reverse=True)[:TOP_ALLOCATIONS]
+    return [
+        {"site": f"{diff.traceback[0].filename}:{diff.traceback[0].lineno}", "mb": diff.size_diff / 2**20, "blocks": diff.count_diff}
+        for diff in top
+        if diff.size_diff > 0
+    ]
+
+
+def format_profile(report: Dict[str, Any]) -> str:
+    lines = [f"{'stage':<18}{'rows':>10}{'cols':>6}{'wall s':>9}{'cpu s':>9}{'peak RSS':>11}{'traced':>10}"]
+    for stage in report["stages"]:
+        rows = "" if stage["rows"] is None else stage["rows"]
+        columns = "" if stage["columns"] is None else stage["columns"]
+        traced = "" if stage["traced_peak_mb"] is None else f"{stage['traced_peak_mb']:.1f}MB"
+        lines.append(
+            f"{stage['name']:<18}{rows:>10}{columns:>6}{stage['wall_seconds']:>9.2f}{stage['cpu_seconds']:>9.2f}"
+            f"{stage['peak_rss_mb']:>9.1f}MB{traced:>10}"
+        )
+    lines.append(f"{'total':<34}{report['wall_seconds']:>9.2f}{report['cpu_seconds']:>9.2f}{report['peak_rss_mb']:>9.1f}MB")
+    return "\n".join(lines)
+
+
+def flame_graph_svg(stacks: Counter, title: str) -> str:
+    """Render folded ``stacks`` (``"outer;...;inner" -> samples``) as a flame graph, root at the bottom."""
+    root: Dict[str, Any] = {"count": 0, "children": {}}
+    for stack, count in stacks.items():
+        root["count"] += count
+        node = root
+        for name in stack.split(";"):
+            node = node["children"].setdefault(name, {"count": 0, "children": {}})
+            node["count"] += count
+
+    def depth(node: Dict[str, Any]) -> int:
+        return 1 + max((depth(child) for child in node["children"].values()), default=0)
+
+    height = (depth(root) + 1) * FLAME_FRAME_HEIGHT
+    scale = FLAME_WIDTH / max(root["count"], 1)
+    rects: List[str] = []
+
+    def draw(node: Dict[str, Any], x: float, level: int) -> None:
+        for name, child in sorted(node["children"].items()):
+            width = child["count"] * scale
+            if width >= 0.5:
+                y = height - (level + 1) * FLAME_FRAME_HEIGHT
+                hue = zlib.crc32(name.encode()) % 50
+                label = html.escape(name if len(name) * 7 <= width else name[: max(int(width / 7) - 2, 0)] + "..")
+                tip = html.escape(f"{name}: {child['count']} samples ({100 * child['count'] / root['count']:.1f}%)")
+                rects.append(
+                    f'<g><title>{tip}</title><rect x="{x:.1f}" y="{y}" width="{width:.1f}" '
+                    f'height="{FLAME_FRAME_HEIGHT - 1}" fill="hsl({hue},85%,60%)"/>'
+                    + (f'<text x="{x + 2:.1f}" y="{y + 12}">{label}</text>' if width > 21 else "")
+                    + "</g>"
+                )
+                draw(child, x, level + 1)
+            x += width
+
+    draw(root, 0.0, 0)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{FLAME_WIDTH}" height="{height}" '
+        f'font-family="monospace" font-size="11">'
+        f'<text x="4" y="12">{html.escape(title)} ({root["count"]} samples)</text>'
+        + "".join(rects)
+        + "</svg>\n"
+    )
@@ -0,0 +1,46 @@
+import asyncio
+
+from app.config import get_settings
+from app.models.schemas import PredictionRequest
+from app.services.model_loader import ModelLoader
+from app.services.prediction_service import PredictionService
+
+
+def _payload(idx: int, **overrides) -> PredictionRequest:
+    fields = dict(
+        unit_id=f"batch-{idx}",
+        bedrooms=1 + idx % 4,
+        bathrooms=1 + (idx % 3) * 0.5,
+        square_feet=600 + idx * 37,
+        address=f"{idx} Main St",
+        city="Portland",
+        state="OR",
+        zip_code="97201",
+        current_rent=1400 + idx * 55,
+        has_gym=idx % 2 == 0,
+    )
+    fields.update(overrides)
+    return PredictionRequest(**fields)
+
+
+def test_predict_batch_matches_scalar_predict():
+    loader = ModelLoader(get_settings())
+    payloads = [_payload(idx) for idx in range(20)] + [_payload(99, current_rent=0)]
+    batch = loader.predict_batch(loader.build_matrix(payloads))
+    for payload, value in zip(payloads, batch):
+        assert loader.predict(payload.model_dump()) == value
+
+
+def test_predict_many_matches_single_predictions():
+    service = PredictionService(get_settings())
+    payloads = [_payload(idx) for idx in range(12)]
+
+    async def run():
+        batch = await service.predict_many(payloads)
+        singles = [await service.predict(payload) for payload in payloads]
+        return batch, singles
+
+    batch, singles = asyncio.run(run())
+    assert [r.unit_id for r in batch] == [p.unit_id for p in payloads]
+    for left, right in zip(batch, singles):
+        assert left.model_dump(exclude={"generated_at"}) == right.model_dump(exclude={"generated_at"})
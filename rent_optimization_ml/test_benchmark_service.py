@@ -0,0 +1,32 @@
+import asyncio
+
+from scripts.benchmark_service import PATHS, compare, run_benchmark, synthetic_payloads
+
+
+def test_synthetic_payloads_are_unique_and_deterministic():
+    first = synthetic_payloads(50, seed=3)
+    assert first == synthetic_payloads(50, seed=3)
+    assert len({p["unit_id"] for p in first}) == 50
+
+
+def test_small_run_reports_every_path():
+    results = asyncio.run(
+        run_benchmark(units=20, concurrency=4, batch_size=5, stream_size=10, warmup_units=4)
+    )
+    assert set(results) == set(PATHS)
+    assert results["batch"]["calls"] == 4 and results["stream"]["calls"] == 2
+    for row in results.values():
+        assert row["units"] == 20
+        assert 0 < row["p50_ms"] <= row["p95_ms"] <= row["p99_ms"]
+
+
+def test_compare_flags_throughput_and_tail_regressions():
+    baseline = {"single": {"units_per_s": 500.0, "p95_ms": 40.0, "p99_ms": 60.0}}
+    steady = {"single": {"units_per_s": 450.0, "p95_ms": 44.0, "p99_ms": 70.0}}
+    slower = {"single": {"units_per_s": 300.0, "p95_ms": 80.0, "p99_ms": 70.0}}
+    assert compare(steady, baseline, tolerance=0.25) == []
+    regressions = compare(slower, baseline, tolerance=0.25)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("single: throughput")
+    # Paths missing from the baseline are not compared.
+    assert compare({"batch": slower["single"]}, baseline, tolerance=0.25) == []
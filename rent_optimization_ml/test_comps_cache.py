@@ -0,0 +1,207 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from app.config import get_settings
+from app.models.schemas import ComparableProperty, PredictionRequest
+from app.services.comps_cache import CompsCache
+from app.services.market_data_service import MarketDataService
+from app.services.market_providers import CompsApiProvider, MarketComps, ProviderError, ProviderLimits, ProviderPool
+
+
+def _request(idx: int = 0, **overrides) -> PredictionRequest:
+    values = dict(
+        unit_id=f"unit-{idx}",
+        bedrooms=2,
+        bathrooms=1,
+        square_feet=850,
+        address="100 Main St",
+        city="Seattle",
+        state="WA",
+        zip_code="98101",
+        current_rent=2000,
+    )
+    values.update(overrides)
+    return PredictionRequest(**values)
+
+
+def _comps(price: float = 2000.0):
+    return [
+        ComparableProperty(
+            id="c1", address="3 Elm St", price=price, distance_miles=0.2, bedrooms=2, bathrooms=1.0, square_feet=850
+        )
+    ]
+
+
+class CountingFetch:
+    def __init__(self, price: float = 2000.0, delay: float = 0.01, fail: bool = False):
+        self.price = price
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ProviderError("upstream down")
+        return MarketComps(_comps(self.price), answered=1, queried=2)
+
+
+def test_units_in_one_building_share_one_upstream_call():
+    cache = CompsCache(None, max_entries=100, ttl_seconds=60, stale_seconds=60)
+    fetch = CountingFetch()
+
+    async def run():
+        # Same zip/beds/baths band; square footage within one 250 sqft band.
+        requests = [_request(i, square_feet=760 + i % 80) for i in range(500)]
+        return await asyncio.gather(*(cache.get_or_fetch(r, fetch) for r in requests))
+
+    results = asyncio.run(run())
+    assert fetch.calls == 1
+    assert all(r.comps[0].price == 2000.0 for r in results)
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] == 499
+    assert cache.key_for(_request(bedrooms=3)) != cache.key_for(_request())
+
+
+def test_waiters_fetch_for_themselves_when_the_owner_is_cancelled():
+    cache = CompsCache(None, max_entries=100, ttl_seconds=60, stale_seconds=60)
+    fetch = CountingFetch(delay=0.05)
+
+    async def run():
+        owner = asyncio.create_task(cache.get_or_fetch(_request(0), fetch))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(cache.get_or_fetch(_request(i), fetch)) for i in range(1, 4)]
+        await asyncio.sleep(0.01)
+        owner.cancel()  # e.g. its /predict/stream client went away
+        return await asyncio.gather(*waiters)
+
+    results = asyncio.run(run())
+    assert all(r.comps[0].price == 2000.0 for r in results)
+    # One waiter took over the fetch; the others joined it.
+    assert fetch.calls == 2
+    assert cache.stats()["inflight"] == 0
+
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    path = tmp_path / "comps.sqlite3"
+    fetch = CountingFetch(price=2150.0)
+
+    async def run():
+        first = CompsCache(path, max_entries=10, ttl_seconds=60, stale_seconds=60)
+        await first.get_or_fetch(_request(), fetch)
+        await first.close()
+        second = CompsCache(path, max_entries=10, ttl_seconds=60, stale_seconds=60)
+        comps = await second.get_or_fetch(_request(1), fetch)
+        await second.close()
+        return second, comps
+
+    second, comps = asyncio.run(run())
+    assert fetch.calls == 1
+    assert comps.comps[0].price == 2150.0
+    assert (comps.answered, comps.queried) == (1, 2)
+    assert second.stats()["disk_hits"] == 1
+
+
+def test_unreadable_sqlite_file_is_a_miss_not_an_error(tmp_path):
+    path = tmp_path / "comps.sqlite3"
+    path.write_bytes(b"not a sqlite database" * 100)
+    cache = CompsCache(path, max_entries=10, ttl_seconds=60, stale_seconds=60)
+    # Nothing is opened until first use, so a forked worker never inherits a connection.
+    assert cache._db is None
+    fetch = CountingFetch()
+
+    async def run():
+        comps = await cache.get_or_fetch(_request(), fetch)
+        cached = await cache.peek(_request(1))
+        await cache.close()
+        return comps, cached
+
+    comps, cached = asyncio.run(run())
+    assert fetch.calls == 1 and comps.comps[0].price == 2000.0
+    assert cached is comps
+    # The lookup and the write-back both failed and were skipped.
+    assert cache.stats()["disk_errors"] == 2
+
+
+def test_rows_in_an_older_payload_format_are_refetched(tmp_path):
+    path = tmp_path / "comps.sqlite3"
+    cache = CompsCache(path, max_entries=10, ttl_seconds=60, stale_seconds=60)
+    key = cache.key_for(_request())
+    db = sqlite3.connect(path, isolation_level=None)
+    db.execute("CREATE TABLE comps_cache (key TEXT PRIMARY KEY, fetched_at REAL NOT NULL, payload TEXT NOT NULL)")
+    db.execute("INSERT INTO comps_cache VALUES (?, ?, ?)", (key, time.time(), "[]"))
+    db.close()
+    fetch = CountingFetch(price=2300.0)
+
+    async def run():
+        await cache.get_or_fetch(_request(), fetch)
+        # A v2 row written by an older build before its format was settled.
+        cache._write(cache.key_for(_request(bedrooms=3)), time.time(), '[{"id": "c1"}]')
+        cache._memory.clear()
+        comps = await cache.get_or_fetch(_request(bedrooms=3), fetch)
+        await cache.close()
+        return comps
+
+    comps = asyncio.run(run())
+    assert fetch.calls == 2 and comps.comps[0].price == 2300.0
+    assert cache.stats()["disk_errors"] == 1
+
+
+def test_stale_entry_is_served_while_one_refresh_runs():
+    now = [1000.0]
+    cache = CompsCache(None, max_entries=10, ttl_seconds=60, stale_seconds=600, clock=lambda: now[0])
+
+    async def run():
+        await cache.get_or_fetch(_request(), CountingFetch(price=2000.0))
+        now[0] += 120  # past the TTL, inside the stale window
+        refresh = CountingFetch(price=2100.0, delay=0.02)
+        stale = await asyncio.gather(*(cache.get_or_fetch(_request(i), refresh) for i in range(20)))
+        await asyncio.sleep(0.05)
+        fresh = await cache.get_or_fetch(_request(), refresh)
+        return refresh, stale, fresh
+
+    refresh, stale, fresh = asyncio.run(run())
+    assert all(r.comps[0].price == 2000.0 for r in stale)
+    assert refresh.calls == 1
+    assert fresh.comps[0].price == 2100.0
+    assert cache.stats()["refreshes"] == 1
+
+    # Past TTL + stale window the entry is a plain miss.
+    now[0] += 10_000
+    expired = CountingFetch(price=2200.0)
+    assert asyncio.run(cache.get_or_fetch(_request(), expired)).comps[0].price == 2200.0
+    assert expired.calls == 1
+
+
+def test_failed_fetch_propagates_and_is_not_cached():
+    cache = CompsCache(None, max_entries=10, ttl_seconds=60, stale_seconds=60)
+
+    async def run():
+        with pytest.raises(ProviderError):
+            await cache.get_or_fetch(_request(), CountingFetch(fail=True))
+        return await cache.get_or_fetch(_request(), CountingFetch(price=1900.0))
+
+    assert asyncio.run(run()).comps[0].price == 1900.0
+    assert cache.stats()["misses"] == 2
+
+
+def test_market_data_service_returns_no_comps_when_every_provider_fails():
+    settings = get_settings().model_copy(update={"use_market_data": True, "enable_comps_cache": True})
+    limits = ProviderLimits(max_concurrency=1, rate_per_second=0, timeout_seconds=0.2, max_retries=0)
+    pool = ProviderPool([CompsApiProvider("http://127.0.0.1:9", limits)])
+    service = MarketDataService(settings, providers=pool, comps_cache=CompsCache(None, 10, 60, 60))
+
+    async def run():
+        comps = await service.fetch_comparables(_request())
+        await service.close()
+        return comps
+
+    assert asyncio.run(run()) == []
+    stats = service.stats()
+    assert stats["comps_cache_memory_entries"] == 0
+    assert stats["comps_cache_misses"] == 1
@@ -0,0 +1,130 @@
+import asyncio
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app.config import get_settings
+from app.models.schemas import PredictionRequest
+from app.services.comps_index import CompsIndex, LocalCompsIndex, haversine_miles
+from app.services.market_data_service import MarketDataService
+
+
+def _units(count: int, seed: int = 0, start_id: int = 1) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "unit_id": np.arange(start_id, start_id + count, dtype=np.int64),
+            "property_id": rng.integers(1, 500, count),
+            "address": [f"{i} Test St" for i in range(count)],
+            "zip_code": rng.choice(["98101", "98102"], count),
+            "latitude": 47.6 + rng.uniform(-0.3, 0.3, count),
+            "longitude": -122.3 + rng.uniform(-0.3, 0.3, count),
+            "bedrooms": rng.integers(0, 4, count).astype(float),
+            "bathrooms": rng.choice([1.0, 1.5, 2.0], count),
+            "square_feet": rng.integers(400, 1600, count).astype(float),
+            "rent": rng.uniform(1200, 3500, count),
+            "year_built": rng.integers(1950, 2020, count).astype(float),
+        }
+    )
+
+
+def _request(**overrides) -> PredictionRequest:
+    values = dict(
+        unit_id="subject",
+        bedrooms=2,
+        bathrooms=1.0,
+        square_feet=850,
+        address="1 Main St",
+        city="Seattle",
+        state="WA",
+        zip_code="98101",
+        current_rent=2000,
+        latitude=47.61,
+        longitude=-122.33,
+    )
+    values.update(overrides)
+    return PredictionRequest(**values)
+
+
+def test_nearest_matches_brute_force():
+    frame = _units(20000)
+    index = CompsIndex(frame, cell_degrees=0.02)
+    for lat, lon, k, radius in [(47.61, -122.33, 10, 5.0), (47.35, -122.05, 5, 2.0), (47.6, -122.3, 0, 1.0)]:
+        positions, distances = index.nearest(lat, lon, k=k, radius_miles=radius, bedrooms=2, bathrooms=1.0)
+
+        all_d = haversine_miles(lat, lon, frame["latitude"].to_numpy(), frame["longitude"].to_numpy())
+        ok = (all_d <= radius) & (frame["bedrooms"].to_numpy() == 2) & (np.abs(frame["bathrooms"].to_numpy() - 1.0) <= 0.5)
+        expected = np.sort(all_d[ok])
+        if k:
+            expected = expected[:k]
+        np.testing.assert_allclose(distances, expected)
+        assert set(index.unit_ids[positions]) <= set(frame["unit_id"][ok])
+
+
+def test_apply_upserts_and_removes_units():
+    index = CompsIndex(_units(100))
+    changes = _units(3, seed=1, start_id=99)  # ids 99, 100 replaced; 101 is new
+    changes.loc[0, "rent"] = None  # unit 99 lost its active lease
+
+    updated = index.apply(changes)
+
+    assert len(index) == 100
+    assert len(updated) == 100
+    assert 99 not in set(updated.unit_ids)
+    assert updated.rents[updated.unit_ids == 101][0] == changes.loc[2, "rent"]
+    assert len(index.apply(changes, full=True)) == 2
+
+
+def test_local_index_refreshes_incrementally_from_the_watermark():
+    calls = []
+    full = _units(50)
+    watermark = datetime(2025, 1, 1)
+
+    def loader(since, after_unit_id):
+        calls.append((since, after_unit_id))
+        if since is None:
+            return full, watermark
+        return _units(1, seed=3, start_id=51), datetime(2025, 1, 2)
+
+    now = [0.0]
+    local = LocalCompsIndex(loader, refresh_seconds=0, full_reload_seconds=3600, clock=lambda: now[0])
+
+    async def run():
+        await local.start()
+        await local.refresh()
+        now[0] = 4000
+        await local.refresh()
+
+    asyncio.run(run())
+    assert calls[0] == (None, 0)
+    assert calls[1] == (watermark - LocalCompsIndex.WATERMARK_OVERLAP, 50)
+    assert calls[2] == (None, 0)  # full reload once due
+    assert local.stats()["loads"] == 3
+    assert len(local.index) == 50
+
+
+def test_market_data_service_serves_real_distances_from_local_index():
+    frame = _units(5000)
+    frame.loc[0, ["latitude", "longitude", "bedrooms", "bathrooms"]] = [47.61, -122.33, 2, 1.0]
+    local = LocalCompsIndex(lambda since, after: (frame, None), refresh_seconds=0, radius_miles=3.0)
+    settings = get_settings().model_copy(
+        update={"use_market_data": True, "market_data_providers": "", "market_data_max_comps": 5}
+    )
+    service = MarketDataService(settings, local_index=local)
+
+    async def run():
+        await service.start()
+        near = await service.fetch_comparables(_request())
+        by_zip = await service.fetch_comparables(_request(latitude=None, longitude=None))
+        itself = await service.fetch_comparables(_request(unit_id=str(frame.loc[0, "unit_id"])))
+        await service.close()
+        return near, by_zip, itself
+
+    near, by_zip, itself = asyncio.run(run())
+    assert len(near) == 5 and len(by_zip) == 5
+    assert near[0].id == f"unit-{frame.loc[0, 'unit_id']}" and near[0].distance_miles == 0.0
+    assert [c.distance_miles for c in near] == sorted(c.distance_miles for c in near)
+    assert all(c.bedrooms == 2 and c.distance_miles <= 3.0 for c in near)
+    assert itself[0].id != near[0].id
+    assert service.stats()["local_index_units"] == 5000
@@ -0,0 +1,78 @@
+import numpy as np
+
+from app.models.schemas import ComparableProperty, PredictionRequest
+from app.services.comps_ranking import CandidateSet, CompsRanker
+from app.services.prediction_service import PredictionService
+
+
+def _subject(idx: int, bedrooms: int = 2, square_feet: int = 900, year_built=None) -> PredictionRequest:
+    return PredictionRequest(
+        unit_id=f"unit-{idx}",
+        bedrooms=bedrooms,
+        bathrooms=1.0,
+        square_feet=square_feet,
+        address="1 Main St",
+        city="Seattle",
+        state="WA",
+        zip_code="98101",
+        current_rent=2000,
+        year_built=year_built,
+    )
+
+
+def _random_candidates(counts, seed: int = 0) -> CandidateSet:
+    rng = np.random.default_rng(seed)
+    parts = []
+    for subject, count in enumerate(counts):
+        parts.append(
+            {
+                "ids": np.array([f"{subject}-{i}" for i in range(count)], dtype=object),
+                "addresses": np.array([f"{i} Oak St" for i in range(count)], dtype=object),
+                "prices": rng.uniform(1500, 3000, count),
+                "distances": rng.uniform(0, 5, count),
+                "bedrooms": rng.integers(1, 4, count).astype(float),
+                "bathrooms": rng.choice([1.0, 1.5, 2.0], count),
+                "square_feet": rng.integers(500, 1400, count).astype(float),
+                "year_built": np.where(rng.random(count) < 0.2, np.nan, rng.integers(1950, 2020, count)),
+            }
+        )
+    return CandidateSet.concat(parts)
+
+
+def test_rank_matches_a_per_subject_sort():
+    counts = [300, 0, 7, 150, 1]
+    subjects = [_subject(i, bedrooms=1 + i % 3, year_built=1990 if i % 2 else None) for i in range(len(counts))]
+    candidates = _random_candidates(counts)
+    ranker = CompsRanker()
+
+    ranked = ranker.rank(subjects, candidates, k=5)
+
+    costs = ranker.costs(subjects, candidates)
+    for i, (start, end) in enumerate(zip(candidates.offsets[:-1], candidates.offsets[1:])):
+        order = start + np.argsort(costs[start:end], kind="stable")[:5]
+        assert [c.id for c in ranked.comparables[i]] == list(candidates.ids[order])
+        if len(order):
+            weights = 1 / (1 + costs[order])
+            expected = float((weights * candidates.prices[order]).sum() / weights.sum())
+            assert np.isclose(ranked.market_avgs[i], expected)
+        else:
+            assert np.isnan(ranked.market_avgs[i])
+    assert [len(comps) for comps in ranked.comparables] == [5, 0, 5, 5, 1]
+
+
+def test_closer_and_more_similar_comps_win():
+    near_match = ComparableProperty(
+        id="a", address="a", price=2000, distance_miles=0.3, bedrooms=2, bathrooms=1.0, square_feet=900
+    )
+    far_match = near_match.model_copy(update={"id": "b", "distance_miles": 2.5})
+    near_studio = near_match.model_copy(update={"id": "c", "bedrooms": 0, "square_feet": 400})
+    candidates = CandidateSet.from_comparables([[far_match, near_studio, near_match], []], coverage=[0.5, 1.0])
+
+    ranked = CompsRanker().rank([_subject(0), _subject(1)], candidates, k=2)
+
+    assert [c.id for c in ranked.comparables[0]] == ["a", "b"]
+    assert ranked.comparables[1] == []
+    assert np.isclose(ranked.market_avgs[0], 2000)
+    assert np.isnan(ranked.market_avgs[1])
+    # Half the sources answered for the first unit; the second has no comps at all.
+    assert list(PredictionService._confidence_score(ranked)) == [0.75, 0.68]
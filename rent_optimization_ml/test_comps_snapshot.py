@@ -0,0 +1,134 @@
+import asyncio
+
+import numpy as np
+
+from app.config import get_settings
+from app.models.schemas import ComparableProperty, PredictionRequest
+from app.services.comps_snapshot import CompsSnapshot, snapshot_key
+from app.services.market_data_service import MarketDataService
+from app.services.market_providers import CompsApiProvider, MarketComps, ProviderLimits, ProviderPool
+from scripts.prefetch_comps import prefetch, prefetch_settings
+from test_market_providers import StubServer
+
+
+def _request(idx: int = 0, **overrides) -> PredictionRequest:
+    values = dict(
+        unit_id=f"unit-{idx}",
+        bedrooms=2,
+        bathrooms=1.0,
+        square_feet=850,
+        address="1 Main St",
+        city="Seattle",
+        state="WA",
+        zip_code="98101",
+        current_rent=2000,
+    )
+    values.update(overrides)
+    return PredictionRequest(**values)
+
+
+def _comp(idx: int, price: float) -> ComparableProperty:
+    return ComparableProperty(
+        id=f"c{idx}", address=f"{idx} Elm St", price=price, distance_miles=0.1 * idx, bedrooms=2, bathrooms=1.0, square_feet=850
+    )
+
+
+def test_snapshot_round_trips_through_memory_mapped_columns(tmp_path):
+    path = tmp_path / "snapshot"
+    entries = [
+        (snapshot_key("98101", 2, 1.0), MarketComps([_comp(1, 2000), _comp(2, 2100)], answered=2, queried=2)),
+        (snapshot_key("98102", 1, 1.5), MarketComps([_comp(3, 1500)], answered=1, queried=2)),
+    ]
+    CompsSnapshot.write(path, entries, {"providers": "comps_api"})
+    CompsSnapshot.write(path, entries)  # replacing an existing snapshot
+
+    snapshot = CompsSnapshot.load(path)
+    assert isinstance(snapshot.arrays["prices"], np.memmap)
+    group = snapshot.lookup(_request(bathrooms=1.2))  # 1.2 baths falls in the 1.0 band
+    assert [c.price for c in snapshot.market_comps(group).comps] == [2000, 2100]
+    other = snapshot.lookup(_request(zip_code="98102", bedrooms=1, bathrooms=1.5))
+    assert snapshot.coverage(other) == 0.5
+    assert snapshot.candidate_part(other)["ids"].tolist() == ["c3"]
+    assert snapshot.lookup(_request(zip_code="00000")) is None
+    assert snapshot.stats()["hits"] == 2 and snapshot.stats()["misses"] == 1
+    assert not list(tmp_path.glob(".snapshot.*"))
+
+
+def test_service_answers_snapshot_hits_without_providers(tmp_path):
+    path = tmp_path / "snapshot"
+    CompsSnapshot.write(path, [(snapshot_key("98101", 2, 1.0), MarketComps([_comp(1, 2000)], 1, 1))])
+    settings = get_settings().model_copy(
+        update={"use_market_data": True, "enable_comps_cache": False, "comps_snapshot_path": path}
+    )
+    # Nothing listens on port 9: a live call would come back empty.
+    limits = ProviderLimits(max_concurrency=1, rate_per_second=0, timeout_seconds=0.2, max_retries=0)
+    service = MarketDataService(settings, providers=ProviderPool([CompsApiProvider("http://127.0.0.1:9", limits)]))
+
+    async def run():
+        candidates = await service.fetch_candidates([_request(0), _request(1, zip_code="98109")])
+        await service.close()
+        return candidates
+
+    candidates = asyncio.run(run())
+    assert candidates.counts().tolist() == [1, 0]
+    assert candidates.prices.tolist() == [2000]
+    assert service.stats()["snapshot_hits"] == 1
+    assert service.stats()["comps_api_calls_total"] == 1
+
+
+def test_service_reloads_a_rewritten_snapshot_and_ignores_an_expired_one(tmp_path):
+    path = tmp_path / "snapshot"
+    key = snapshot_key("98101", 2, 1.0)
+    CompsSnapshot.write(path, [(key, MarketComps([_comp(1, 2000)], 1, 1))])
+    settings = get_settings().model_copy(
+        update={
+            "use_market_data": True,
+            "enable_comps_cache": False,
+            "comps_snapshot_path": path,
+            "comps_snapshot_max_age_hours": 24.0,
+        }
+    )
+    service = MarketDataService(settings)
+
+    async def run():
+        assert not await service.check_snapshot()
+        CompsSnapshot.write(path, [(key, MarketComps([_comp(1, 2300)], 1, 1))])
+        reloaded = await service.check_snapshot()
+        fresh = await service.fetch_market_comps(_request())
+        service.snapshot.meta["created_ts"] -= 25 * 3600
+        expired = await service.fetch_market_comps(_request())
+        await service.close()
+        return reloaded, fresh, expired
+
+    reloaded, fresh, expired = asyncio.run(run())
+    assert reloaded and [c.price for c in fresh.comps] == [2300]
+    # Past the max age the snapshot answers nothing and the unit goes live.
+    assert [c.price for c in expired.comps] != [2300]
+    stats = service.stats()
+    assert stats["snapshot_reloads"] == 1 and stats["snapshot_expired"] == 1
+    assert (stats["snapshot_hits"], stats["snapshot_misses"]) == (1, 1)
+
+
+def test_prefetch_fetches_every_group_with_bounded_concurrency(tmp_path):
+    groups = [
+        {"zip_code": f"98{idx:03d}", "bedrooms": idx % 4, "bathrooms": 1.0, "square_feet": 800, "latitude": 47.6, "longitude": -122.3}
+        for idx in range(40)
+    ]
+    with StubServer(delay=0.01) as server:
+        limits = ProviderLimits(max_concurrency=8, rate_per_second=0, timeout_seconds=2.0, max_retries=0)
+        settings = prefetch_settings(get_settings(), max_comps=25)
+        service = MarketDataService(settings, providers=ProviderPool([CompsApiProvider(server.url, limits)]))
+
+        async def run():
+            result = await prefetch(groups, service, concurrency=4)
+            await service.close()
+            return result
+
+        entries, report = asyncio.run(run())
+
+    assert server.max_inflight <= 4
+    assert report["answered"] == 40 and report["failed"] == 0 and report["comps"] == 80
+    assert report["groups_per_s"] > 0
+    meta = CompsSnapshot.write(tmp_path / "snapshot", entries, {"report": report})
+    assert meta["groups"] == 40
+    assert CompsSnapshot.load(tmp_path / "snapshot").lookup(_request(zip_code="98005", bedrooms=1)) is not None
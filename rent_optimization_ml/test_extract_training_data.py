@@ -0,0 +1,128 @@
+import tracemalloc
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from scripts.extract_training_data import (
+    QUERY_DTYPES,
+    TRAINING_COLUMNS,
+    clean_database_url,
+    concat_chunks,
+    fetch_sample_training_data,
+    iter_training_chunks,
+    validate_training_data,
+)
+
+QUERY_COLUMNS = [
+    "unit_id", "property_id", "bedrooms", "bathrooms", "square_feet", "current_rent", "achieved_rent",
+    "maintenance_yearly_total", "taxes_yearly_total", "insurance_yearly_total", "repairs_yearly_total",
+    "other_yearly_total", "vacancy_rate", "maintenance_requests_12mo", "property_age", "city", "state",
+    "zip_code", "properties_in_city_count", "market_competition_score",
+]
+
+
+class FakeNamedCursor:
+    """Just enough of a psycopg2 named cursor: rows come out ``fetchmany`` at a time."""
+
+    def __init__(self, name, rows):
+        self.name = name
+        self.rows = rows
+        self.itersize = 2000
+        self.description = None
+        self.fetches = 0
+        self.query = None
+        self.params = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.query = query
+        self.params = params
+        self.description = [(column,) for column in QUERY_COLUMNS]
+
+    def fetchmany(self, size):
+        self.fetches += 1
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.cursors = []
+
+    def cursor(self, name=None):
+        cursor = FakeNamedCursor(name, self.rows)
+        self.cursors.append(cursor)
+        return cursor
+
+
+def _rows(count):
+    return [
+        (
+            i + 1, 1 + i // 10, 1 + i % 3, None if i % 7 == 0 else 1.5, 600 + i, 1800.0 + i, 1800.0 + i,
+            1200.0, 2400.0 + i, 1800.0, 960.0, 600.0, 0.05, i % 12, Decimal(10 + i % 40),
+            "Seattle", "WA", "98101", 1250, Decimal("0.5"),
+        )
+        for i in range(count)
+    ]
+
+
+def test_chunks_are_typed_and_carry_derived_columns():
+    conn = FakeConnection(_rows(25))
+
+    chunks = list(iter_training_chunks(conn, itersize=10))
+
+    cursor = conn.cursors[0]
+    assert cursor.name  # a named cursor runs server-side
+    assert cursor.itersize == 10
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert cursor.fetches == 4
+
+    data = pd.concat(chunks, ignore_index=True)
+    assert list(data.columns) == TRAINING_COLUMNS
+    for column, dtype in QUERY_DTYPES.items():
+        assert data[column].dtype == dtype, column
+    assert data["bathrooms"].iloc[0] == 0  # NULL bathrooms are filled, as before
+    assert data["property_age"].iloc[3] == 13
+    assert np.allclose(data["taxes_monthly_avg"], data["taxes_yearly_total"] / 12)
+    assert np.allclose(data["taxes_per_sqft"], data["taxes_yearly_total"] / data["square_feet"])
+    assert np.allclose(data["total_operating_cost_yearly"], 1200 + data["taxes_yearly_total"] + 1800 + 960 + 600)
+    expected_buckets = np.select([data["maintenance_requests_12mo"] > 8, data["maintenance_requests_12mo"] > 3], [2, 1], 0)
+    assert data["maintenance_frequency_bucket"].tolist() == expected_buckets.tolist()
+
+    # Chunks line up with the sample data the rest of the pipeline is written against.
+    sample = fetch_sample_training_data()
+    assert list(sample.columns) == TRAINING_COLUMNS
+    assert validate_training_data(data, report=False).shape == data.shape
+
+
+def test_chunks_are_joined_without_holding_them_all():
+    rows = _rows(20_000)
+    expected = pd.concat(iter_training_chunks(FakeConnection(rows), itersize=1000), ignore_index=True)
+
+    tracemalloc.start()
+    data = concat_chunks(iter_training_chunks(FakeConnection(rows), itersize=1000))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    pd.testing.assert_frame_equal(data, expected)
+    numeric = data.select_dtypes("number").memory_usage(index=False).sum()
+    # The frame plus one chunk (and the raw rows of that chunk), not the frame twice.
+    assert peak < numeric * 1.6
+    assert concat_chunks([]).empty
+
+
+def test_empty_result_yields_no_chunks():
+    assert list(iter_training_chunks(FakeConnection([]), itersize=10)) == []
+
+
+def test_prisma_schema_parameter_is_dropped():
+    url = "postgresql://app:secret@db:5432/pms?schema=public&sslmode=require"
+    assert clean_database_url(url) == "postgresql://app:secret@db:5432/pms?sslmode=require"
+    assert clean_database_url("postgresql://db/pms?schema=public") == "postgresql://db/pms"
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from scripts.benchmark_features import compare, legacy_add_basic_features, synthetic_training_frame
+from scripts.prepare_features import add_basic_features, engineer_features
+from scripts.train_model import build_feature_spec
+
+
+def test_registry_matches_the_former_add_basic_features():
+    frame = synthetic_training_frame(5000, cities=50)
+    frame.loc[::97, "property_age"] = np.nan
+    frame.loc[::89, "bathrooms"] = np.nan
+
+    before = frame.copy()
+    legacy = legacy_add_basic_features(frame)
+    current = add_basic_features(frame)
+
+    assert compare(legacy, current) == []
+    assert set(current.columns) == set(legacy.columns)
+    assert current.loc[0, "property_age_bucket"] == 1  # unknown age is "recent"
+    pd.testing.assert_frame_equal(frame, before)  # the input is not modified
+
+
+def test_vocabularies_are_stable_across_runs_and_shared_with_serving():
+    first = synthetic_training_frame(200, cities=5)
+    _, fitted = engineer_features(first)
+    cities = fitted.encodings["city_encoded"]
+    assert list(cities) == sorted(cities) and sorted(cities.values()) == list(range(5))
+
+    # A later run in a different row order, with a new city, keeps the old codes.
+    later = synthetic_training_frame(300, seed=1, cities=6).iloc[::-1].reset_index(drop=True)
+    later_features, later_fitted = engineer_features(later, fitted.encodings)
+    assert {k: v for k, v in later_fitted.encodings["city_encoded"].items() if k in cities} == cities
+    assert later_fitted.encodings["city_encoded"]["City 5"] == 5
+
+    # Serving runs the same definitions over a batch of requests.
+    columns = ["bedrooms", "square_feet", "current_rent", "size_bucket", "rent_per_sqft", "city_encoded", "state_encoded"]
+    data = pd.concat([later, later_features], axis=1)
+    spec = build_feature_spec(data, columns, data[columns].median(numeric_only=True), later_fitted)
+    extractor = spec.compile()
+    requests = list(later[["bedrooms", "bathrooms", "square_feet", "current_rent", "city", "state"]].itertuples())
+    matrix = extractor.extract(requests)
+    np.testing.assert_allclose(matrix[:, : len(columns)], data[columns].to_numpy(dtype=np.float32), rtol=1e-6)
+
+    unknown = extractor.extract_mapping({"city": "Nowhere", "bedrooms": 1, "square_feet": 500, "current_rent": 900})
+    assert unknown[0, columns.index("city_encoded")] == -1
+    assert unknown[0, columns.index("size_bucket")] == 0
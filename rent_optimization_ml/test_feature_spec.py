@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from app.models.schemas import PredictionRequest
+from app.services.feature_spec import FeatureSpec, spec_path_for
+from scripts.extract_training_data import fetch_sample_training_data
+from scripts.prepare_features import add_basic_features
+from scripts.train_model import build_feature_spec
+
+REQUEST_DERIVED = ["bedrooms", "bathrooms", "square_feet", "bath_per_bed", "size_bucket", "rent_per_sqft", "city_encoded"]
+
+
+def _requests(data: pd.DataFrame):
+    return [
+        PredictionRequest(
+            unit_id=f"spec-{idx}",
+            bedrooms=int(row.bedrooms),
+            bathrooms=float(row.bathrooms),
+            square_feet=int(row.square_feet),
+            address="1 Spec St",
+            city=row.city,
+            state=row.state,
+            zip_code=row.zip_code,
+            current_rent=float(row.current_rent),
+        )
+        for idx, row in enumerate(data.itertuples())
+    ]
+
+
+def test_extractor_matches_training_features(tmp_path):
+    data = add_basic_features(fetch_sample_training_data())
+    columns = REQUEST_DERIVED + ["vacancy_rate"]
+    spec = build_feature_spec(data, columns, data[columns].median(numeric_only=True))
+
+    path = spec_path_for(tmp_path / "rent_predictor.joblib")
+    spec.save(path)
+    extractor = FeatureSpec.load(path).compile()
+    matrix = extractor.extract(_requests(data))
+
+    assert matrix.dtype == np.float32
+    assert matrix.shape == (len(data), len(columns) + 4)
+    expected = data[REQUEST_DERIVED].to_numpy(dtype=np.float32)
+    np.testing.assert_allclose(matrix[:, : len(REQUEST_DERIVED)], expected, rtol=1e-6)
+    # Not available on a request: served with the training median.
+    assert np.all(matrix[:, len(REQUEST_DERIVED)] == np.float32(data["vacancy_rate"].median()))
+
+
+def test_unknown_category_and_missing_mapping_keys():
+    spec = FeatureSpec(
+        columns=["city_encoded", "bedrooms"],
+        encodings={"city_encoded": {"Seattle": 0}},
+        sources={"city_encoded": "city"},
+        fill_values={"bedrooms": 2.0},
+    )
+    extractor = spec.compile()
+    row = extractor.extract_mapping({"city": "Boise", "bathrooms": 1, "square_feet": 700, "current_rent": 1500})
+    assert row[0, 0] == -1
+    assert row[0, 1] == 2.0
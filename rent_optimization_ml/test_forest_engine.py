@@ -0,0 +1,85 @@
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from app.config import Settings
+from app.models.schemas import PredictionRequest
+from app.services.feature_spec import FeatureSpec, spec_path_for
+from app.services.forest_engine import ArrayForest, export_forest, forest_dir_for
+from app.services.model_loader import ModelLoader, file_sha256
+
+COLUMNS = ["bedrooms", "bathrooms", "square_feet", "year_built", "floor_number"]
+
+
+def _fit(n_rows: int = 800, seed: int = 3) -> RandomForestRegressor:
+    rng = np.random.default_rng(seed)
+    X = np.column_stack(
+        [
+            rng.integers(0, 5, n_rows),
+            rng.integers(1, 4, n_rows) / 1.0,
+            rng.uniform(400, 2500, n_rows),
+            rng.integers(1950, 2024, n_rows),
+            rng.integers(1, 30, n_rows),
+        ]
+    ).astype(np.float32)
+    y = 900 + 1.1 * X[:, 2] + 150 * X[:, 0] + rng.normal(0, 60, n_rows)
+    return RandomForestRegressor(n_estimators=25, random_state=0).fit(X, y)
+
+
+def test_array_forest_matches_sklearn_bit_for_bit(tmp_path):
+    model = _fit()
+    rng = np.random.default_rng(11)
+    X = np.column_stack(
+        [
+            rng.integers(0, 6, 3000),
+            rng.uniform(0.5, 4, 3000),
+            rng.uniform(200, 3000, 3000),
+            rng.integers(1900, 2030, 3000),
+            rng.integers(0, 40, 3000),
+        ]
+    ).astype(np.float64)
+
+    export_forest(model, tmp_path / "m.forest", X)
+    for mmap_mode in (None, "r"):
+        forest = ArrayForest.load(tmp_path / "m.forest", mmap_mode=mmap_mode)
+        assert np.array_equal(forest.predict(X), model.predict(X))
+        assert np.array_equal(forest.predict(X[:1]), model.predict(X[:1]))
+
+
+def test_loader_selects_array_engine_only_for_matching_export(tmp_path):
+    artifact = tmp_path / "rent_predictor.joblib"
+    model = _fit()
+    joblib.dump(model, artifact)
+    FeatureSpec(columns=COLUMNS, fill_values={"year_built": 1990.0, "floor_number": 1.0}).save(spec_path_for(artifact))
+    requests = [
+        PredictionRequest(
+            unit_id=f"u{i}",
+            bedrooms=i % 4,
+            bathrooms=1.0 + i % 2,
+            square_feet=500 + 37 * i,
+            address="1 Test St",
+            city="Seattle",
+            state="WA",
+            zip_code="98101",
+            current_rent=1500.0,
+            year_built=1960 + i,
+        )
+        for i in range(40)
+    ]
+
+    sklearn_loader = ModelLoader(Settings(model_path=artifact))
+    matrix = sklearn_loader.build_matrix(requests)
+    expected = sklearn_loader.predict_batch(matrix)
+
+    # No export yet: the array engine falls back to sklearn.
+    assert not isinstance(ModelLoader(Settings(model_path=artifact, inference_engine="array")).model, ArrayForest)
+
+    sha256 = file_sha256(artifact)
+    export_forest(model, forest_dir_for(artifact, sha256), matrix[:, : len(COLUMNS)], artifact_sha256=sha256)
+    array_loader = ModelLoader(Settings(model_path=artifact, inference_engine="array"))
+    assert isinstance(array_loader.model, ArrayForest)
+    assert np.array_equal(array_loader.predict_batch(matrix), expected)
+
+    # A retrained artifact invalidates the stale export.
+    joblib.dump(_fit(seed=4), artifact)
+    assert not isinstance(ModelLoader(Settings(model_path=artifact, inference_engine="array")).model, ArrayForest)
@@ -0,0 +1,41 @@
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.model_selection import KFold
+
+from scripts.benchmark_features import synthetic_training_frame
+from scripts.hyperparameter_search import SearchOptions, grid_configurations, search
+from scripts.train_model import build_training_set, train
+
+GRID = {"n_estimators": [5, 10], "max_depth": [3, None]}
+
+
+def test_search_halves_configurations_fold_by_fold():
+    training = build_training_set(synthetic_training_frame(150, cities=5))
+    X, y = training.X.to_numpy(dtype=np.float32), training.y.to_numpy()
+    options = SearchOptions(folds=3, workers=2, keep_fraction=0.5)
+
+    report = search(X, y, grid_configurations(GRID), options)
+
+    records = report["configurations"]
+    assert sorted(r["folds_evaluated"] for r in records) == [1, 1, 2, 3]
+    assert report["fold_fits"] == 7 and report["fold_fits_without_stopping"] == 12
+    best = next(r for r in records if r["status"] == "complete")
+    assert report["best_params"] == best["params"]
+    assert all(r["mae"] > 0 and r["seconds"] > 0 for r in records)
+
+    # Workers cross-validate on the same folds as an in-process fit would.
+    train_idx, test_idx = next(KFold(3, shuffle=True, random_state=options.seed).split(X))
+    model = RandomForestRegressor(**records[0]["params"], random_state=options.seed).fit(X[train_idx], y[train_idx])
+    expected = np.mean(np.abs(y[test_idx] - model.predict(X[test_idx])))
+    assert np.isclose(records[0]["folds"][0]["mae"], expected)
+
+
+def test_train_with_search_fits_the_winner(tmp_path):
+    output = tmp_path / "rent_predictor.joblib"
+    report = train(output, synthetic_training_frame(120, cities=5), SearchOptions(grid=GRID, folds=2, workers=2))["search"]
+
+    assert output.exists()
+    assert report["final_params"] == report["best_params"]
+    assert set(report["serving_latency_ms"]) == {"sklearn", "array"}
+    assert report["serving_latency_ms"]["array"]["batch_1_ms"] > 0
+    assert "search" not in train(tmp_path / "plain.joblib", synthetic_training_frame(50, cities=5))
@@ -0,0 +1,91 @@
+import joblib
+import numpy as np
+import pytest
+
+from app.config import Settings
+from app.services.feature_spec import load_spec_for
+from app.services.forest_engine import ArrayForest, forest_dir_for
+from app.services.model_loader import ModelLoader, file_sha256
+from scripts.benchmark_features import synthetic_training_frame
+from scripts.incremental_retrain import IncrementalOptions, retrain
+from scripts.train_model import train
+from test_feature_spec import _requests
+
+
+@pytest.fixture
+def deployed(tmp_path):
+    artifact = tmp_path / "rent_predictor.joblib"
+    history = synthetic_training_frame(400, cities=5)
+    train(artifact, history)
+    return artifact, history
+
+
+def test_new_trees_replace_the_oldest_and_the_artifact_is_swapped(deployed):
+    artifact, history = deployed
+    before = joblib.load(artifact)
+    spec_before = load_spec_for(artifact)
+    new_data = synthetic_training_frame(200, seed=1, cities=6)
+
+    report = retrain(artifact, new_data, IncrementalOptions(add_trees=10, max_regression=1.0), history)
+
+    assert report["replaced"] and report["new_rows"] == 200 and report["holdout_rows"] == 50
+    assert report["incremental"]["retired_trees"] == 10
+    assert report["incremental"]["trees"] == report["full_rebuild"]["trees"] == len(before.estimators_)
+    assert report["full_rebuild"]["training_rows"] == 400 + 150
+    assert 0 < report["cpu_fraction_of_full"] < 1
+
+    after = joblib.load(artifact)
+    assert len(after.estimators_) == len(before.estimators_) and not after.warm_start
+    # The 10 oldest trees are gone; the rest keep their order, followed by the new ones.
+    np.testing.assert_array_equal(after.estimators_[0].tree_.threshold, before.estimators_[10].tree_.threshold)
+
+    spec = load_spec_for(artifact)
+    assert spec.bucket_edges == spec_before.bucket_edges
+    assert spec.encodings["city_encoded"]["City 5"] == 5
+    assert spec.metadata["warm_start"]["base_trained_on"] == spec_before.metadata["trained_on"]
+    assert spec.metadata["trained_on"] > spec_before.metadata["trained_on"]
+    assert spec.metadata["training_rows"] == spec_before.metadata["training_rows"] + 150
+    assert spec.metadata["new_rows"] == 150
+
+    loader = ModelLoader(Settings(model_path=artifact, inference_engine="array"))
+    assert isinstance(loader.model, ArrayForest)
+
+
+def test_each_refresh_seeds_its_new_trees_afresh(deployed):
+    artifact, _ = deployed
+    options = IncrementalOptions(add_trees=10, max_regression=1.0)
+
+    seeds = []
+    for seed in (1, 2):
+        retrain(artifact, synthetic_training_frame(200, seed=seed, cities=5), options)
+        seeds.append({tree.random_state for tree in joblib.load(artifact).estimators_[-10:]})
+
+    assert seeds[0].isdisjoint(seeds[1])
+
+
+def test_a_refresh_leaves_the_running_workers_forest_untouched(deployed):
+    artifact, history = deployed
+    running = ModelLoader(Settings(model_path=artifact, inference_engine="array", model_mmap=True))
+    matrix = running.build_matrix(_requests(history.head(20)))
+    before = running.predict_batch(matrix)
+    mapped = forest_dir_for(artifact, running.active.sha256)
+    mapped_bytes = {path.name: path.read_bytes() for path in mapped.iterdir()}
+
+    report = retrain(artifact, synthetic_training_frame(200, seed=1, cities=5), IncrementalOptions(max_regression=1.0))
+
+    assert report["replaced"]
+    assert {path.name: path.read_bytes() for path in mapped.iterdir()} == mapped_bytes
+    np.testing.assert_array_equal(running.predict_batch(matrix), before)
+    refreshed = ModelLoader(Settings(model_path=artifact, inference_engine="array", model_mmap=True))
+    assert isinstance(refreshed.model, ArrayForest) and refreshed.active.sha256 != running.active.sha256
+
+
+def test_a_candidate_worse_on_the_holdout_is_not_deployed(deployed):
+    artifact, _ = deployed
+    digest = file_sha256(artifact)
+
+    report = retrain(artifact, synthetic_training_frame(100, seed=2, cities=5), IncrementalOptions(max_regression=-1.0))
+
+    assert not report["accepted"] and not report["replaced"]
+    assert "full_rebuild" not in report
+    assert file_sha256(artifact) == digest
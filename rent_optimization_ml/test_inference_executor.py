@@ -0,0 +1,57 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.config import get_settings
+from app.services.inference_executor import InferenceExecutor, InferenceOverloadedError
+from app.services.model_loader import SMOKE_TEST_REQUESTS, ModelLoader
+
+
+@pytest.mark.parametrize("kind", ["inline", "thread", "process"])
+def test_executor_matches_direct_prediction(kind):
+    loader = ModelLoader(get_settings())
+    executor = InferenceExecutor(loader, kind=kind, max_workers=1)
+    matrix = loader.build_matrix(SMOKE_TEST_REQUESTS)
+    try:
+        predictions = asyncio.run(executor.predict(matrix))
+    finally:
+        executor.shutdown()
+    np.testing.assert_array_equal(predictions, loader.predict_batch(matrix))
+    stats = executor.stats()
+    assert stats["calls_total"] == 1
+    assert stats["compute_ms_max"] >= 0
+
+
+def test_full_queue_rejects_new_calls():
+    loader = ModelLoader(get_settings())
+    executor = InferenceExecutor(loader, kind="thread", max_workers=1, max_queue=0)
+    executor._inflight = 1
+    with pytest.raises(InferenceOverloadedError):
+        asyncio.run(executor.predict(loader.build_matrix(SMOKE_TEST_REQUESTS)))
+    assert executor.stats()["rejected_total"] == 1
+
+
+def test_recycling_the_process_pool_lets_queued_calls_finish():
+    loader = ModelLoader(get_settings())
+    executor = InferenceExecutor(loader, kind="process", max_workers=1)
+    matrix = loader.build_matrix(SMOKE_TEST_REQUESTS)
+
+    async def run():
+        queued = [asyncio.create_task(executor.predict(matrix)) for _ in range(8)]
+        await asyncio.sleep(0)  # submitted to the pool, which is still starting its worker
+        # As after a hot reload: the next call gets a new pool. Holding the old one keeps its
+        # shutdown deterministic; a collected executor skips cancelling its queue.
+        retired = executor._pool
+        executor._pool_version = "reloaded"
+        results = await asyncio.gather(*queued, executor.predict(matrix), return_exceptions=True)
+        assert executor._pool is not retired
+        return results
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        executor.shutdown()
+    assert [type(result) for result in results] == [np.ndarray] * 9  # none cancelled
+    for predictions in results:
+        np.testing.assert_array_equal(predictions, loader.predict_batch(matrix))
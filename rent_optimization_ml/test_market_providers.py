@@ -0,0 +1,323 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from app.config import get_settings
+from app.models.schemas import PredictionRequest
+from app.services.comps_cache import CompsCache
+from app.services.market_data_service import MarketDataService
+from app.services.market_providers import (
+    CompsApiProvider,
+    ProviderCutoff,
+    ProviderError,
+    ProviderLimits,
+    ProviderPool,
+    RentometerProvider,
+    TokenBucket,
+)
+
+
+class StubServer:
+    """
+    Local HTTP/1.1 comps server on an ephemeral port.
+
+    ``script`` is a list of ``(status, delay_seconds)`` served in order (then
+    200s); it records distinct client connections and peak concurrency.
+    """
+
+    def __init__(self, script=(), delay: float = 0.0):
+        self.script = list(script)
+        self.delay = delay
+        self.requests = 0
+        self.connections = set()
+        self.inflight = 0
+        self.max_inflight = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Send headers and body in one segment; otherwise Nagle + delayed ACK adds 40ms a request.
+            wbufsize = 1 << 16
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.requests += 1
+                    stub.connections.add(self.client_address)
+                    stub.inflight += 1
+                    stub.max_inflight = max(stub.max_inflight, stub.inflight)
+                    status, delay = stub.script.pop(0) if stub.script else (200, stub.delay)
+                try:
+                    time.sleep(delay)
+                    if self.path.startswith("/nearby_comps"):
+                        payload = {
+                            "nearby_properties": [
+                                {"address": "9 Oak St", "price": 2100, "distance": 0.4, "bedrooms": 2, "baths": "1", "sqft": 880},
+                                {"address": "3 Elm St", "price": 1990, "distance": 0.2, "bedrooms": 2, "baths": "1.5+"},
+                            ]
+                        }
+                    else:
+                        payload = {
+                            "comparables": [
+                                {
+                                    "id": "c1",
+                                    "address": "3 Elm St",
+                                    "price": 2000.0,
+                                    "distance_miles": 0.2,
+                                    "bedrooms": 2,
+                                    "bathrooms": 1.0,
+                                    "square_feet": 850,
+                                },
+                                {
+                                    "id": "c2",
+                                    "address": "77 Pine St",
+                                    "price": 2300.0,
+                                    "distance_miles": 1.1,
+                                    "bedrooms": 2,
+                                    "bathrooms": 2.0,
+                                    "square_feet": 990,
+                                },
+                            ]
+                        }
+                    body = json.dumps(payload).encode()
+                    self.send_response(status)
+                    if status == 429:
+                        self.send_header("Retry-After", "0")
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with stub.lock:
+                        stub.inflight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        # Clients cancelled mid-request (deadline, hedging) reset their connection; that is expected here.
+        self.server.handle_error = lambda request, client_address: None
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _request(idx: int = 0) -> PredictionRequest:
+    return PredictionRequest(
+        unit_id=f"unit-{idx}",
+        bedrooms=2,
+        bathrooms=1,
+        square_feet=850,
+        address=f"{idx} Main St",
+        city="Seattle",
+        state="WA",
+        zip_code="98101",
+        current_rent=2000,
+    )
+
+
+def _limits(**overrides) -> ProviderLimits:
+    values = dict(max_concurrency=4, rate_per_second=0, burst=1, timeout_seconds=2.0, max_retries=2, backoff_seconds=0.01)
+    values.update(overrides)
+    return ProviderLimits(**values)
+
+
+def test_batch_reuses_a_few_keep_alive_connections():
+    with StubServer(delay=0.005) as server:
+        pool = ProviderPool([CompsApiProvider(server.url, _limits(max_concurrency=3))], max_connections=3)
+
+        async def run():
+            results = await asyncio.gather(*(pool.fetch_all(_request(i)) for i in range(200)))
+            await pool.aclose()
+            return results
+
+        results = asyncio.run(run())
+
+    assert all(len(r["comps_api"]) == 2 for r in results)
+    assert server.requests == 200
+    assert len(server.connections) <= 3
+    assert server.max_inflight <= 3
+
+
+def test_retries_transient_statuses_then_succeeds():
+    with StubServer(script=[(503, 0.0), (429, 0.0)]) as server:
+        pool = ProviderPool([RentometerProvider(server.url, _limits(), api_key="k")], rng=random.Random(0))
+        comps = asyncio.run(pool.fetch(pool.providers[0], _request()))
+
+    assert [c.address for c in comps] == ["9 Oak St", "3 Elm St"]
+    assert comps[1].bathrooms == 1.5
+    stats = pool.stats()
+    assert stats["rentometer_attempts_total"] == 3
+    assert stats["rentometer_retries_total"] == 2
+    assert stats["rentometer_failures_total"] == 0
+
+
+def test_timeouts_exhaust_retries_and_client_errors_do_not_retry():
+    with StubServer(delay=0.5) as server:
+        pool = ProviderPool([CompsApiProvider(server.url, _limits(timeout_seconds=0.05, max_retries=1))])
+        with pytest.raises(ProviderError, match="2 attempt"):
+            asyncio.run(pool.fetch(pool.providers[0], _request()))
+
+    with StubServer(script=[(404, 0.0)]) as server:
+        pool = ProviderPool([CompsApiProvider(server.url, _limits())])
+        with pytest.raises(ProviderError, match="HTTP 404"):
+            asyncio.run(pool.fetch(pool.providers[0], _request()))
+        assert server.requests == 1
+
+
+def test_unreadable_payloads_fail_as_provider_errors_without_retrying():
+    bodies = [b"<html>not json</html>", b'{"comparables": [{"id": "c1", "price": "n/a"}]}', b'["not", "an", "object"]']
+
+    def handler(request):
+        return httpx.Response(200, content=bodies.pop(0), headers={"Content-Type": "application/json"})
+
+    pool = ProviderPool([CompsApiProvider("http://comps.test", _limits())], transport=httpx.MockTransport(handler))
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises(ProviderError, match="unreadable payload"):
+                await pool.fetch(pool.providers[0], _request())
+        await pool.aclose()
+
+    asyncio.run(run())
+    stats = pool.stats()
+    assert stats["comps_api_attempts_total"] == stats["comps_api_failures_total"] == 3
+    assert stats["comps_api_retries_total"] == 0
+
+
+def test_token_bucket_spaces_calls_after_burst():
+    now = [0.0]
+    slept = []
+
+    async def fake_sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate_per_second=10, burst=2, clock=lambda: now[0], sleep=fake_sleep)
+
+    async def run():
+        for _ in range(5):
+            await bucket.acquire()
+
+    asyncio.run(run())
+    assert now[0] == pytest.approx(0.3)
+    assert bucket.waits == 3
+
+
+def test_market_data_service_merges_providers_and_skips_failures():
+    with StubServer() as server:
+        settings = get_settings().model_copy(update={"use_market_data": True, "market_data_max_comps": 10, "enable_comps_cache": False})
+        pool = ProviderPool(
+            [
+                RentometerProvider(server.url, _limits(), api_key="k"),
+                CompsApiProvider("http://127.0.0.1:9", _limits(max_retries=0, timeout_seconds=0.2)),
+            ]
+        )
+        service = MarketDataService(settings, providers=pool)
+
+        async def run():
+            comps = await service.fetch_comparables(_request())
+            await service.close()
+            return comps
+
+        comps = asyncio.run(run())
+
+    assert [c.address for c in comps] == ["3 Elm St", "9 Oak St"]
+    assert service.stats()["comps_api_failures_total"] == 1
+
+
+def test_deadline_cuts_off_a_slow_provider():
+    with StubServer(delay=0.01) as fast, StubServer(delay=1.0) as slow:
+        pool = ProviderPool(
+            [RentometerProvider(slow.url, _limits(), api_key="k"), CompsApiProvider(fast.url, _limits())]
+        )
+
+        async def run():
+            started = time.perf_counter()
+            results = await pool.fetch_all(_request(), deadline_seconds=0.3)
+            elapsed = time.perf_counter() - started
+            await pool.aclose()
+            return results, elapsed
+
+        results, elapsed = asyncio.run(run())
+
+    assert elapsed < 0.6
+    assert len(results["comps_api"]) == 2
+    assert isinstance(results["rentometer"], ProviderCutoff)
+    assert pool.stats()["rentometer_cutoffs_total"] == 1
+
+
+def test_enough_comps_stops_waiting_and_hedge_beats_a_slow_call():
+    with StubServer(delay=0.01) as fast, StubServer(delay=0.8) as slow:
+        pool = ProviderPool(
+            [RentometerProvider(slow.url, _limits(), api_key="k"), CompsApiProvider(fast.url, _limits())]
+        )
+        started = time.perf_counter()
+        results = asyncio.run(pool.fetch_all(_request(), min_comps=2))
+        assert time.perf_counter() - started < 0.5
+        assert isinstance(results["rentometer"], ProviderCutoff)
+
+    # The first call stalls far beyond the provider's usual ~10ms p95; the hedged duplicate answers.
+    with StubServer(script=[(200, 1.0)], delay=0.01) as server:
+        pool = ProviderPool([CompsApiProvider(server.url, _limits())])
+        pool._stats["comps_api"].recent_seconds.extend([0.01] * 20)
+
+        async def run():
+            started = time.perf_counter()
+            comps = await pool.fetch_hedged(pool.providers[0], _request(), min_samples=20)
+            elapsed = time.perf_counter() - started
+            await pool.aclose()
+            return comps, elapsed
+
+        comps, elapsed = asyncio.run(run())
+
+    assert len(comps) == 2
+    assert elapsed < 0.5
+    stats = pool.stats()
+    assert stats["comps_api_hedges_total"] == 1
+    assert stats["comps_api_hedge_wins_total"] == 1
+
+
+def test_market_comps_report_coverage_and_fall_back_to_cache_when_the_budget_runs_out():
+    settings = get_settings().model_copy(
+        update={"use_market_data": True, "market_data_deadline_ms": 300, "market_data_min_comps": 0}
+    )
+    with StubServer(delay=0.01) as fast, StubServer(delay=1.0) as slow:
+        pool = ProviderPool(
+            [RentometerProvider(slow.url, _limits(), api_key="k"), CompsApiProvider(fast.url, _limits())]
+        )
+        service = MarketDataService(settings, providers=pool, comps_cache=CompsCache(None, 10, 0, 0))
+        slow_only = MarketDataService(
+            settings,
+            providers=ProviderPool([RentometerProvider(slow.url, _limits(), api_key="k")]),
+            comps_cache=service.comps_cache,
+        )
+
+        async def run():
+            partial = await service.fetch_market_comps(_request())
+            fallback = await slow_only.fetch_market_comps(_request())
+            await service.close()
+            await slow_only.providers.aclose()
+            return partial, fallback
+
+        partial, fallback = asyncio.run(run())
+
+    assert (partial.answered, partial.queried, len(partial.comps)) == (1, 2, 2)
+    # TTL 0: the cached entry is expired, but still beats no comps once the budget is gone.
+    assert (fallback.answered, fallback.queried) == (0, 1)
+    assert [c.address for c in fallback.comps] == [c.address for c in partial.comps]
+    assert slow_only.stats()["cache_fallbacks_total"] == 1
@@ -0,0 +1,64 @@
+import asyncio
+
+from app.config import get_settings
+from app.services.metrics import MetricsRegistry, ServiceMetrics
+from app.services.model_loader import SMOKE_TEST_REQUESTS
+from app.services.prediction_service import PredictionService
+
+
+def test_histogram_and_counter_render_prometheus_text():
+    registry = MetricsRegistry()
+    latency = registry.histogram("demo_seconds", "Demo latency.", ("stage",), buckets=(0.01, 0.1))
+    errors = registry.counter("demo_errors_total", "Demo errors.")
+    latency.labels("fetch").observe(0.005)
+    latency.labels("fetch").observe(0.05)
+    latency.labels("fetch").observe(3.0)
+    errors.inc()
+
+    lines = registry.render().splitlines()
+    assert "# TYPE demo_seconds histogram" in lines
+    assert 'demo_seconds_bucket{stage="fetch",le="0.01"} 1' in lines
+    assert 'demo_seconds_bucket{stage="fetch",le="0.1"} 2' in lines
+    assert 'demo_seconds_bucket{stage="fetch",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{stage="fetch"} 3' in lines
+    assert "demo_errors_total 1" in lines
+
+
+def test_disabled_registry_records_nothing():
+    metrics = ServiceMetrics(enabled=False)
+    metrics.stages["inference"].observe(1.0)
+    metrics.record_model_call(8, "model_error")
+    assert "_count" not in metrics.render()
+
+
+def test_service_records_stages_batch_sizes_and_fallbacks():
+    settings = get_settings().model_copy(update={"enable_metrics": True, "enable_prediction_cache": False})
+    service = PredictionService(settings)
+    service.model_loader._active = None  # heuristic mode: every model call is a fallback
+
+    asyncio.run(service.predict_many(SMOKE_TEST_REQUESTS))
+    text = service.metrics.render()
+    for stage in ("market_data", "features", "inference", "postprocess"):
+        assert f'rent_ml_stage_seconds_count{{stage="{stage}"}} 1' in text
+    assert 'rent_ml_batch_size_bucket{call="request",le="4"} 1' in text
+    assert 'rent_ml_heuristic_fallback_total{reason="no_model"} 1' in text
+    assert 'rent_ml_predictions_total{source="computed"} 3' in text
+
+
+def test_metrics_endpoint_exposes_request_histograms():
+    import httpx
+
+    from main import app
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ml") as client:
+            await client.post("/predict", json=SMOKE_TEST_REQUESTS[0].model_dump())
+            return await client.get("/metrics")
+
+    response = asyncio.run(run())
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'rent_ml_http_request_seconds_count{endpoint="predict",method="POST",status="200"}' in response.text
+    assert 'rent_ml_stage_seconds_count{stage="serialize"}' in response.text
+    assert 'rent_ml_component_stat{component="inference_executor",stat="calls_total"}' in response.text
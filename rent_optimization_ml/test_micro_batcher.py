@@ -0,0 +1,46 @@
+import asyncio
+
+import numpy as np
+
+from app.services.micro_batcher import MicroBatcher
+
+
+def test_concurrent_submits_share_one_batch():
+    calls = []
+
+    async def predict(matrix: np.ndarray) -> np.ndarray:
+        calls.append(len(matrix))
+        return matrix[:, 0] * 2
+
+    batcher = MicroBatcher(predict, max_batch_size=8, max_wait_ms=20)
+
+    async def run():
+        rows = [np.array([[float(i), 0.0]]) for i in range(8)]
+        results = await asyncio.gather(*(batcher.submit(row) for row in rows))
+        await batcher.close()
+        return results
+
+    results = asyncio.run(run())
+    assert [float(r[0]) for r in results] == [i * 2.0 for i in range(8)]
+    assert calls == [8]
+    stats = batcher.stats()
+    assert stats["batches_total"] == 1
+    assert stats["rows_total"] == 8
+    assert stats["queue_depth"] == 0
+
+
+def test_errors_propagate_to_every_waiter():
+    async def predict(matrix: np.ndarray) -> np.ndarray:
+        raise ValueError("boom")
+
+    batcher = MicroBatcher(predict, max_batch_size=4, max_wait_ms=5)
+
+    async def run():
+        results = await asyncio.gather(
+            *(batcher.submit(np.zeros((1, 2))) for _ in range(3)), return_exceptions=True
+        )
+        await batcher.close()
+        return results
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
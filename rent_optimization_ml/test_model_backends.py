@@ -0,0 +1,120 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.config import Settings
+from app.services.feature_spec import load_spec_for, spec_path_for
+from app.services.forest_engine import ArrayForest, forest_dir_for, forest_root_for
+from app.services import model_backends
+from app.services.model_backends import BACKENDS, BackendUnavailableError, backend_of, get_backend
+from app.services.model_loader import ModelLoader, file_sha256
+from scripts.benchmark_features import synthetic_training_frame
+from scripts.train_model import train
+from test_feature_spec import _requests
+
+
+@pytest.mark.parametrize("name", list(BACKENDS))
+def test_each_backend_trains_an_artifact_the_service_loads(tmp_path, name):
+    backend = get_backend(name)
+    if not backend.available():
+        with pytest.raises(BackendUnavailableError):
+            backend.create()
+        pytest.skip(f"{name} is not installed")
+
+    artifact = tmp_path / "rent_predictor.joblib"
+    data = synthetic_training_frame(300, cities=5)
+    result = train(artifact, data, backend=name)
+
+    assert result["backend"] == name and result["holdout_mae"] > 0
+    assert load_spec_for(artifact).metadata["backend"] == name
+    assert forest_root_for(artifact).exists() == backend.exports_array_forest
+
+    loader = ModelLoader(Settings(model_path=artifact, inference_engine="array"))
+    assert loader.active.backend == name
+    assert isinstance(loader.model, ArrayForest) == backend.exports_array_forest
+    assert backend_of(ModelLoader(Settings(model_path=artifact)).model) == name
+    predictions, fallback = loader.predict_batch_status(loader.build_matrix(_requests(data.head(20))))
+    assert fallback is None and np.all(np.isfinite(predictions))
+
+
+def test_comparison_reports_every_backend_side_by_side(tmp_path):
+    result = train(tmp_path / "m.joblib", synthetic_training_frame(300, cities=5), compare=tuple(BACKENDS))
+
+    rows = {row["backend"]: row for row in result["comparison"]}
+    assert list(rows) == list(BACKENDS)
+    for name, row in rows.items():
+        if not get_backend(name).available():
+            assert "not available" in row["error"]
+            continue
+        assert row["fit_seconds"] > 0 and row["predict_ms_per_10k"] > 0
+        assert row["artifact_bytes"] > 0 and row["mae"] > 0 and row["mape"] > 0
+
+
+def test_the_joblib_is_published_last_and_atomically(tmp_path, monkeypatch):
+    artifact = tmp_path / "rent_predictor.joblib"
+    published = []
+    real_replace = os.replace
+
+    def replace(source, target):
+        if target == artifact:
+            # The watcher polls the joblib, so everything it depends on must already be on disk.
+            assert not artifact.exists()
+            sha256 = file_sha256(source)
+            meta = ArrayForest.read_metadata(forest_dir_for(artifact, sha256))
+            spec = load_spec_for(artifact)
+            published.append((meta["artifact_sha256"], spec.metadata["artifact_sha256"]) == (sha256, sha256))
+        real_replace(source, target)
+
+    monkeypatch.setattr(model_backends.os, "replace", replace)
+    train(artifact, synthetic_training_frame(300, cities=5))
+    monkeypatch.undo()
+    assert published == [True]
+    digest = file_sha256(artifact)
+
+    def broken_export(*args, **kwargs):
+        raise ValueError("Array forest disagrees with sklearn")
+
+    monkeypatch.setattr(model_backends, "export_forest", broken_export)
+    with pytest.raises(ValueError):
+        train(artifact, synthetic_training_frame(300, seed=1, cities=5))
+    assert file_sha256(artifact) == digest
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        [artifact.name, spec_path_for(artifact).name, forest_root_for(artifact).name]
+    )
+
+
+def test_a_retrain_never_rewrites_the_forest_a_running_worker_has_mapped(tmp_path):
+    artifact = tmp_path / "rent_predictor.joblib"
+    data = synthetic_training_frame(300, cities=5)
+    train(artifact, data)
+    running = ModelLoader(Settings(model_path=artifact, inference_engine="array", model_mmap=True))
+    matrix = running.build_matrix(_requests(data.head(20)))
+    before = running.predict_batch(matrix)
+    mapped = forest_dir_for(artifact, running.active.sha256)
+    mapped_bytes = {path.name: path.read_bytes() for path in mapped.iterdir()}
+
+    train(artifact, synthetic_training_frame(300, seed=1, cities=5))
+
+    # The old export is untouched, so the running worker keeps scoring with the old trees.
+    assert {path.name: path.read_bytes() for path in mapped.iterdir()} == mapped_bytes
+    np.testing.assert_array_equal(running.predict_batch(matrix), before)
+    reloaded = ModelLoader(Settings(model_path=artifact, inference_engine="array", model_mmap=True))
+    assert reloaded.active.sha256 != running.active.sha256
+    assert Path(reloaded.model.feature.filename).parent == forest_dir_for(artifact, reloaded.active.sha256)
+    assert len(list(forest_root_for(artifact).iterdir())) == 2
+
+
+def test_a_spec_written_for_another_artifact_is_not_paired_with_it(tmp_path):
+    artifact = tmp_path / "rent_predictor.joblib"
+    train(artifact, synthetic_training_frame(300, cities=5))
+    assert ModelLoader(Settings(model_path=artifact)).active is not None
+
+    # As if a publish had swapped the spec but not yet the joblib.
+    spec = load_spec_for(artifact)
+    spec.metadata["artifact_sha256"] = "0" * 64
+    spec.save(spec_path_for(artifact))
+
+    assert ModelLoader(Settings(model_path=artifact)).active is None
+    assert not list(tmp_path.glob(".*.tmp-*"))
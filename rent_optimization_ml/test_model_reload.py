@@ -0,0 +1,63 @@
+import asyncio
+import os
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.linear_model import LinearRegression
+
+from app.config import get_settings
+from app.services.model_loader import SMOKE_TEST_REQUESTS, ModelLoader, ModelReloadError
+from app.services.model_watcher import ModelWatcher
+
+
+RENTS = np.array([r.current_rent for r in SMOKE_TEST_REQUESTS])
+
+
+def _dump_model(path, scale: float) -> None:
+    features = np.array([[r.bedrooms, r.bathrooms, r.square_feet, r.current_rent] for r in SMOKE_TEST_REQUESTS])
+    model = LinearRegression().fit(features, RENTS * scale)
+    joblib.dump(model, path)
+
+
+def test_reload_swaps_model_and_keeps_previous(tmp_path):
+    path = tmp_path / "rent_predictor.joblib"
+    _dump_model(path, 1.0)
+    loader = ModelLoader(get_settings().model_copy(update={"model_path": path}))
+    first = loader.active
+
+    _dump_model(path, 1.1)
+    second = loader.reload()
+    assert loader.active is second
+    assert loader.previous is first
+    assert second.version != first.version
+    matrix = loader.build_matrix(SMOKE_TEST_REQUESTS)
+    np.testing.assert_allclose(loader.predict_batch(matrix), RENTS * 1.1)
+
+    assert loader.rollback() is first
+    assert loader.previous is second
+
+
+def test_failed_reload_keeps_active_model(tmp_path):
+    path = tmp_path / "rent_predictor.joblib"
+    _dump_model(path, 1.0)
+    loader = ModelLoader(get_settings().model_copy(update={"model_path": path}))
+    active = loader.active
+
+    joblib.dump({"not": "a model"}, path)
+    with pytest.raises(ModelReloadError):
+        loader.reload()
+    assert loader.active is active
+
+
+def test_watcher_reloads_changed_artifact(tmp_path):
+    path = tmp_path / "rent_predictor.joblib"
+    _dump_model(path, 1.0)
+    loader = ModelLoader(get_settings().model_copy(update={"model_path": path}))
+    watcher = ModelWatcher(loader, path, interval_seconds=0)
+    assert asyncio.run(watcher.check()) is False
+
+    _dump_model(path, 1.2)
+    os.utime(path, (1, 1))
+    assert asyncio.run(watcher.check()) is True
+    assert loader.active.sha256 != loader.previous.sha256
@@ -0,0 +1,100 @@
+import asyncio
+
+from app.config import get_settings
+from app.models.schemas import PredictionRequest
+from app.services.prediction_cache import PredictionCache
+from app.services.prediction_service import PredictionService
+
+
+def _payload(unit_id: str = "cache-1", current_rent: float = 1800) -> PredictionRequest:
+    return PredictionRequest(
+        unit_id=unit_id,
+        bedrooms=2,
+        bathrooms=1,
+        square_feet=850,
+        address="12 Oak St",
+        city="Denver",
+        state="CO",
+        zip_code="80202",
+        current_rent=current_rent,
+    )
+
+
+def test_cache_key_tracks_fields_and_model_version():
+    key = PredictionCache.make_key(_payload(), "1.0.0")
+    assert key == PredictionCache.make_key(_payload(), "1.0.0")
+    assert key != PredictionCache.make_key(_payload(current_rent=1801), "1.0.0")
+    assert key != PredictionCache.make_key(_payload(), "1.0.1")
+
+
+def test_ttl_expiry_and_lru_eviction():
+    now = [0.0]
+    cache = PredictionCache(max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+    service = PredictionService(get_settings())
+    responses = asyncio.run(service.predict_many([_payload(f"u{i}") for i in range(3)]))
+
+    for idx, response in enumerate(responses):
+        cache.put(f"k{idx}", response)
+    assert cache.get("k0") is None
+    assert cache.evictions == 1
+    assert cache.get("k2") is responses[2]
+
+    now[0] = 11.0
+    assert cache.get("k2") is None
+    assert cache.expirations == 1
+
+
+def test_concurrent_identical_requests_compute_once():
+    service = PredictionService(get_settings())
+    service.cache = PredictionCache(max_entries=100, ttl_seconds=60)
+    computed = []
+    original = service._predict_uncached
+
+    async def counting(payloads):
+        computed.extend(p.unit_id for p in payloads)
+        await asyncio.sleep(0.01)
+        return await original(payloads)
+
+    service._predict_uncached = counting
+
+    async def run():
+        first = await asyncio.gather(*(service.predict(_payload()) for _ in range(5)))
+        second = await service.predict(_payload())
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert computed == ["cache-1"]
+    assert all(r is first[0] for r in first)
+    assert second is first[0]
+    stats = service.cache.stats()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] == 4
+    assert stats["hits"] == 1
+
+
+def test_waiters_recompute_when_the_request_they_wait_on_is_cancelled():
+    service = PredictionService(get_settings())
+    service.cache = PredictionCache(max_entries=100, ttl_seconds=60)
+    computed = []
+    original = service._predict_uncached
+
+    async def slow(payloads):
+        computed.extend(p.unit_id for p in payloads)
+        await asyncio.sleep(0.05)
+        return await original(payloads)
+
+    service._predict_uncached = slow
+
+    async def run():
+        owner = asyncio.create_task(service.predict(_payload()))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(service.predict(_payload())) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        owner.cancel()  # its client disconnected
+        return await asyncio.gather(*waiters)
+
+    responses = asyncio.run(run())
+    assert all(r is responses[0] for r in responses)
+    # One waiter took over the computation; the others joined it.
+    assert computed == ["cache-1", "cache-1"]
+    assert service.cache.stats()["inflight"] == 0
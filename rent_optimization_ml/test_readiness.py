@@ -0,0 +1,75 @@
+import asyncio
+import pickle
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+
+from app.config import get_settings
+from app.services.feature_spec import FeatureSpec, spec_path_for
+from app.services.forest_engine import ArrayForest, export_forest, forest_dir_for
+from app.services.model_loader import ModelLoader, file_sha256
+from app.services.prediction_service import PredictionService
+
+
+def test_service_is_ready_only_after_warm_up():
+    service = PredictionService(get_settings())
+    assert not service.ready
+
+    async def run():
+        await service.start()
+        await service.close()
+
+    asyncio.run(run())
+    assert service.ready
+    assert service.warmup_ms > 0
+    assert service.startup_ms >= service.warmup_ms
+    assert service.stats()["process"]["ready"] == 1.0
+
+
+def test_ready_endpoint_reports_503_until_warm():
+    import httpx
+
+    from main import app, prediction_service
+
+    async def run():
+        prediction_service.ready = False
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ml") as client:
+            cold = await client.get("/ready")
+            await prediction_service.warm_up()
+            warm = await client.get("/ready")
+            live = await client.get("/health")
+        return cold, warm, live
+
+    try:
+        cold, warm, live = asyncio.run(run())
+    finally:
+        prediction_service.ready = False
+    assert cold.status_code == 503 and cold.json()["ready"] is False
+    assert warm.status_code == 200 and warm.json()["ready"] is True
+    assert warm.json()["warmup_ms"] > 0
+    assert live.status_code == 200
+
+
+def test_array_forest_is_memory_mapped(tmp_path):
+    artifact = tmp_path / "rent_predictor.joblib"
+    X = np.random.default_rng(0).uniform(0, 3000, size=(200, 3)).astype(np.float32)
+    model = RandomForestRegressor(n_estimators=5, random_state=0).fit(X, X[:, 2] * 1.5)
+    joblib.dump(model, artifact)
+    FeatureSpec(columns=["bedrooms", "bathrooms", "square_feet"]).save(spec_path_for(artifact))
+    sha256 = file_sha256(artifact)
+    export_forest(model, forest_dir_for(artifact, sha256), X, artifact_sha256=sha256)
+
+    settings = get_settings().model_copy(
+        update={"model_path": artifact, "inference_engine": "array", "model_mmap": True}
+    )
+    loader = ModelLoader(settings)
+    assert isinstance(loader.model, ArrayForest)
+    assert isinstance(loader.model.threshold, np.memmap)
+    assert not loader.model.threshold.flags.writeable
+    assert loader.active.load_seconds > 0
+    # Process executor workers re-map the export instead of receiving a pickled copy.
+    clone = pickle.loads(pickle.dumps(loader.model))
+    assert isinstance(clone.threshold, np.memmap)
+    assert len(pickle.dumps(loader.model)) < 1024
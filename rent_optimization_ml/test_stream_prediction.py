@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+import pytest
+
+from app.config import get_settings
+from app.services.inference_executor import InferenceOverloadedError
+from app.services.ndjson_stream import iter_ndjson_lines, stream_predictions
+from app.services.prediction_service import PredictionService
+
+
+async def _chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+async def _collect(iterator):
+    return [item async for item in iterator]
+
+
+def _line(idx: int) -> bytes:
+    return json.dumps(
+        {
+            "unit_id": f"stream-{idx}",
+            "bedrooms": 2,
+            "bathrooms": 1,
+            "square_feet": 800 + idx,
+            "address": "1 Elm St",
+            "city": "Austin",
+            "state": "TX",
+            "zip_code": "78701",
+            "current_rent": 1700,
+        }
+    ).encode()
+
+
+def test_lines_split_across_chunks():
+    data = b'{"a": 1}\n\n{"b": 2}\n{"c": 3}'
+    lines = asyncio.run(_collect(iter_ndjson_lines(_chunks(data, 3), max_line_bytes=64)))
+    assert lines == [(1, b'{"a": 1}'), (3, b'{"b": 2}'), (4, b'{"c": 3}')]
+
+
+def test_oversized_line_inside_one_chunk_is_rejected():
+    data = b'{"a": 1}\n' + b'{"b": "' + b"x" * 100 + b'"}\n{"c": 3}\n'
+
+    async def run():
+        seen = []
+        with pytest.raises(ValueError, match="line 2 exceeds 64 bytes"):
+            async for item in iter_ndjson_lines(_chunks(data, len(data)), max_line_bytes=64):
+                seen.append(item)
+        return seen
+
+    assert asyncio.run(run()) == [(1, b'{"a": 1}')]
+
+
+def test_stream_predictions_in_chunks_with_error_lines():
+    service = PredictionService(get_settings())
+    body = b"\n".join([_line(0), _line(1), b'{"unit_id": "bad"}', _line(2)]) + b"\n"
+    output = asyncio.run(
+        _collect(stream_predictions(service, _chunks(body, 17), chunk_size=2, max_line_bytes=4096))
+    )
+    records = [json.loads(line) for chunk in output for line in chunk.splitlines()]
+    assert [r.get("unit_id") for r in records if "unit_id" in r] == ["stream-0", "stream-1", "stream-2"]
+    errors = [r for r in records if "error" in r]
+    assert len(errors) == 1 and errors[0]["line"] == 3
+
+
+def test_error_records_keep_input_order_and_overload_fails_only_its_chunk():
+    service = PredictionService(get_settings())
+    predict_many = service.predict_many
+    calls = []
+
+    async def overloaded_once(requests):
+        calls.append(len(requests))
+        if len(calls) == 2:
+            raise InferenceOverloadedError("inference queue is full")
+        return await predict_many(requests)
+
+    service.predict_many = overloaded_once
+    body = b"\n".join([_line(0), b'{"unit_id": "bad"}', _line(1), _line(2), _line(3)]) + b"\n"
+    output = asyncio.run(
+        _collect(stream_predictions(service, _chunks(body, 17), chunk_size=2, max_line_bytes=4096))
+    )
+    records = [json.loads(line) for chunk in output for line in chunk.splitlines()]
+    assert [r.get("unit_id") or r["line"] for r in records] == ["stream-0", 2, 3, 4, "stream-3"]
+    assert isinstance(records[1]["error"], list)  # validation errors
+    assert records[2]["error"] == records[3]["error"] == "inference queue is full"
+
+
+def test_stream_endpoint_reads_body_while_responding():
+    import httpx
+
+    from main import app
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://ml") as client:
+            body = b"\n".join(_line(idx) for idx in range(5))
+            return await client.post("/predict/stream", content=body)
+
+    response = asyncio.run(asyncio.wait_for(run(), timeout=10))
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert len(response.text.splitlines()) == 5
@@ -0,0 +1,38 @@
+import json
+import xml.dom.minidom
+
+from scripts.benchmark_features import synthetic_training_frame
+from scripts.train_model import train
+from scripts.training_profiler import TrainingProfiler, format_profile
+
+
+def test_profiler_reports_every_training_stage(tmp_path):
+    with TrainingProfiler(flame_graph=True, interval=0.001) as profiler:
+        train(tmp_path / "m.joblib", synthetic_training_frame(2000, cities=20), profiler=profiler)
+
+    report = profiler.report()
+    stages = {stage["name"]: stage for stage in report["stages"]}
+    assert list(stages) == ["features", "split", "fit", "evaluate", "export"]
+    assert (stages["features"]["rows"], stages["fit"]["rows"], stages["evaluate"]["rows"]) == (2000, 1500, 500)
+    assert stages["fit"]["columns"] == stages["features"]["columns"] > 10
+    for stage in stages.values():
+        assert stage["wall_seconds"] > 0 and stage["cpu_seconds"] >= 0
+        assert 0 < stage["peak_rss_mb"] <= report["peak_rss_mb"]
+        assert stage["traced_peak_mb"] > 0
+    assert stages["features"]["top_allocations"][0]["mb"] > 0
+    assert report["slowest_stage"] == "fit" and stages["fit"]["samples"] > 0
+    assert "fit" in format_profile(report)
+
+    paths = profiler.write(tmp_path / "profiles")
+    written = json.loads(paths[0].read_text())
+    assert written["flame_graph"] == {"stage": "fit", "folded": paths[1].name, "svg": paths[2].name}
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in paths[1].read_text().splitlines())
+    assert "_fit" in paths[1].read_text()
+    xml.dom.minidom.parse(str(paths[2]))
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = TrainingProfiler(enabled=False)
+    with profiler, profiler.stage("fit") as stage:
+        stage.record([1, 2, 3])
+    assert stage.rows == 3 and profiler.stages == []